@@ -1,17 +1,30 @@
-import networkx as nx
+import asyncio
+import threading
+import time
 from ipysigma import Sigma
 from shinyswatch import theme
 from shiny import reactive, req
+from shiny.session import get_current_session
 from shiny.express import input, ui, render
 from shinywidgets import render_widget, render_plotly
 import pandas as pd
 import numpy as np
 import netfunction
+import diagnostics
 import plotly.express as px
 from faicons import icon_svg
 import plotly.graph_objects as go
 
 
+SPARSIFY_CHOICES = {
+    "disparity": "Магистраль (фильтр диспаритета)",
+    "top_k": "Сильнейшие связи каждого узла",
+    "threshold": "Порог веса",
+    "centrality": "Центральные узлы",
+    "none": "Без прореживания",
+}
+
+
 ui.page_opts(
     title="Network Dashboard",
     fillable=True,
@@ -19,6 +32,17 @@ ui.page_opts(
     theme=theme.journal
 )
 
+# Записи замеров помечаются сессией, в которой выполнялся этап (в том числе в фоновых потоках)
+diagnostics.session_resolver = lambda: getattr(get_current_session(), 'id', None)
+
+# Вкладка «Диагностика» скрыта и открывается по адресу с параметром ?diagnostics
+ui.head_content(
+    ui.tags.style('.nav-link[data-value="diagnostics"] { display: none; } '
+                  '.diagnostics .nav-link[data-value="diagnostics"] { display: block; }'),
+    ui.tags.script("if (new URLSearchParams(window.location.search).has('diagnostics')) "
+                   "{ document.documentElement.classList.add('diagnostics'); }"),
+)
+
 with ui.sidebar(width=280):
     ui.HTML("<h4>Обработка данных</h4>")
     ui.hr()
@@ -26,22 +50,29 @@ with ui.sidebar(width=280):
 
 
 @reactive.calc
-def df():
-    f = req(input.file())
-    return pd.read_excel(f[0]['datapath'])
+@diagnostics.instrument(stage="app")
+def data_digest():
+    return netfunction.file_digest(req(input.file())[0]['datapath'])
+
+
+def shared(digest, stage, filters, compute):
+    # Результаты этапов общие для всех сессий процесса: одинаковый файл и фильтры обрабатываются один раз
+    return netfunction.shared_cache.get_or_compute((stage, digest, filters), compute)
 
 
 @reactive.calc
+@diagnostics.instrument(stage="app")
 def processed_data():
-    data = df()
-    data['Обработанные навыки'] = data['Ключевые навыки'].apply(
-        netfunction.parse_skills)
-    data = data.dropna(subset='Работодатель')
-    data.reset_index(inplace=True, drop=True)
-    data['Дата публикации'] = pd.to_datetime(data['Дата публикации'])
-    data["Федеральный округ"] = data["Название региона"].apply(
-        netfunction.get_federal_district)
-    return data
+    path, digest = req(input.file())[0]['datapath'], data_digest()
+    # Обработанный набор кэшируется в памяти процесса и на диске по хешу содержимого файла
+    return shared(digest, 'processed_data', (), lambda: netfunction.load_vacancies(path, digest=digest))
+
+
+@reactive.calc
+@diagnostics.instrument(stage="app")
+def skill_codes():
+    # Навыки кодируются один раз; построители матриц выбирают строки по индексу отфильтрованных данных
+    return netfunction.EncodedSkills.from_series(processed_data()['Обработанные навыки'])
 
 
 @reactive.effect
@@ -76,37 +107,285 @@ def update_salary_range():
 
 
 @reactive.calc
+@diagnostics.instrument(stage="app")
+def filter_engine():
+    # Индексы дат, зарплат и категорий строятся один раз на набор данных
+    return netfunction.FilterEngine(processed_data())
+
+
+# Задержка применения фильтров: пока ползунок перетаскивают, пересчеты не запускаются
+FILTER_DELAY = 0.5
+
+
+def debounce(delay):
+    # Значение обновляется, когда входы не менялись `delay` секунд и результат отличается от выданного
+    def decorator(func):
+        deadline = reactive.value(None)
+        trigger = reactive.value(0)
+        emitted = {}
+
+        @reactive.effect(priority=1)
+        def _schedule():
+            func()
+            deadline.set(time.monotonic() + delay)
+
+        @reactive.effect
+        def _fire():
+            target = deadline()
+            if target is None:
+                return
+            remaining = target - time.monotonic()
+            if remaining > 0:
+                reactive.invalidate_later(remaining)
+                return
+            deadline.set(None)
+            with reactive.isolate():
+                if 'value' not in emitted or func() != emitted['value']:
+                    trigger.set(trigger() + 1)
+
+        @reactive.calc
+        def debounced():
+            trigger()
+            with reactive.isolate():
+                emitted['value'] = func()
+            return emitted['value']
+
+        return debounced
+    return decorator
+
+
+# Тяжелые этапы выполняются в пуле потоков и не блокируют сессию; новый запуск отменяет устаревший
+running_tokens = {}
+
+
+def background_task():
+    @reactive.extended_task
+    async def task(token, compute):
+        return await asyncio.to_thread(netfunction.run_cancellable, token, compute)
+    return task
+
+
+def run_in_background(name, task, compute):
+    previous = running_tokens.get(name)
+    if previous is not None:
+        previous.cancel()
+    running_tokens[name] = token = netfunction.CancellationToken()
+    task.invoke(token, compute)
+
+
+def background_result(task):
+    result = task.result()
+    # Отмененный запуск возвращает None: выводы остаются в состоянии пересчета до следующего результата
+    req(result is not None, cancel_output="progress")
+    return result
+
+
+def show_progress(name, task, title):
+    bars = {}
+
+    @reactive.effect
+    def _progress():
+        if task.status() != "running":
+            bar = bars.pop(name, None)
+            if bar is not None:
+                bar.close()
+            return
+        bar = bars.get(name)
+        if bar is None:
+            bar = bars[name] = ui.Progress()
+        fraction, message = running_tokens[name].progress
+        bar.set(fraction, message=title, detail=message)
+        reactive.invalidate_later(0.25)
+
+
+# Накопленные снимки строятся заново только при изменении выборки без учета дат (base_rows не зависит от дат).
+# Снимки строятся в фоновых потоках нескольких задач, поэтому построение выполняется под блокировкой
+session_snapshots = {}
+snapshots_lock = threading.Lock()
+
+
+def snapshots_for(key, counts, dates, base):
+    with snapshots_lock:
+        cached = session_snapshots.get(key)
+        if cached is None or cached[0] is not base:
+            netfunction.report_progress(0.2, "Накопленные снимки по месяцам")
+            cached = session_snapshots[key] = (base, netfunction.TimeSnapshots(counts, dates, rows=base))
+        return cached[1]
+
+
+# Диапазон дат и остальные фильтры откладываются раздельно: смена дат не пересчитывает выборку без учета дат,
+# и по тождеству этой выборки счетчики и снимки узнают, что изменились только даты
+@debounce(FILTER_DELAY)
+def roles_base_filters():
+    return dict(salary_range=input.salary(),
+                **{'Опыт работы': input.experience(), 'Название региона': input.region()})
+
+
+@debounce(FILTER_DELAY)
+def roles_date_range():
+    return input.pub_date()
+
+
+@reactive.calc
+def roles_filters():
+    return dict(date_range=roles_date_range(), **roles_base_filters())
+
+
+@reactive.calc
+@diagnostics.instrument(stage="app")
+def base_rows():
+    # Выборка по всем фильтрам, кроме дат: для нее строятся накопленные снимки по месяцам
+    return filter_engine().select(**roles_base_filters())
+
+
+@reactive.calc
+@diagnostics.instrument(stage="app")
+def filtered_rows():
+    return filter_engine().select(**roles_filters())
+
+
+# Последняя выборка без учета дат для каждого вида счетчиков
+previous_base_rows = {}
+
+
+def update_counts(key, counts, rows, base, snapshots, date_range):
+    if np.array_equal(counts.rows, rows):
+        return counts
+    if previous_base_rows.get(key) is base:
+        # Изменился только диапазон дат: состояние - разность двух накопленных снимков
+        counts.update(rows, state=snapshots().aggregate(*(date_range or (None, None))))
+    else:
+        counts.update(rows)
+    previous_base_rows[key] = base
+    return counts
+
+
+@reactive.calc
+@diagnostics.instrument(stage="app")
 def filtered_data():
-    data = processed_data()
-    if input.pub_date():
-        start_date, end_date = input.pub_date()
-        data = data[(data['Дата публикации'] >= pd.to_datetime(start_date)) &
-                    (data['Дата публикации'] <= pd.to_datetime(end_date))]
-    if input.experience():
-        data = data[data['Опыт работы'].isin(input.experience())]
-    if input.region():
-        data = data[data['Название региона'].isin(input.region())]
-    if input.salary():
-        min_salary, max_salary = input.salary()
-        data = data[(data['Заработная плата'] >= min_salary) &
-                    (data['Заработная плата'] <= max_salary)]
-    return data
+    return processed_data().iloc[filtered_rows()]
+
+
+@reactive.calc
+@diagnostics.instrument(stage="app")
+def vacancy_cube():
+    return netfunction.VacancyCube(processed_data())
+
+
+def chart_rollup(by):
+    # Куб применим, если фильтр зарплат отсекает только вакансии без зарплаты; иначе группируются отобранные строки
+    cube, filters = vacancy_cube(), roles_filters()
+    if cube.covers_salary(filters['salary_range']):
+        return cube.rollup(by, **filters)
+    return netfunction.VacancyCube.summarize(filtered_data(), by)
 
 
 @reactive.calc
+@diagnostics.instrument(stage="app")
+def skills_roles_counts():
+    # Счетчики обновляются по разностям при изменении фильтров, граф изменяется на месте
+    return netfunction.IncrementalGroupValues(processed_data(), 'Название специальности', 'Обработанные навыки',
+                                              encoded=skill_codes())
+
+
+def counts_pipeline(key, counts, rows, base, dates, date_range, digest, filters, matrix_stage, build_graph,
+                    display):
+    # Выполняется в фоновом потоке: счетчики сессии изменяются только здесь, по одному запуску за раз
+    def updated_matrix():
+        if not np.array_equal(counts.rows, rows):
+            netfunction.report_progress(0.1, "Обновление счетчиков")
+        update_counts(key, counts, rows, base, lambda: snapshots_for(key, counts, dates, base), date_range)
+        return counts.matrix(sparse=True)
+
+    def compute():
+        if not len(rows):
+            return pd.DataFrame(), None, None
+        # В общем кэше - только неизменяемая матрица: при попадании счетчики сессии не обновляются
+        matrix = shared(digest, matrix_stage, filters, updated_matrix)
+        netfunction.report_progress(0.5, "Построение графа")
+        if np.array_equal(counts.rows, rows):
+            # Граф счетчиков сессии изменяется на месте и в кэш не попадает, поэтому не копируется
+            G = counts.graph()
+        else:
+            G = build_graph(matrix)
+        return matrix, G, display_graph(G, *display)
+
+    return compute
+
+
+roles_task = background_task()
+show_progress('roles', roles_task, "Сеть специальностей и навыков")
+
+
+@reactive.effect
+def start_roles():
+    filters = roles_filters()
+    run_in_background('roles', roles_task, counts_pipeline(
+        'roles', skills_roles_counts(), filtered_rows(), base_rows(), processed_data()['Дата публикации'],
+        filters['date_range'], data_digest(), netfunction.filter_key(**filters),
+        'skills_roles_matrix', netfunction.create_bipartite_graph,
+        ("bipartite", input.sparsify(), input.min_weight(), input.max_edges())))
+
+
+@reactive.calc
+@diagnostics.instrument(stage="app")
 def skills_roles_matrix():
-    data = filtered_data()
-    if data.empty:
-        return pd.DataFrame()
-    return netfunction.create_group_values_matrix(data, 'Название специальности', 'Обработанные навыки')
+    return background_result(roles_task)[0]
 
 
 @reactive.calc
+@diagnostics.instrument(stage="app")
 def bipartite_graph():
-    matrix = skills_roles_matrix()
+    return background_result(roles_task)[1]
+
+
+# Индексы схожести сохраняются между пересчетами, чтобы обновлять только затронутые строки
+similarity_indexes = {}
+
+# Индексы строятся в фоне в каждой сессии, поэтому пул потоков одного индекса небольшой
+SIMILARITY_JOBS = 2
+
+
+def refreshed_similarity_index(level_target, matrix):
     if matrix.empty:
+        similarity_indexes.pop(level_target, None)
         return None
-    return netfunction.create_bipartite_graph(matrix)
+    index = similarity_indexes.get(level_target)
+    try:
+        if index is None:
+            index = netfunction.SimilarityIndex.from_matrix(matrix, level_target, n_jobs=SIMILARITY_JOBS)
+        else:
+            index.refresh(matrix)
+    except netfunction.CancelledComputation:
+        # Прерванное обновление оставляет индекс несогласованным - он будет построен заново
+        similarity_indexes.pop(level_target, None)
+        raise
+    similarity_indexes[level_target] = index
+    return index
+
+
+similarity_task = background_task()
+show_progress('similarity', similarity_task, "Индекс схожести узлов")
+
+# Уровни, для которых запрашивались рекомендации: индексы остальных уровней не строятся
+similarity_levels = reactive.value(frozenset())
+
+
+@reactive.effect
+def start_similarity():
+    matrix, levels = skills_roles_matrix(), similarity_levels()
+    run_in_background('similarity', similarity_task,
+                      lambda: {level: refreshed_similarity_index(level, matrix) for level in levels})
+
+
+def similarity_index(level_target):
+    with reactive.isolate():
+        levels = similarity_levels()
+    if level_target not in levels:
+        similarity_levels.set(levels | {level_target})
+    indexes = background_result(similarity_task)
+    req(level_target in indexes, cancel_output="progress")
+    return indexes[level_target]
 
 
 @reactive.effect
@@ -143,41 +422,140 @@ def update_salary_range_sem():
                          max=max_salary, value=[min_salary, max_salary])
 
 
+@debounce(FILTER_DELAY)
+def semantic_base_filters():
+    return dict(salary_range=input.salary_sem(),
+                **{'Опыт работы': input.experience_sem(), 'Название региона': input.region_sem(),
+                   'Название специальности': input.specialty()})
+
+
+@debounce(FILTER_DELAY)
+def semantic_date_range():
+    return input.pub_date_sem()
+
+
 @reactive.calc
-def filtered_data_semantic():
-    data = processed_data()
-    if input.pub_date_sem():
-        start_date, end_date = input.pub_date_sem()
-        data = data[(data['Дата публикации'] >= pd.to_datetime(start_date)) &
-                    (data['Дата публикации'] <= pd.to_datetime(end_date))]
-    if input.experience_sem():
-        data = data[data['Опыт работы'].isin(input.experience_sem())]
-    if input.region_sem():
-        data = data[data['Название региона'].isin(input.region_sem())]
-    if input.salary_sem():
-        min_salary, max_salary = input.salary_sem()
-        data = data[(data['Заработная плата'] >= min_salary) &
-                    (data['Заработная плата'] <= max_salary)]
-    if input.specialty():
-        data = data[data['Название специальности'].isin(input.specialty())]
-    return data
+def semantic_filters():
+    return dict(date_range=semantic_date_range(), **semantic_base_filters())
+
+
+@reactive.calc
+@diagnostics.instrument(stage="app")
+def base_rows_semantic():
+    return filter_engine().select(**semantic_base_filters())
 
 
 @reactive.calc
+@diagnostics.instrument(stage="app")
+def filtered_rows_semantic():
+    return filter_engine().select(**semantic_filters())
+
+
+@reactive.calc
+@diagnostics.instrument(stage="app")
+def semantic_counts():
+    return netfunction.IncrementalCoOccurrence(processed_data(), 'Обработанные навыки', encoded=skill_codes())
+
+
+# Сообщества и позиции узлов каждой вкладки сохраняются между перерисовками
+graph_layouts = {key: netfunction.GraphLayout() for key in ("bipartite", "semantic", "period")}
+
+
+def display_graph(G, key, method, min_weight, max_edges):
+    # Выполняется в фоновом потоке вместе с построением графа и отменяется тем же токеном.
+    # В виджет передается прореженная копия: исходный граф обновляется на месте и используется в рекомендациях
+    if G is None:
+        return None
+    netfunction.report_progress(0.7, "Прореживание графа")
+    H = netfunction.sparsify_graph(G, method=method, min_weight=min_weight or 0, max_edges=max_edges or None)
+    netfunction.check_cancelled()
+    netfunction.report_progress(0.85, "Сообщества и раскладка")
+    return graph_layouts[key].apply(H)
+
+
+@diagnostics.instrument(stage="app")
+def sigma_widget(G):
+    # Координаты берутся из атрибутов графа: раскладка вкладки в это время может обновляться в фоне
+    return Sigma(G, layout={node: {'x': attrs['x'], 'y': attrs['y']} for node, attrs in G.nodes(data=True)},
+                 node_size=list(dict(G.degree()).values()),
+                 node_size_range=(1, 10),
+                 node_color='community',
+                 node_border_color_from='node')
+
+
+@reactive.calc
+@diagnostics.instrument(stage="app")
+def displayed_bipartite_graph():
+    return background_result(roles_task)[2]
+
+
+@reactive.calc
+@diagnostics.instrument(stage="app")
+def displayed_semantic_graph():
+    return background_result(semantic_task)[2]
+
+
+semantic_task = background_task()
+show_progress('semantic', semantic_task, "Семантическая сеть навыков")
+
+
+@reactive.effect
+def start_semantic():
+    filters = semantic_filters()
+    run_in_background('semantic', semantic_task, counts_pipeline(
+        'semantic', semantic_counts(), filtered_rows_semantic(), base_rows_semantic(),
+        processed_data()['Дата публикации'], filters['date_range'], data_digest(), netfunction.filter_key(**filters),
+        'semantic_cooccurrence_matrix', netfunction.create_adjacency_graph,
+        ("semantic", input.sparsify_sem(), input.min_weight_sem(), input.max_edges_sem())))
+
+
+@reactive.calc
+@diagnostics.instrument(stage="app")
 def semantic_cooccurrence_matrix():
-    data = filtered_data_semantic()
-    if data.empty:
-        return pd.DataFrame()
-    return netfunction.create_co_occurrence_matrix(data, 'Обработанные навыки')
+    return background_result(semantic_task)[0]
+
+
+@reactive.effect
+def update_period_choices():
+    periods = processed_data()['Дата публикации'].dt.to_period('M').dropna().sort_values().unique()
+    choices = {str(period): period.strftime('%m.%Y') for period in periods}
+    ui.update_select("period", choices=choices, selected=str(periods[-1]) if len(periods) else None)
+
+
+period_task = background_task()
+show_progress('period', period_task, "Сеть за месяц")
+
+
+@reactive.effect
+def start_period():
+    period = pd.Period(req(input.period()), freq='M')
+    counts, dates, base = semantic_counts(), processed_data()['Дата публикации'], base_rows_semantic()
+    display = ("period", input.sparsify_sem(), input.min_weight_sem(), input.max_edges_sem())
+
+    def compute():
+        # Сеть одного месяца - разность соседних снимков, без пересчета строк
+        snapshots = snapshots_for('semantic', counts, dates, base)
+        if period not in snapshots.periods:
+            return (None,)
+        netfunction.report_progress(0.5, "Построение графа")
+        matrix = snapshots.period_matrix(snapshots.periods.get_loc(period), sparse=True)
+        if matrix.empty:
+            return (None,)
+        return (display_graph(netfunction.create_adjacency_graph(matrix), *display),)
+
+    run_in_background('period', period_task, compute)
 
 
 @reactive.calc
+@diagnostics.instrument(stage="app")
+def period_graph():
+    return background_result(period_task)[0]
+
+
+@reactive.calc
+@diagnostics.instrument(stage="app")
 def semantic_graph():
-    matrix = semantic_cooccurrence_matrix()
-    if matrix.empty:
-        return None
-    G = nx.from_pandas_adjacency(matrix)
-    return G
+    return background_result(semantic_task)[1]
 
 
 with ui.nav_panel("Данные", icon=icon_svg("table")):
@@ -185,6 +563,7 @@ with ui.nav_panel("Данные", icon=icon_svg("table")):
         ui.card_header("📖 Загруженные данные")
 
         @render.data_frame
+        @diagnostics.instrument(stage="app")
         def table():
             return render.DataTable(processed_data(), filters=True, height='700px')
 
@@ -196,13 +575,13 @@ with ui.nav_panel("Визуализация", icon=icon_svg("chart-bar")):
                 "💰 Распределение средней зарплаты: Федеральный округ → Специальность → Опыт работы")
 
             @render_plotly
+            @diagnostics.instrument(stage="app")
             def sankey_chart():
-                data = filtered_data()
-                if data.empty:
+                if not len(filtered_rows()):
                     return px.scatter(title="Нет данных для отображения")
 
-                df_sankey = data.groupby(["Федеральный округ", "Название специальности", "Опыт работы"])[
-                    "Заработная плата"].mean().reset_index()
+                df_sankey = chart_rollup(["Федеральный округ", "Название специальности", "Опыт работы"]).rename(
+                    columns={"Средняя зарплата": "Заработная плата"})
 
                 unique_districts = list(
                     df_sankey["Федеральный округ"].unique())
@@ -270,15 +649,16 @@ with ui.nav_panel("Визуализация", icon=icon_svg("chart-bar")):
             ui.card_header("📈 Динамика публикации вакансий по специальностям")
 
             @render_plotly
+            @diagnostics.instrument(stage="app")
             def vacancies_trend():
-                data = filtered_data()
-                if data.empty:
+                if not len(filtered_rows()):
                     return px.scatter(title="Нет данных для отображения")
 
-                df_grouped = data.groupby(
-                    [pd.Grouper(key="Дата публикации", freq="M"),
-                     "Название специальности"]
-                ).size().reset_index(name="Количество вакансий")
+                monthly = chart_rollup(["Месяц", "Название специальности"])
+                df_grouped = pd.DataFrame({
+                    "Дата публикации": monthly["Месяц"].dt.to_timestamp(how="end").dt.normalize(),
+                    "Название специальности": monthly["Название специальности"],
+                    "Количество вакансий": monthly["Число вакансий"]})
 
                 fig = px.line(
                     df_grouped,
@@ -306,25 +686,25 @@ with ui.nav_panel("Сеть", icon=icon_svg('circle-nodes')):
                                        multiple=True, width=250)
                     ui.input_slider("salary", "Заработная плата",
                                     min=0, max=100000, value=[0, 100000])
+                    ui.input_select("sparsify", "Прореживание графа", choices=SPARSIFY_CHOICES, width=250)
+                    ui.input_numeric("min_weight", "Минимальный вес ребра", 1, min=1, width=250)
+                    ui.input_numeric("max_edges", "Максимум ребер", 5000, min=100, step=500, width=250)
                 with ui.card(full_screen=True):
                     ui.card_header("🔗 Граф")
 
                     @render_widget
+                    @diagnostics.instrument(stage="app")
                     def widget():
-                        if filtered_data().empty:
+                        if not len(filtered_rows()):
                             ui.notification_show(
                                 ui="Ошибка", action="Нет данных, соответствующих выбранным фильтрам", type="error", duration=10)
                             return None
-                        G = bipartite_graph()
+                        G = displayed_bipartite_graph()
                         if G is None:
                             ui.notification_show(
                                 ui="Ошибка", action="Нет данных для построения графа", type="error", duration=10)
                             return None
-                        return Sigma(G, node_size=list(dict(G.degree()).values()),
-                                     node_size_range=(1, 10),
-                                     node_metrics=['louvain'],
-                                     node_color='louvain',
-                                     node_border_color_from='node')
+                        return sigma_widget(G)
 
         with ui.nav_panel("Одномодальный граф"):
             with ui.layout_columns(col_widths=(3, 9)):
@@ -340,25 +720,44 @@ with ui.nav_panel("Сеть", icon=icon_svg('circle-nodes')):
                                     min=0, max=100000, value=[0, 100000])
                     ui.input_selectize("specialty", "Название специальности",
                                        choices=[], multiple=True, width=250)
+                    ui.input_select("sparsify_sem", "Прореживание графа", choices=SPARSIFY_CHOICES, width=250)
+                    ui.input_numeric("min_weight_sem", "Минимальный вес ребра", 1, min=1, width=250)
+                    ui.input_numeric("max_edges_sem", "Максимум ребер", 5000, min=100, step=500, width=250)
                 with ui.card(full_screen=True):
                     ui.card_header("🔗 Семантический граф")
 
                     @render_widget
+                    @diagnostics.instrument(stage="app")
                     def widget_semantic():
-                        if filtered_data_semantic().empty:
+                        if not len(filtered_rows_semantic()):
                             ui.notification_show(
                                 ui="Ошибка", action="Нет данных, соответствующих выбранным фильтрам", type="error", duration=10)
                             return None
-                        G = semantic_graph()
+                        G = displayed_semantic_graph()
                         if G is None:
                             ui.notification_show(
                                 ui="Ошибка", action="Нет данных для построения графа", type="error", duration=10)
                             return None
-                        return Sigma(G, node_size=list(dict(G.degree()).values()),
-                                     node_size_range=(1, 10),
-                                     node_metrics=['louvain'],
-                                     node_color='louvain',
-                                     node_border_color_from='node')
+                        return sigma_widget(G)
+
+        with ui.nav_panel("Сеть во времени"):
+            with ui.layout_columns(col_widths=(3, 9)):
+                with ui.card(full_screen=False):
+                    ui.card_header("🗓️ Период")
+                    ui.input_select("period", "Месяц публикации", choices=[], width=250)
+                    ui.markdown("Учитываются фильтры и прореживание семантического графа, кроме дат публикации.")
+                with ui.card(full_screen=True):
+                    ui.card_header("🔗 Семантический граф за месяц")
+
+                    @render_widget
+                    @diagnostics.instrument(stage="app")
+                    def widget_period():
+                        G = period_graph()
+                        if G is None:
+                            ui.notification_show(
+                                ui="Ошибка", action="Нет данных за выбранный месяц", type="error", duration=10)
+                            return None
+                        return sigma_widget(G)
 
 
 with ui.nav_panel("Рекомендация", icon=icon_svg('diagram-project')):
@@ -387,8 +786,9 @@ with ui.nav_panel("Рекомендация", icon=icon_svg('diagram-project')):
                             ui.update_selectize("node_1", choices=choices)
 
                     @render_plotly
+                    @diagnostics.instrument(stage="app")
                     def recommendations_plot_1():
-                        if filtered_data().empty:
+                        if not len(filtered_rows()):
                             ui.notification_show(
                                 ui="Ошибка", action="Нет данных, соответствующих выбранным фильтрам", type="error", duration=10)
                             return None
@@ -402,7 +802,8 @@ with ui.nav_panel("Рекомендация", icon=icon_svg('diagram-project')):
                             return px.bar(x=["Нет выделенных узлов"], y=[0], template="plotly_white").update_layout()
 
                         recs = netfunction.recommend_similar_nodes(
-                            G, node, level_target=level_target, top_n=top_n)
+                            G, node, level_target=level_target, top_n=top_n,
+                            index=similarity_index(level_target))
                         nodes, similarities = zip(*recs)
                         unique_nodes = list(set(nodes))
                         colors = px.colors.qualitative.G10
@@ -438,8 +839,9 @@ with ui.nav_panel("Рекомендация", icon=icon_svg('diagram-project')):
                             ui.update_selectize("node_2", choices=choices)
 
                     @render_plotly
+                    @diagnostics.instrument(stage="app")
                     def recommendations_plot_2():
-                        if filtered_data().empty:
+                        if not len(filtered_rows()):
                             ui.notification_show(
                                 ui="Ошибка", action="Нет данных, соответствующих выбранным фильтрам", type="error", duration=10)
                             return None
@@ -453,7 +855,8 @@ with ui.nav_panel("Рекомендация", icon=icon_svg('diagram-project')):
                             return px.bar(x=["No node selected"], y=[0], template="plotly_white").update_layout()
 
                         recs = netfunction.recommend_similar_nodes(
-                            G, node, level_target=level_target, top_n=top_n)
+                            G, node, level_target=level_target, top_n=top_n,
+                            index=similarity_index(level_target))
                         nodes, similarities = zip(*recs)
                         unique_nodes = list(set(nodes))
                         colors = px.colors.qualitative.G10
@@ -492,8 +895,9 @@ with ui.nav_panel("Рекомендация", icon=icon_svg('diagram-project')):
                             ui.update_selectize("node3", choices=choices)
 
                     @render_plotly
+                    @diagnostics.instrument(stage="app")
                     def neighbor_recommendations_plot_1():
-                        if filtered_data().empty:
+                        if not len(filtered_rows()):
                             ui.notification_show(ui="Ошибка",
                                                  action="Нет данных, соответствующих выбранным фильтрам",
                                                  type="error",
@@ -551,8 +955,9 @@ with ui.nav_panel("Рекомендация", icon=icon_svg('diagram-project')):
                             ui.update_selectize("node4", choices=choices)
 
                     @render_plotly
+                    @diagnostics.instrument(stage="app")
                     def neighbor_recommendations_plot_2():
-                        if filtered_data().empty:
+                        if not len(filtered_rows()):
                             ui.notification_show(ui="Ошибка",
                                                  action="Нет данных, соответствующих выбранным фильтрам",
                                                  type="error",
@@ -588,6 +993,26 @@ with ui.nav_panel("Рекомендация", icon=icon_svg('diagram-project')):
                         return fig
 
 
+with ui.nav_panel("Диагностика", value="diagnostics", icon=icon_svg("stethoscope")):
+    with ui.layout_columns(col_widths=(12, 12)):
+        with ui.card(full_screen=True):
+            ui.card_header("⏱️ Сводка по этапам сессии")
+
+            @render.data_frame
+            def diagnostics_summary():
+                reactive.invalidate_later(2)
+                return render.DataGrid(diagnostics.recorder.summary(session=get_current_session().id))
+
+        with ui.card(full_screen=True):
+            ui.card_header("🧾 Последние вызовы")
+
+            @render.data_frame
+            def diagnostics_records():
+                reactive.invalidate_later(2)
+                return render.DataGrid(diagnostics.recorder.frame(session=get_current_session().id, limit=300),
+                                       height='500px')
+
+
 ui.nav_spacer()
 with ui.nav_control():
     ui.input_dark_mode(id="mode")
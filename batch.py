@@ -0,0 +1,212 @@
+"""
+Пакетный расчет сетей без дашборда: выгрузка делится на срезы (весь набор, регион, федеральный округ,
+месяц, специальность), и для каждого среза в пуле процессов строятся матрицы, графы, центральности
+и рекомендации.
+
+Результаты среза сохраняются в каталог <output>/<срез>/<значение>/:
+  skills_roles.npz, co_occurrence.npz       - матрицы «навык × специальность» и co-occurrence навыков
+                                              (читаются `netfunction.load_matrix_npz`);
+  skills_roles.graphml, co_occurrence.graphml - графы;
+  centrality.parquet                         - центральности узлов обоих графов;
+  recommendations.parquet                    - top-k схожих узлов каждого уровня двудольного графа.
+Сводка по срезам записывается в <output>/manifest.parquet.
+
+Пример использования:
+  python batch.py vacancies.xlsx --output batch --slices all district month --jobs 4
+"""
+import argparse
+import hashlib
+import os
+import re
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import Any, Dict, List, Optional, Tuple
+
+import networkx as nx
+import numpy as np
+import pandas as pd
+
+import netfunction
+from netfunction import SKILLS_FIELD
+
+
+ROLE_FIELD = 'Название специальности'
+
+# Срез → поле набора; 'all' - весь набор, 'month' - месяц даты публикации
+SLICES = {
+    'all': None,
+    'region': 'Название региона',
+    'district': 'Федеральный округ',
+    'month': 'Дата публикации',
+    'specialty': ROLE_FIELD,
+}
+
+# Данные процесса-исполнителя: загружаются один раз при запуске процесса
+_worker: Dict[str, Any] = {}
+
+
+def slice_rows(data: pd.DataFrame, kind: str) -> List[Tuple[str, np.ndarray]]:
+    """
+    Делит набор на срезы и возвращает пары (значение среза, позиции строк).
+
+    :param data: Обработанный DataFrame (см. `netfunction.process_vacancies`).
+    :param kind: Вид среза (ключ SLICES).
+    :return: Список пар; строки с пропуском в поле среза не попадают ни в один срез.
+    """
+    if kind not in SLICES:
+        raise ValueError(f"Неизвестный срез '{kind}'. Допустимые: {', '.join(SLICES)}.")
+    if kind == 'all':
+        return [('all', np.arange(len(data)))]
+    values = data[SLICES[kind]]
+    if kind == 'month':
+        values = values.dt.to_period('M')
+    codes, uniques = pd.factorize(values, sort=True)
+    order = np.argsort(codes, kind='stable')
+    bounds = np.searchsorted(codes[order], np.arange(len(uniques) + 1))
+    return [(str(value), order[bounds[code]:bounds[code + 1]]) for code, value in enumerate(uniques)]
+
+
+def _slug(value: str) -> str:
+    # Имя каталога среза: читаемая часть и короткий хеш, чтобы различные значения не совпали
+    readable = re.sub(r'[^\w.-]+', '_', value).strip('_')[:60] or 'value'
+    return f"{readable}-{hashlib.blake2b(value.encode('utf-8'), digest_size=4).hexdigest()}"
+
+
+def _init_worker(path: str, cache_dir: Optional[str]) -> None:
+    data = netfunction.load_vacancies(path, cache_dir=cache_dir)
+    _worker['data'] = data
+    _worker['encoded'] = netfunction.EncodedSkills.from_series(data[SKILLS_FIELD])
+
+
+def _centrality_frame(G: nx.Graph, graph: str, centrality_type: str) -> pd.DataFrame:
+    centrality = netfunction.compute_centrality(G, centrality_type, cache=None)
+    levels = nx.get_node_attributes(G, 'bipartite')
+    return pd.DataFrame({'graph': graph, 'node': list(centrality), 'level': [levels.get(node, 0) for node in centrality],
+                         'centrality_type': centrality_type, 'centrality': list(centrality.values())})
+
+
+def _recommendations_frame(matrix: pd.DataFrame, top_k: int) -> pd.DataFrame:
+    frames = []
+    for level_target in ('first', 'second'):
+        index = netfunction.SimilarityIndex.from_matrix(matrix, level_target, k=top_k, n_jobs=1)
+        rank = np.arange(index.k)
+        stored = rank[None, :] < index.counts[:, None]
+        rows, ranks = np.nonzero(stored)
+        nodes = np.asarray(index.nodes, dtype=object)
+        frames.append(pd.DataFrame({
+            'level': level_target, 'node': nodes[rows], 'rank': ranks + 1,
+            'neighbor': nodes[index.neighbors[rows, ranks]], 'similarity': index.scores[rows, ranks]}))
+    return pd.concat(frames, ignore_index=True)
+
+
+def process_slice(kind: str, value: str, rows: np.ndarray, output: str,
+                  centrality_type: str = 'degree', top_k: int = 10) -> Dict[str, Any]:
+    """
+    Строит и сохраняет результаты одного среза; выполняется в процессе пула.
+
+    :return: Строка сводки: срез, число вакансий, размеры графов, каталог и время расчета.
+    """
+    started = time.perf_counter()
+    data, encoded = _worker['data'], _worker['encoded']
+    directory = os.path.join(output, kind, _slug(value))
+    os.makedirs(directory, exist_ok=True)
+
+    roles = netfunction.create_group_values_matrix(data, ROLE_FIELD, SKILLS_FIELD, sparse=True,
+                                                   encoded=encoded, rows=rows)
+    # Срезы уже считаются в пуле процессов, вложенный пул для пар навыков не нужен
+    co_occurrence = netfunction.create_co_occurrence_matrix(data, SKILLS_FIELD, sparse=True,
+                                                            encoded=encoded, rows=rows, n_jobs=1)
+    bipartite = netfunction.create_bipartite_graph(roles)
+    adjacency = netfunction.create_adjacency_graph(co_occurrence)
+
+    netfunction.save_matrix_npz(os.path.join(directory, 'skills_roles.npz'), roles)
+    netfunction.save_matrix_npz(os.path.join(directory, 'co_occurrence.npz'), co_occurrence)
+    nx.write_graphml(bipartite, os.path.join(directory, 'skills_roles.graphml'))
+    nx.write_graphml(adjacency, os.path.join(directory, 'co_occurrence.graphml'))
+
+    pd.concat([_centrality_frame(bipartite, 'skills_roles', centrality_type),
+               _centrality_frame(adjacency, 'co_occurrence', centrality_type)],
+              ignore_index=True).to_parquet(os.path.join(directory, 'centrality.parquet'), index=False)
+    if not roles.empty:
+        _recommendations_frame(roles, top_k).to_parquet(os.path.join(directory, 'recommendations.parquet'),
+                                                        index=False)
+
+    return {'slice': kind, 'value': value, 'vacancies': len(rows),
+            'skills_roles_nodes': bipartite.number_of_nodes(), 'skills_roles_edges': bipartite.number_of_edges(),
+            'co_occurrence_nodes': adjacency.number_of_nodes(), 'co_occurrence_edges': adjacency.number_of_edges(),
+            'path': os.path.relpath(directory, output), 'seconds': round(time.perf_counter() - started, 3)}
+
+
+def run_batch(path: str, output: str, slices: List[str], jobs: Optional[int] = None,
+              min_rows: int = 1, centrality_type: str = 'degree', top_k: int = 10,
+              cache_dir: Optional[str] = netfunction.CACHE_DIR) -> pd.DataFrame:
+    """
+    Рассчитывает все срезы выгрузки в пуле процессов и записывает сводку manifest.parquet.
+
+    Выгрузка обрабатывается один раз в родительском процессе и сохраняется в кэш Parquet
+    (см. `netfunction.load_vacancies`), поэтому процессы пула читают уже обработанный набор.
+
+    :param path: Файл выгрузки (xlsx, csv или parquet).
+    :param output: Каталог результатов.
+    :param slices: Виды срезов (ключи SLICES).
+    :param jobs: Число процессов (по умолчанию - число ядер).
+    :param min_rows: Срезы с меньшим числом вакансий пропускаются.
+    :param centrality_type: Тип центральности (см. `netfunction.compute_centrality`).
+    :param top_k: Число рекомендаций для каждого узла.
+    :param cache_dir: Каталог кэша обработанных выгрузок; None - без кэша (каждый процесс обрабатывает файл сам).
+    :return: Сводка по рассчитанным срезам.
+
+
+    Пример использования:
+      >>> manifest = run_batch('vacancies.xlsx', 'batch', ['all', 'district'], jobs=4)
+
+    """
+    data = netfunction.load_vacancies(path, cache_dir=cache_dir)
+    tasks = [(kind, value, rows) for kind in slices for value, rows in slice_rows(data, kind)
+             if len(rows) >= min_rows]
+    del data
+    os.makedirs(output, exist_ok=True)
+
+    results = []
+    with ProcessPoolExecutor(max_workers=jobs, initializer=_init_worker, initargs=(path, cache_dir)) as executor:
+        futures = {executor.submit(process_slice, kind, value, rows, output, centrality_type, top_k): (kind, value)
+                   for kind, value, rows in tasks}
+        for done, future in enumerate(as_completed(futures), start=1):
+            kind, value = futures[future]
+            try:
+                results.append(future.result())
+            except Exception as error:
+                results.append({'slice': kind, 'value': value, 'error': repr(error)})
+            print(f"[{done}/{len(futures)}] {kind}: {value}", file=sys.stderr)
+
+    manifest = pd.DataFrame(results)
+    manifest.to_parquet(os.path.join(output, 'manifest.parquet'), index=False)
+    return manifest
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Пакетный расчет матриц, графов и рекомендаций по срезам выгрузки")
+    parser.add_argument('input', help="Файл выгрузки (xlsx, csv или parquet)")
+    parser.add_argument('--output', default='batch', help="Каталог результатов")
+    parser.add_argument('--slices', nargs='+', choices=list(SLICES), default=['all', 'district', 'month'],
+                        help="Виды срезов")
+    parser.add_argument('--jobs', type=int, help="Число процессов")
+    parser.add_argument('--min-rows', type=int, default=20, help="Минимальное число вакансий в срезе")
+    parser.add_argument('--centrality', default='degree', choices=['degree', 'betweenness', 'closeness', 'eigenvector'],
+                        help="Тип центральности")
+    parser.add_argument('--top-k', type=int, default=10, help="Число рекомендаций для каждого узла")
+    parser.add_argument('--no-cache', action='store_true', help="Не использовать кэш обработанных выгрузок")
+    args = parser.parse_args(argv)
+
+    manifest = run_batch(args.input, args.output, args.slices, jobs=args.jobs, min_rows=args.min_rows,
+                         centrality_type=args.centrality, top_k=args.top_k,
+                         cache_dir=None if args.no_cache else netfunction.CACHE_DIR)
+    failed = manifest['error'].notna().sum() if 'error' in manifest else 0
+    print(f"Рассчитано срезов: {len(manifest) - failed}, с ошибкой: {failed}. Сводка: "
+          f"{os.path.join(args.output, 'manifest.parquet')}")
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
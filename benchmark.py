@@ -0,0 +1,333 @@
+"""
+Нагрузочные замеры построителей netfunction на синтетических выгрузках вакансий.
+
+Для каждого размера набора генерируется выгрузка с популярностью навыков по закону Ципфа,
+для каждой функции замеряются время (лучшее из нескольких запусков) и пиковая память (tracemalloc).
+Результаты печатаются как кривые масштабирования и сравниваются с сохраненным эталоном.
+Абсолютные времена зависят от машины, поэтому эталон не хранится в репозитории: его сохраняют
+на той же машине перед изменениями (--save-baseline) и сравнивают с ним после.
+
+Пример использования:
+  python benchmark.py --rows 5000 20000 50000 --save-baseline benchmark_baseline.json
+  python benchmark.py --rows 5000 20000 50000 --baseline benchmark_baseline.json
+  python benchmark.py --rows 200000 --functions create_co_occurrence_matrix --jobs 0
+"""
+import argparse
+import gc
+import json
+import platform
+import sys
+import time
+import tracemalloc
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+import diagnostics
+import netfunction
+from netfunction import SKILLS_FIELD
+from regions import district_by_region
+
+
+EXPERIENCE = ("Нет опыта", "От 1 года до 3 лет", "От 3 до 6 лет", "Более 6 лет")
+
+FUNCTIONS = ("create_co_occurrence_matrix", "create_group_values_matrix", "create_whole_matrix",
+             "create_bipartite_graph", "filter_matrix_from_graph", "recommend_similar_nodes",
+             "neighbor_recommendations", "similarity_index",
+             "co_occurrence_jobs_1", "co_occurrence_jobs_4", "co_occurrence_jobs_16")
+
+
+def generate_vacancies(n_rows: int, n_skills: int = 5000, n_specialties: int = 200,
+                       zipf_exponent: float = 1.1, mean_skills: float = 8.0,
+                       start: str = '2024-01-01', days: int = 365, seed: int = 0) -> pd.DataFrame:
+    """
+    Генерирует выгрузку вакансий с теми же полями, что и исходный файл дашборда.
+
+    Навыки выбираются с вероятностью, обратно пропорциональной рангу в степени `zipf_exponent`,
+    число навыков в вакансии - по Пуассону со средним `mean_skills` (повторы в вакансии удаляются).
+    Специальности также распределены по Ципфу, регионы и опыт - равномерно, часть зарплат пропущена.
+
+    :param n_rows: Число вакансий.
+    :param n_skills: Размер словаря навыков.
+    :param n_specialties: Число специальностей.
+    :param zipf_exponent: Показатель закона Ципфа для популярности навыков.
+    :param mean_skills: Среднее число навыков в вакансии.
+    :param start: Первая дата публикации.
+    :param days: Длина периода публикаций в днях.
+    :param seed: Зерно генератора.
+    :return: DataFrame с полями 'Ключевые навыки', 'Название специальности', 'Название региона', 'Опыт работы',
+     'Заработная плата', 'Дата публикации' и 'Работодатель'.
+
+
+    Пример использования:
+      >>> raw = generate_vacancies(20000, n_skills=3000)
+      >>> data = netfunction.process_vacancies(raw)
+
+    """
+    rng = np.random.default_rng(seed)
+
+    def zipf(size: int) -> np.ndarray:
+        weights = 1.0 / np.arange(1, size + 1) ** zipf_exponent
+        return weights / weights.sum()
+
+    lengths = rng.poisson(mean_skills, size=n_rows)
+    codes = rng.choice(n_skills, size=int(lengths.sum()), p=zipf(n_skills))
+    owners = np.repeat(np.arange(n_rows), lengths)
+    # Повторы навыка в одной вакансии удаляются: пары (вакансия, навык) упорядочиваются и прореживаются
+    order = np.lexsort((codes, owners))
+    owners, codes = owners[order], codes[order]
+    keep = np.ones(len(codes), dtype=bool)
+    keep[1:] = (owners[1:] != owners[:-1]) | (codes[1:] != codes[:-1])
+    owners, codes = owners[keep], codes[keep]
+    bounds = np.searchsorted(owners, np.arange(n_rows + 1))
+
+    names = np.array([f"Навык {code}" for code in range(n_skills)], dtype=object)[codes]
+    skills = ['; '.join(names[bounds[row]:bounds[row + 1]]) for row in range(n_rows)]
+
+    specialties = np.array([f"Специальность {code}" for code in range(n_specialties)], dtype=object)
+    regions = np.array(sorted(district_by_region), dtype=object)
+    salary = rng.lognormal(np.log(70000), 0.5, size=n_rows).round(-3)
+    salary[rng.random(n_rows) < 0.2] = np.nan
+
+    return pd.DataFrame({
+        'Ключевые навыки': skills,
+        'Название специальности': specialties[rng.choice(n_specialties, size=n_rows, p=zipf(n_specialties))],
+        'Название региона': regions[rng.integers(0, len(regions), size=n_rows)],
+        'Опыт работы': np.array(EXPERIENCE, dtype=object)[rng.integers(0, len(EXPERIENCE), size=n_rows)],
+        'Заработная плата': salary,
+        'Дата публикации': pd.Timestamp(start) + pd.to_timedelta(rng.integers(0, days * 24 * 60, size=n_rows),
+                                                                 unit='min'),
+        'Работодатель': np.array([f"Работодатель {code}" for code in rng.integers(0, max(n_rows // 20, 1),
+                                                                                   size=n_rows)], dtype=object),
+    })
+
+
+def measure(func: Callable[[], Any], repeat: int = 3) -> Dict[str, float]:
+    """
+    Замеряет функцию без аргументов: лучшее время из `repeat` запусков и пиковую память
+    отдельного запуска под tracemalloc (трассировка замедляет выполнение и в замер времени не входит).
+
+    :return: Словарь {'seconds': ..., 'peak_mb': ...}.
+    """
+    # Замеры diagnostics сбрасывают пик tracemalloc во вложенных вызовах и на время замера отключаются
+    instrumented, diagnostics.enabled = diagnostics.enabled, False
+    try:
+        timings = []
+        for _ in range(repeat):
+            gc.collect()
+            started = time.perf_counter()
+            func()
+            timings.append(time.perf_counter() - started)
+
+        gc.collect()
+        tracemalloc.start()
+        try:
+            func()
+            _, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+    finally:
+        diagnostics.enabled = instrumented
+    return {'seconds': min(timings), 'peak_mb': peak / 2**20}
+
+
+def _cases(data: pd.DataFrame, sparse: bool, top_n: int) -> List[Tuple[str, Callable[[], Any]]]:
+    """
+    Готовит вызовы замеряемых функций; входы каждой функции строятся заранее и в замер не входят.
+    """
+    group_matrix = netfunction.create_group_values_matrix(data, 'Название специальности', SKILLS_FIELD, sparse=sparse)
+    G = netfunction.create_bipartite_graph(group_matrix)
+    specialty = data['Название специальности'].value_counts().index[0]
+
+    def filter_matrix():
+        # Кэш центральностей сбрасывается, иначе повторные запуски измеряют обращение к кэшу
+        netfunction.centrality_cache.clear()
+        return netfunction.filter_matrix_from_graph(G, 'degree', top_n=top_n, sparse=sparse)
+
+    def similar_nodes():
+        # Векторы уровней кэшируются на графе; сброс оставляет в замере полный проход по уровню
+        netfunction._similarity_cache.pop(G, None)
+        return netfunction.recommend_similar_nodes(G, specialty, level_target='first', top_n=10)
+
+    def co_occurrence_jobs(n_jobs):
+        # Порог PARALLEL_MIN_NNZ снимается, чтобы пул процессов замерялся на любом размере набора;
+        # запуск пула попадает только в первый из повторов и в лучшее время не входит
+        def run():
+            threshold, netfunction.PARALLEL_MIN_NNZ = netfunction.PARALLEL_MIN_NNZ, 0
+            try:
+                return netfunction.create_co_occurrence_matrix(data, SKILLS_FIELD, sparse=sparse, n_jobs=n_jobs)
+            finally:
+                netfunction.PARALLEL_MIN_NNZ = threshold
+        return run
+
+    return [
+        ("create_co_occurrence_matrix",
+         lambda: netfunction.create_co_occurrence_matrix(data, SKILLS_FIELD, sparse=sparse)),
+        ("create_group_values_matrix",
+         lambda: netfunction.create_group_values_matrix(data, 'Название специальности', SKILLS_FIELD, sparse=sparse)),
+        ("create_whole_matrix",
+         lambda: netfunction.create_whole_matrix(group_matrix, data, use_co_occurrence=True,
+                                                 skills_field=SKILLS_FIELD, sparse=sparse)),
+        ("create_bipartite_graph", lambda: netfunction.create_bipartite_graph(group_matrix)),
+        ("filter_matrix_from_graph", filter_matrix),
+        ("recommend_similar_nodes", similar_nodes),
+        ("neighbor_recommendations",
+         lambda: netfunction.neighbor_recommendations(G, specialty, level_target='first', top_n=10)),
+        # Веса «навык × специальность» - сырые счетчики с тяжелым хвостом (тысячи различных значений)
+        ("similarity_index",
+         lambda: netfunction.SimilarityIndex.from_matrix(group_matrix, level_target='second')),
+        ("co_occurrence_jobs_1", co_occurrence_jobs(1)),
+        ("co_occurrence_jobs_4", co_occurrence_jobs(4)),
+        ("co_occurrence_jobs_16", co_occurrence_jobs(16)),
+    ]
+
+
+def run_benchmarks(sizes: List[int], n_skills: int = 5000, n_specialties: int = 200,
+                   zipf_exponent: float = 1.1, repeat: int = 3, sparse: bool = True, top_n: int = 400,
+                   functions: Optional[List[str]] = None, seed: int = 0) -> Dict[str, Dict[str, Dict[str, float]]]:
+    """
+    Замеряет все функции на наборах из `sizes` вакансий.
+
+    :param sizes: Размеры наборов (число вакансий).
+    :param functions: Замеряемые функции; по умолчанию - все из FUNCTIONS.
+    :return: Словарь {функция: {размер (строка): {'seconds': ..., 'peak_mb': ...}}}.
+
+
+    Пример использования:
+      >>> results = run_benchmarks([5000, 20000], n_skills=3000)
+
+    """
+    selected = set(functions or FUNCTIONS)
+    results: Dict[str, Dict[str, Dict[str, float]]] = {name: {} for name in FUNCTIONS if name in selected}
+    for size in sizes:
+        raw = generate_vacancies(size, n_skills=n_skills, n_specialties=n_specialties,
+                                 zipf_exponent=zipf_exponent, seed=seed)
+        data = netfunction.process_vacancies(raw)
+        for name, func in _cases(data, sparse, top_n):
+            if name in selected:
+                results[name][str(size)] = measure(func, repeat)
+                print(f"  {name:<30} {size:>9} строк  {results[name][str(size)]['seconds']:9.3f} с", file=sys.stderr)
+    return results
+
+
+def scaling_exponent(sizes: List[int], values: List[float]) -> Optional[float]:
+    """
+    Показатель степени k в зависимости value ~ size^k (наклон в логарифмическом масштабе).
+    """
+    points = [(size, value) for size, value in zip(sizes, values) if size > 0 and value > 0]
+    if len(points) < 2:
+        return None
+    x, y = np.log([size for size, _ in points]), np.log([value for _, value in points])
+    return float(np.polyfit(x, y, 1)[0])
+
+
+def print_scaling(results: Dict[str, Dict[str, Dict[str, float]]], width: int = 30) -> None:
+    """
+    Печатает для каждой функции кривую масштабирования: время, пиковую память и полосу,
+    пропорциональную времени, а также оценку показателя степени роста.
+    """
+    for name, by_size in results.items():
+        sizes = sorted(by_size, key=int)
+        if not sizes:
+            continue
+        longest = max(by_size[size]['seconds'] for size in sizes) or 1.0
+        print(f"\n{name}")
+        for size in sizes:
+            seconds, peak = by_size[size]['seconds'], by_size[size]['peak_mb']
+            bar = '█' * max(int(round(width * seconds / longest)), 1)
+            print(f"  {int(size):>9} строк  {seconds:9.3f} с  {peak:9.1f} МБ  {bar}")
+        time_exponent = scaling_exponent([int(size) for size in sizes], [by_size[size]['seconds'] for size in sizes])
+        memory_exponent = scaling_exponent([int(size) for size in sizes], [by_size[size]['peak_mb'] for size in sizes])
+        if time_exponent is not None:
+            print(f"  рост: время ~ n^{time_exponent:.2f}, память ~ n^{memory_exponent:.2f}")
+
+
+def compare_with_baseline(results: Dict[str, Dict[str, Dict[str, float]]], baseline: Dict[str, Any],
+                          tolerance: float = 0.25, min_seconds: float = 0.01,
+                          min_mb: float = 1.0) -> List[str]:
+    """
+    Сравнивает замеры с эталоном и возвращает описания регрессий.
+
+    Регрессией считается рост времени или пиковой памяти больше чем в (1 + tolerance) раз;
+    разницы меньше `min_seconds` и `min_mb` относятся к шуму и не учитываются.
+
+    :param results: Результат `run_benchmarks`.
+    :param baseline: Содержимое файла эталона (см. `save_baseline`).
+    :param tolerance: Допустимый относительный рост.
+    :return: Список строк с описанием регрессий; пустой, если регрессий нет.
+    """
+    regressions = []
+    reference = baseline.get('results', {})
+    for name, by_size in results.items():
+        for size, current in by_size.items():
+            previous = reference.get(name, {}).get(size)
+            if previous is None:
+                continue
+            for metric, unit, threshold in (('seconds', 'с', min_seconds), ('peak_mb', 'МБ', min_mb)):
+                before, after = previous[metric], current[metric]
+                if after > before * (1 + tolerance) and after - before > threshold:
+                    regressions.append(f"{name}, {size} строк: {metric} {before:.3f} → {after:.3f} {unit} "
+                                       f"(+{(after / before - 1) * 100 if before else float('inf'):.0f}%)")
+    return regressions
+
+
+def save_baseline(path: str, results: Dict[str, Dict[str, Dict[str, float]]], params: Dict[str, Any]) -> None:
+    """
+    Сохраняет замеры и параметры генерации в JSON-файл эталона.
+    """
+    payload = {'params': params, 'python': platform.python_version(), 'numpy': np.__version__,
+               'pandas': pd.__version__, 'results': results}
+    with open(path, 'w', encoding='utf-8') as file:
+        json.dump(payload, file, ensure_ascii=False, indent=2)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Замеры времени и памяти построителей netfunction")
+    parser.add_argument('--rows', type=int, nargs='+', default=[5000, 20000, 50000], help="Размеры наборов")
+    parser.add_argument('--skills', type=int, default=5000, help="Размер словаря навыков")
+    parser.add_argument('--specialties', type=int, default=200, help="Число специальностей")
+    parser.add_argument('--zipf', type=float, default=1.1, help="Показатель закона Ципфа для навыков")
+    parser.add_argument('--repeat', type=int, default=3, help="Число запусков для замера времени")
+    parser.add_argument('--top-n', type=int, default=400, help="top_n для filter_matrix_from_graph")
+    parser.add_argument('--dense', action='store_true', help="Строить плотные матрицы вместо разреженных")
+    parser.add_argument('--functions', nargs='+', choices=FUNCTIONS, help="Замеряемые функции")
+    parser.add_argument('--seed', type=int, default=0, help="Зерно генератора")
+    parser.add_argument('--jobs', type=int, default=netfunction.CO_OCCURRENCE_JOBS,
+                        help="Число процессов co-occurrence в основных замерах (0 - по числу ядер)")
+    parser.add_argument('--baseline', help="Файл эталона для поиска регрессий")
+    parser.add_argument('--save-baseline', help="Сохранить замеры как эталон")
+    parser.add_argument('--tolerance', type=float, default=0.25, help="Допустимый относительный рост")
+    args = parser.parse_args(argv)
+
+    params = {'rows': args.rows, 'skills': args.skills, 'specialties': args.specialties, 'zipf': args.zipf,
+              'repeat': args.repeat, 'top_n': args.top_n, 'dense': args.dense, 'seed': args.seed, 'jobs': args.jobs}
+    # Число процессов по умолчанию читается при каждом вызове, поэтому задается на время всех замеров
+    netfunction.CO_OCCURRENCE_JOBS = args.jobs
+    results = run_benchmarks(args.rows, n_skills=args.skills, n_specialties=args.specialties,
+                             zipf_exponent=args.zipf, repeat=args.repeat, sparse=not args.dense,
+                             top_n=args.top_n, functions=args.functions, seed=args.seed)
+    print_scaling(results)
+
+    status = 0
+    if args.baseline:
+        with open(args.baseline, encoding='utf-8') as file:
+            baseline = json.load(file)
+        if {key: baseline.get('params', {}).get(key) for key in params} != params:
+            print("\nВнимание: параметры генерации отличаются от эталона, сравнение приблизительное.")
+        regressions = compare_with_baseline(results, baseline, tolerance=args.tolerance)
+        if regressions:
+            print("\nРЕГРЕССИИ:")
+            for line in regressions:
+                print(f"  {line}")
+            status = 1
+        else:
+            print("\nРегрессий относительно эталона нет.")
+    if args.save_baseline:
+        save_baseline(args.save_baseline, results, params)
+        print(f"\nЭталон сохранен: {args.save_baseline}")
+    return status
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,223 @@
+import functools
+import inspect
+import json
+import logging
+import os
+import threading
+import time
+import tracemalloc
+from collections import deque
+from typing import Any, Callable, Deque, Dict, List, Optional
+
+import networkx as nx
+import numpy as np
+import pandas as pd
+import scipy.sparse as sp
+
+
+# Замеры этапов: время, процессорное время, пиковое выделение памяти и размеры входов и выходов.
+# Записи хранятся в памяти процесса (панель «Диагностика») и пишутся в журнал `network_navyk.diagnostics`
+# в виде JSON; файл журнала задается переменной окружения NETWORK_NAVYK_DIAGNOSTICS_LOG.
+
+logger = logging.getLogger('network_navyk.diagnostics')
+if os.environ.get('NETWORK_NAVYK_DIAGNOSTICS_LOG'):
+    _handler = logging.FileHandler(os.environ['NETWORK_NAVYK_DIAGNOSTICS_LOG'], encoding='utf-8')
+    _handler.setFormatter(logging.Formatter('%(message)s'))
+    logger.addHandler(_handler)
+    logger.setLevel(logging.INFO)
+
+# Замеры отключаются переменной NETWORK_NAVYK_DIAGNOSTICS=0
+enabled = os.environ.get('NETWORK_NAVYK_DIAGNOSTICS', '1') != '0'
+
+# Трассировка памяти замедляет выполнение в несколько раз, поэтому включается отдельно
+# (NETWORK_NAVYK_TRACE_MEMORY=1); без нее пиковое выделение не записывается
+if os.environ.get('NETWORK_NAVYK_TRACE_MEMORY') == '1' and not tracemalloc.is_tracing():
+    tracemalloc.start()
+
+# Возвращает идентификатор текущей сессии; приложение подставляет свою функцию
+session_resolver: Callable[[], Optional[str]] = lambda: None
+
+
+def describe(value: Any) -> Optional[Dict[str, Any]]:
+    """
+    Краткое описание размера значения: строки и столбцы таблиц, узлы и ребра графов, форма массивов.
+
+    :param value: Любое значение.
+    :return: Словарь с размерами или None для значений без размера.
+
+
+    Пример использования:
+      >>> describe(G)
+      {'type': 'Graph', 'nodes': 120, 'edges': 860}
+
+    """
+    if isinstance(value, pd.DataFrame):
+        return {'type': 'DataFrame', 'rows': len(value), 'columns': len(value.columns)}
+    if isinstance(value, pd.Series):
+        return {'type': 'Series', 'rows': len(value)}
+    if isinstance(value, nx.Graph):
+        return {'type': type(value).__name__, 'nodes': value.number_of_nodes(), 'edges': value.number_of_edges()}
+    if sp.issparse(value):
+        return {'type': 'sparse', 'shape': list(value.shape), 'nnz': int(value.nnz)}
+    if isinstance(value, np.ndarray):
+        return {'type': 'ndarray', 'shape': list(value.shape)}
+    if isinstance(value, (tuple, list)) and value and any(
+            isinstance(item, (pd.DataFrame, nx.Graph, np.ndarray)) or sp.issparse(item) for item in value):
+        return {'type': type(value).__name__, 'items': [describe(item) for item in value]}
+    if isinstance(value, (list, dict, set, tuple)):
+        return {'type': type(value).__name__, 'len': len(value)}
+    return None
+
+
+class Recorder:
+    """
+    Потокобезопасное хранилище последних записей замеров (кольцевой буфер).
+
+    :param max_records: Сколько последних записей хранить.
+    """
+
+    def __init__(self, max_records: int = 5000):
+        self._records: Deque[Dict[str, Any]] = deque(maxlen=max_records)
+        self._lock = threading.Lock()
+
+    def add(self, record: Dict[str, Any]) -> None:
+        with self._lock:
+            self._records.append(record)
+        if logger.isEnabledFor(logging.INFO):
+            logger.info(json.dumps(record, ensure_ascii=False, default=str))
+
+    def records(self, session: Optional[str] = None, limit: Optional[int] = None) -> List[Dict[str, Any]]:
+        """
+        Записи от старых к новым; `session` - только записи сессии, `limit` - только последние.
+        """
+        with self._lock:
+            records = [record for record in self._records if session is None or record['session'] == session]
+        return records[-limit:] if limit else records
+
+    def frame(self, session: Optional[str] = None, limit: Optional[int] = None) -> pd.DataFrame:
+        """
+        Последние записи в виде таблицы, от новых к старым.
+        """
+        records = self.records(session, limit)[::-1]
+        columns = ['time', 'stage', 'name', 'status', 'wall_ms', 'cpu_ms', 'peak_mb', 'inputs', 'output', 'parent']
+        frame = pd.DataFrame(records, columns=columns + ['session', 'thread'])[columns]
+        frame['time'] = pd.to_datetime(frame['time'], unit='s').dt.strftime('%H:%M:%S')
+        for field in ('inputs', 'output'):
+            frame[field] = frame[field].map(lambda value: '' if not value else json.dumps(value, ensure_ascii=False))
+        return frame
+
+    def summary(self, session: Optional[str] = None) -> pd.DataFrame:
+        """
+        Сводка по функциям: число вызовов, последнее, среднее и максимальное время, пиковая память.
+        """
+        records = self.records(session)
+        if not records:
+            return pd.DataFrame(columns=['stage', 'name', 'calls', 'last_ms', 'mean_ms', 'max_ms', 'cpu_ms', 'peak_mb'])
+        frame = pd.DataFrame(records)
+        summary = frame.groupby(['stage', 'name'], sort=False).agg(
+            calls=('wall_ms', 'size'), last_ms=('wall_ms', 'last'), mean_ms=('wall_ms', 'mean'),
+            max_ms=('wall_ms', 'max'), cpu_ms=('cpu_ms', 'mean'), peak_mb=('peak_mb', 'max')).reset_index()
+        return summary.sort_values('max_ms', ascending=False).round(1)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._records.clear()
+
+
+recorder = Recorder()
+
+# Стек вложенных замеров потока: имя и наибольший пик памяти вложенных вызовов
+_frames = threading.local()
+
+
+def _input_sizes(args: tuple, kwargs: dict) -> List[Dict[str, Any]]:
+    sizes = []
+    for value in list(args) + list(kwargs.values()):
+        size = describe(value)
+        if size is not None and size['type'] not in ('list', 'dict', 'set', 'tuple'):
+            sizes.append(size)
+    return sizes
+
+
+class _Measurement:
+    """
+    Один замер: запускается перед вызовом и записывается после него.
+    """
+
+    def __init__(self, name: str, stage: str, args: tuple, kwargs: dict):
+        self.name, self.stage = name, stage
+        self.inputs = _input_sizes(args, kwargs)
+        stack = getattr(_frames, 'stack', None)
+        if stack is None:
+            stack = _frames.stack = []
+        self.stack = stack
+        self.parent = stack[-1]['name'] if stack else None
+        self.frame = {'name': name, 'peak': 0}
+        self.tracing = tracemalloc.is_tracing()
+        if self.tracing:
+            # Пик вложенного вызова сбрасывает общий пик, поэтому внешний замер учитывает пики вложенных
+            self.start_memory, start_peak = tracemalloc.get_traced_memory()
+            if stack:
+                stack[-1]['peak'] = max(stack[-1]['peak'], start_peak)
+            tracemalloc.reset_peak()
+        stack.append(self.frame)
+        self.started, self.started_cpu = time.perf_counter(), time.thread_time()
+        self.timestamp = time.time()
+
+    def finish(self, status: str, result: Any = None) -> None:
+        wall, cpu = time.perf_counter() - self.started, time.thread_time() - self.started_cpu
+        self.stack.pop()
+        peak_mb = None
+        if self.tracing and tracemalloc.is_tracing():
+            _, peak = tracemalloc.get_traced_memory()
+            peak = max(peak, self.frame['peak'])
+            if self.stack:
+                self.stack[-1]['peak'] = max(self.stack[-1]['peak'], peak)
+            peak_mb = round(max(peak - self.start_memory, 0) / 2**20, 2)
+        recorder.add({
+            'time': self.timestamp, 'session': session_resolver(), 'thread': threading.current_thread().name,
+            'stage': self.stage, 'name': self.name, 'parent': self.parent, 'status': status,
+            'wall_ms': round(wall * 1000, 2), 'cpu_ms': round(cpu * 1000, 2), 'peak_mb': peak_mb,
+            'inputs': self.inputs, 'output': describe(result) if status == 'ok' else None,
+        })
+
+
+def instrument(name: Optional[str] = None, stage: str = 'netfunction'):
+    """
+    Декоратор замеров: для каждого вызова записывает время, процессорное время потока, пиковое
+    выделение памяти (если включен tracemalloc) и размеры входов и результата (см. `describe`).
+
+    Вложенные вызовы записываются отдельно с именем внешнего вызова в поле 'parent'.
+    Процессорное время считается по вызывающему потоку; пик памяти общий для процесса,
+    поэтому при одновременных вычислениях в нескольких потоках он приблизителен.
+
+    :param name: Имя в записях; по умолчанию - qualname функции.
+    :param stage: Слой приложения ('netfunction', 'app', ...).
+
+
+    Пример использования:
+      >>> @instrument(stage='app')
+      ... def processed_data():
+      ...     return load_vacancies(path)
+
+    """
+    def decorator(func):
+        label = name or func.__qualname__
+        # Стек вложенных замеров привязан к потоку, а корутины одного потока чередуются
+        if inspect.iscoroutinefunction(func):
+            raise TypeError("instrument поддерживает только синхронные функции.")
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not enabled:
+                return func(*args, **kwargs)
+            measurement = _Measurement(label, stage, args, kwargs)
+            try:
+                result = func(*args, **kwargs)
+            except BaseException as error:
+                measurement.finish(type(error).__name__)
+                raise
+            measurement.finish('ok', result)
+            return result
+        return wrapper
+    return decorator
@@ -1,102 +1,986 @@
+import abc
+import contextvars
+import hashlib
+import multiprocessing
+import os
+import pickle
+import sys
+import threading
+import time
+import warnings
 import networkx as nx
 import numpy as np
 import pandas as pd
-from collections import defaultdict
-from itertools import combinations
+import scipy.sparse as sp
+import weakref
+from collections import OrderedDict, defaultdict
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, wait, FIRST_COMPLETED
+from concurrent.futures.process import BrokenProcessPool
+from multiprocessing import shared_memory
+from itertools import chain, combinations
 from typing import Union, Dict, List, Tuple, Any, Optional
 
 from sklearn.preprocessing import MinMaxScaler
 
+from diagnostics import instrument
+from regions import federal_districts, get_federal_district, map_federal_districts, normalize_region
 
-federal_districts = {
-    "Центральный": ["Москва", "Московская область", "Белгородская область", "Брянская область", "Владимирская область",
-                    "Воронежская область", "Ивановская область", "Калужская область", "Костромская область",
-                    "Курская область", "Липецкая область", "Орловская область", "Рязанская область",
-                    "Смоленская область", "Тамбовская область", "Тверская область", "Тульская область",
-                    "Ярославская область"],
 
-    "Северо-Западный": ["Санкт-Петербург", "Ленинградская область", "Архангельская область", "Вологодская область",
-                        "Калининградская область", "Республика Карелия", "Республика Коми", "Мурманская область",
-                        "Ненецкий автономный округ", "Новгородская область", "Псковская область"],
+def _smallest_int_dtype(max_value: int, min_value: int = 0) -> np.dtype:
+    """
+    Возвращает наименьший знаковый целочисленный тип, вмещающий диапазон [min_value, max_value].
+    """
+    for dtype in (np.int8, np.int16, np.int32):
+        info = np.iinfo(dtype)
+        if info.min <= min_value and max_value <= info.max:
+            return np.dtype(dtype)
+    return np.dtype(np.int64)
+
+
+def _as_skill_lists(skills: pd.Series) -> List[list]:
+    # Пропуски трактуются как пустой список навыков, чтобы строки не сдвигались
+    return [value if isinstance(value, list) else [] for value in skills]
+
+
+def _is_sparse_frame(matrix: pd.DataFrame) -> bool:
+    return len(matrix.columns) > 0 and all(isinstance(dtype, pd.SparseDtype) for dtype in matrix.dtypes)
+
+
+def _as_csr(matrix: Union[pd.DataFrame, sp.spmatrix, np.ndarray]) -> sp.csr_matrix:
+    """
+    Приводит матрицу (плотный или разреженный DataFrame, массив, scipy.sparse) к формату CSR
+    без промежуточного плотного представления для разреженных входов.
+    """
+    if sp.issparse(matrix):
+        return sp.csr_matrix(matrix)
+    if isinstance(matrix, pd.DataFrame):
+        if _is_sparse_frame(matrix):
+            return matrix.sparse.to_coo().tocsr()
+        return sp.csr_matrix(matrix.to_numpy())
+    return sp.csr_matrix(np.asarray(matrix))
+
+
+def _encode_skill_lists(skills: pd.Series,
+                        vocabulary: Optional[List[str]] = None) -> Tuple[np.ndarray, np.ndarray, List[str]]:
+    """
+    Разворачивает списки навыков в плоские массивы позиций строк и кодов навыков за один проход.
+
+    Вхождения навыков, отсутствующих в заданном словаре, отбрасываются.
+    """
+    lists = _as_skill_lists(skills)
+    lengths = np.fromiter((len(values) for values in lists), dtype=np.int64, count=len(lists))
+    flat = np.array(list(chain.from_iterable(lists)), dtype=object)
+
+    if vocabulary is None:
+        codes, uniques = pd.factorize(flat, sort=True)
+        vocabulary = uniques.tolist()
+    else:
+        vocabulary = list(vocabulary)
+        codes = pd.Index(vocabulary).get_indexer(flat)
+
+    rows = np.repeat(np.arange(len(lists)), lengths)
+    known = codes >= 0
+    return rows[known], codes[known], vocabulary
+
+
+class EncodedSkills:
+    """
+    Компактное представление столбца списков навыков: общий отсортированный словарь `vocabulary`
+    и CSR-массивы `offsets`/`ids` (int32). Навыки i-й строки - vocabulary[ids[offsets[i]:offsets[i + 1]]].
+
+    Строится один раз для обработанного набора данных; построители матриц принимают его через параметр
+    `encoded` и выбирают строки по индексу переданного DataFrame (или по позициям `take`),
+    не разбирая и не хешируя строки навыков повторно.
+
+    Пример использования:
+     >>> encoded = EncodedSkills.from_series(data['Обработанные навыки'])
+     >>> create_co_occurrence_matrix(filtered, 'Обработанные навыки', encoded=encoded)
+
+    """
+
+    __slots__ = ('vocabulary', 'offsets', 'ids')
+
+    def __init__(self, vocabulary: np.ndarray, offsets: np.ndarray, ids: np.ndarray):
+        self.vocabulary = vocabulary
+        self.offsets = offsets
+        self.ids = ids
+
+    @classmethod
+    @instrument()
+    def from_series(cls, skills: pd.Series) -> "EncodedSkills":
+        """
+        Кодирует Series списков навыков; пропуски считаются пустыми списками.
+        """
+        lists = _as_skill_lists(skills)
+        lengths = np.fromiter((len(values) for values in lists), dtype=np.int64, count=len(lists))
+        codes, uniques = pd.factorize(np.array(list(chain.from_iterable(lists)), dtype=object), sort=True)
+        offsets = np.concatenate([[0], np.cumsum(lengths)])
+        offsets_dtype = np.int32 if offsets[-1] <= np.iinfo(np.int32).max else np.int64
+        return cls(np.asarray(uniques, dtype=object), offsets.astype(offsets_dtype), codes.astype(np.int32))
+
+    def __len__(self) -> int:
+        return len(self.offsets) - 1
+
+    def take(self, rows: Union[np.ndarray, pd.Index, List[int]]) -> "EncodedSkills":
+        """
+        Возвращает представление для подмножества строк (позиций) с тем же словарем.
+        """
+        rows = np.asarray(rows, dtype=np.int64)
+        starts = self.offsets[rows].astype(np.int64)
+        lengths = self.offsets[rows + 1] - starts
+        offsets = np.concatenate([[0], np.cumsum(lengths)])
+        # Позиции навыков выбранных строк без цикла по строкам
+        gather = np.repeat(starts - offsets[:-1], lengths) + np.arange(offsets[-1])
+        return EncodedSkills(self.vocabulary, offsets.astype(self.offsets.dtype), self.ids[gather])
+
+    def csr(self) -> sp.csr_matrix:
+        """
+        Матрица инцидентности «строка × навык» по всему словарю, построенная прямо из offsets/ids.
+        """
+        return sp.csr_matrix((np.ones(len(self.ids), dtype=np.int32), self.ids, self.offsets),
+                             shape=(len(self), len(self.vocabulary)))
+
+    def decode(self, row: int) -> List[str]:
+        return self.vocabulary[self.ids[self.offsets[row]:self.offsets[row + 1]]].tolist()
+
+    def incidence(self, vocabulary: Optional[List[str]] = None) -> Tuple[sp.csr_matrix, List[str]]:
+        """
+        Матрица инцидентности «строка × навык». Без `vocabulary` столбцы - навыки, встречающиеся в строках,
+        в порядке общего словаря; с `vocabulary` - заданный словарь (прочие навыки игнорируются).
+        """
+        if vocabulary is None:
+            present = np.flatnonzero(np.bincount(self.ids, minlength=len(self.vocabulary)))
+            columns = np.full(len(self.vocabulary), -1, dtype=np.int64)
+            columns[present] = np.arange(len(present))
+            vocabulary = self.vocabulary[present].tolist()
+        else:
+            vocabulary = list(vocabulary)
+            columns = pd.Index(vocabulary).get_indexer(self.vocabulary)
+
+        codes = columns[self.ids]
+        rows = np.repeat(np.arange(len(self)), np.diff(self.offsets))
+        known = codes >= 0
+        incidence = sp.coo_matrix((np.ones(known.sum(), dtype=np.int32), (rows[known], codes[known])),
+                                  shape=(len(self), len(vocabulary))).tocsr()
+        return incidence, vocabulary
+
+
+def _skills_source(df: pd.DataFrame, skills_field: str, encoded: Optional[EncodedSkills],
+                   rows: Optional[np.ndarray] = None) -> Union[pd.Series, EncodedSkills]:
+    # Строки закодированного представления соответствуют позициям обработанного набора (его индексу),
+    # `rows` - позиции строк внутри df (например, результат FilterEngine.select)
+    if encoded is None:
+        return df[skills_field] if rows is None else df[skills_field].iloc[rows]
+    positions = df.index.to_numpy()
+    return encoded.take(positions if rows is None else positions[rows])
+
+
+def skills_incidence_matrix(skills: Union[pd.Series, EncodedSkills],
+                            vocabulary: Optional[List[str]] = None) -> Tuple[sp.csr_matrix, List[str]]:
+    """
+    Создает разреженную матрицу инцидентности «вакансия × навык» в формате CSR.
 
-    "Южный": ["Республика Адыгея", "Астраханская область", "Волгоградская область", "Республика Калмыкия",
-              "Краснодарский край", "Ростовская область", "Севастополь", "Республика Крым",
-              "Луганская народная республика", "Донецкая народная республика",
-              "Херсонская область", "Запорожская область"],
+    Элемент (i, j) равен числу вхождений навыка j в список навыков i-й строки.
+    Пропущенные значения считаются пустыми списками, поэтому строки матрицы совпадают со строками `skills`.
 
-    "Северо-Кавказский": ["Республика Дагестан", "Республика Ингушетия", "Кабардино-Балкарская республика",
-                          "Карачаево-Черкесская Республика", "Республика Северная Осетия-Алания",
-                          "Чеченская республика", "Ставропольский край"],
+    :param skills: Series, где каждый элемент является списком навыков, или `EncodedSkills`.
+    :param vocabulary: Упорядоченный словарь навыков (столбцы матрицы). Навыки вне словаря игнорируются.
+     Если не задан, используются все уникальные навыки в отсортированном порядке.
+    :return: Кортеж (матрица инцидентности, словарь навыков).
 
-    "Приволжский": ["Республика Башкортостан", "Республика Марий Эл", "Республика Мордовия", "Республика Татарстан",
-                    "Удмуртская Республика", "Чувашская Республика", "Кировская область", "Нижегородская область",
-                    "Оренбургская область", "Пензенская область", "Пермский край", "Самарская область",
-                    "Саратовская область", "Ульяновская область"],
 
-    "Уральский": ["Курганская область", "Свердловская область", "Тюменская область", "Челябинская область",
-                  "Ханты-Мансийский автономный округ — Югра", "Ямало-Ненецкий АО"],
+    Пример использования:
+      >>> incidence, skills = skills_incidence_matrix(df['Обработанные навыки'])
+
+    """
+    if isinstance(skills, EncodedSkills):
+        return skills.incidence(vocabulary)
+
+    rows, codes, vocabulary = _encode_skill_lists(skills, vocabulary)
+    incidence = sp.coo_matrix((np.ones(len(codes), dtype=np.int32), (rows, codes)),
+                              shape=(len(skills), len(vocabulary))).tocsr()
+    return incidence, vocabulary
+
+
+# Параллельный подсчет co-occurrence: матрица XᵀX делится на полосы строк (навыков), каждый процесс
+# считает свою полосу X[:, a:b]ᵀX целиком, и полосы складываются друг под другом без суммирования частичных матриц.
+# Массивы X (CSR) и Xᵀ (CSR, то есть CSC матрицы X) передаются процессам через общую память,
+# а не сериализацией списков навыков.
+
+# Число процессов по умолчанию задается переменной NETWORK_NAVYK_JOBS (0 - по числу ядер). По умолчанию подсчет
+# последовательный: пул включают явно там, где выигрыш замерен (benchmark.py --jobs)
+CO_OCCURRENCE_JOBS = int(os.environ.get('NETWORK_NAVYK_JOBS', 1))
+
+# Меньшие матрицы инцидентности считаются в текущем процессе: запуск полос дороже самого подсчета
+PARALLEL_MIN_NNZ = 1_000_000
+
+# Полос больше, чем процессов, чтобы процессы были загружены равномерно
+STRIPES_PER_JOB = 4
+
+_process_pool: Optional[ProcessPoolExecutor] = None
+_process_pool_jobs = 0
+_process_pool_lock = threading.Lock()
+
+
+def _resolve_jobs(n_jobs: Optional[int]) -> int:
+    n_jobs = CO_OCCURRENCE_JOBS if n_jobs is None else n_jobs
+    return n_jobs if n_jobs > 0 else (os.cpu_count() or 1)
+
+
+def _get_process_pool(n_jobs: int) -> ProcessPoolExecutor:
+    # Пул создается один раз на процесс. Процессы запускаются через forkserver: fork из многопоточного
+    # приложения может унаследовать захваченные блокировки
+    global _process_pool, _process_pool_jobs
+    with _process_pool_lock:
+        if _process_pool is None or _process_pool_jobs != n_jobs:
+            if _process_pool is not None:
+                _process_pool.shutdown(wait=False)
+            method = 'forkserver' if 'forkserver' in multiprocessing.get_all_start_methods() else 'spawn'
+            _process_pool = ProcessPoolExecutor(max_workers=n_jobs, mp_context=multiprocessing.get_context(method))
+            _process_pool_jobs = n_jobs
+        return _process_pool
+
+
+def _discard_process_pool(pool: ProcessPoolExecutor) -> None:
+    # Пул с упавшим процессом больше не принимает задачи; следующий вызов создаст новый
+    global _process_pool, _process_pool_jobs
+    with _process_pool_lock:
+        if _process_pool is pool:
+            _process_pool, _process_pool_jobs = None, 0
+    pool.shutdown(wait=False, cancel_futures=True)
+
+
+def _to_shared(array: np.ndarray) -> Tuple[shared_memory.SharedMemory, Tuple[str, str, int]]:
+    block = shared_memory.SharedMemory(create=True, size=max(array.nbytes, 1))
+    np.ndarray(array.shape, dtype=array.dtype, buffer=block.buf)[:] = array
+    return block, (block.name, array.dtype.str, len(array))
+
+
+def _gram_stripe(buffers: List[Tuple[str, str, int]], shape: Tuple[int, int], start: int, stop: int) -> sp.csr_matrix:
+    # Выполняется в процессе пула: строки [start, stop) матрицы XᵀX по X и Xᵀ из общей памяти
+    blocks = [shared_memory.SharedMemory(name=name) for name, _, _ in buffers]
+    try:
+        (indptr, indices, data, t_indptr, t_indices, t_data) = (
+            np.ndarray((length,), dtype=np.dtype(dtype), buffer=block.buf)
+            for block, (_, dtype, length) in zip(blocks, buffers))
+        X = sp.csr_matrix((data, indices, indptr), shape=shape, copy=False)
+        low, high = int(t_indptr[start]), int(t_indptr[stop])
+        stripe = sp.csr_matrix((t_data[low:high], t_indices[low:high], t_indptr[start:stop + 1] - low),
+                               shape=(stop - start, shape[0]), copy=False)
+        # Результат - новый массив; ссылки на общую память освобождаются до ее закрытия
+        product = (stripe @ X).tocsr()
+        X = stripe = indptr = indices = data = t_indptr = t_indices = t_data = None
+    finally:
+        for block in blocks:
+            block.close()
+    return product
+
+
+def _parallel_gram(incidence: sp.csr_matrix, n_jobs: int) -> sp.csr_matrix:
+    """
+    Считает XᵀX в пуле процессов полосами строк результата. Границы полос выбираются по оценке работы
+    столбца j - суммарной длине строк X, содержащих j. Результат совпадает с последовательным
+    произведением: каждый элемент считается одним процессом в том же целочисленном типе.
+    """
+    n_columns = incidence.shape[1]
+    transposed = incidence.T.tocsr()
+    row_lengths = np.diff(incidence.indptr)
+    work = np.cumsum(np.bincount(incidence.indices, weights=row_lengths[np.repeat(
+        np.arange(incidence.shape[0]), row_lengths)], minlength=n_columns))
+    n_stripes = min(n_jobs * STRIPES_PER_JOB, n_columns)
+    bounds = np.searchsorted(work, np.linspace(0, work[-1], n_stripes + 1)[1:-1], side='left') + 1
+    bounds = np.unique(np.concatenate([[0], np.minimum(bounds, n_columns), [n_columns]]))
+
+    shared = [_to_shared(np.ascontiguousarray(array))
+              for array in (incidence.indptr, incidence.indices, incidence.data,
+                            transposed.indptr, transposed.indices, transposed.data)]
+    buffers = [descriptor for _, descriptor in shared]
+    pool = _get_process_pool(n_jobs)
+    try:
+        stripes = [None] * (len(bounds) - 1)
+        pending = {pool.submit(_gram_stripe, buffers, incidence.shape, int(start), int(stop)): position
+                   for position, (start, stop) in enumerate(zip(bounds[:-1], bounds[1:]))}
+        try:
+            while pending:
+                done, _ = wait(pending, timeout=0.2, return_when=FIRST_COMPLETED)
+                for future in done:
+                    stripes[pending.pop(future)] = future.result()
+                check_cancelled()
+        finally:
+            for future in pending:
+                future.cancel()
+        return sp.vstack(stripes, format='csr')
+    except BrokenProcessPool:
+        _discard_process_pool(pool)
+        raise
+    finally:
+        for block, _ in shared:
+            block.close()
+            block.unlink()
+
+
+def _co_occurrence_kernel(incidence: sp.csr_matrix, n_jobs: Optional[int] = None) -> sp.csr_matrix:
+    """
+    Считает матрицу co-occurrence как XᵀX по матрице инцидентности X.
+
+    Вне диагонали XᵀX совпадает с числом пар из `combinations()`. На диагонали XᵀX дает сумму квадратов
+    кратностей навыка, тогда как пары одинаковых навыков дают c·(c - 1), поэтому из диагонали вычитаются
+    суммы по столбцам. Результат приводится к наименьшему подходящему целочисленному типу.
+    При n_jobs > 1 и матрице не меньше PARALLEL_MIN_NNZ ненулевых элементов XᵀX считается в пуле процессов.
+    """
+    X = incidence.astype(np.int64)
+    n_jobs = _resolve_jobs(n_jobs)
+    if n_jobs > 1 and X.nnz >= PARALLEL_MIN_NNZ and X.shape[0] > 1:
+        co_occurrence = _parallel_gram(X, min(n_jobs, X.shape[0]))
+    else:
+        co_occurrence = (X.T @ X).tocsr()
+    co_occurrence -= sp.diags(np.asarray(X.sum(axis=0)).ravel(), format='csr', dtype=X.dtype)
+    co_occurrence.eliminate_zeros()
+    max_value = co_occurrence.data.max() if co_occurrence.nnz else 0
+    return co_occurrence.astype(_smallest_int_dtype(max_value))
+
+
+def co_occurrence_sparse(skills: Union[pd.Series, EncodedSkills],
+                         vocabulary: Optional[List[str]] = None,
+                         n_jobs: Optional[int] = None) -> Tuple[sp.csr_matrix, List[str]]:
+    """
+    Вычисляет разреженную матрицу co-occurrence навыков без плотной матрицы размера len(all_skills)².
+
+    :param skills: Series, где каждый элемент является списком навыков, или `EncodedSkills`.
+    :param vocabulary: Упорядоченный словарь навыков. Если не задан, берутся все навыки в отсортированном порядке.
+    :param n_jobs: Число процессов (по умолчанию - CO_OCCURRENCE_JOBS, то есть 1; 0 - по числу ядер).
+    :return: Кортеж (симметричная CSR-матрица наименьшего подходящего целочисленного типа, словарь навыков).
+
+
+    Пример использования:
+      >>> co_occurrence, skills = co_occurrence_sparse(df['Обработанные навыки'])
+
+    """
+    incidence, vocabulary = skills_incidence_matrix(skills, vocabulary)
+    return _co_occurrence_kernel(incidence, n_jobs), vocabulary
+
+
+# Частые наборы навыков (Apriori): наборы растут по уровням, кандидаты считаются сортировкой ключей
+
+def _transactions(skills: Union[pd.Series, EncodedSkills]) -> Tuple[sp.csr_matrix, np.ndarray]:
+    # Бинарная матрица «вакансия × навык» с отсортированными столбцами в строках: повторы навыка в вакансии не учитываются
+    incidence, vocabulary = skills_incidence_matrix(skills)
+    incidence = incidence.tocsr()
+    incidence.sum_duplicates()
+    incidence.data = np.ones(len(incidence.data), dtype=np.int8)
+    incidence.sort_indices()
+    return incidence, vocabulary
 
-    "Сибирский": ["Алтайский край", "Красноярский край", "Иркутская область", "Кемеровская область",
-                  "Новосибирская область", "Омская область", "Томская область", "Республика Тыва",
-                  "Республика Хакасия", "Республика Бурятия", "Забайкальский край"],
 
-    "Дальневосточный": ["Амурская область", "Еврейская автономная область", "Камчатский край", "Магаданская область",
-                        "Приморский край", "Сахалинская область", "Хабаровский край", "Чукотский автономный округ",
-                        "Республика Бурятия", "Забайкальский край", "Республика Саха (Якутия)"]
-}
+def _min_count(min_support: Union[int, float], n_transactions: int) -> int:
+    if isinstance(min_support, float):
+        if not 0 < min_support <= 1:
+            raise ValueError("Доля min_support должна быть в интервале (0, 1].")
+        return max(int(np.ceil(min_support * n_transactions)), 1)
+    if min_support < 1:
+        raise ValueError("Абсолютная поддержка min_support должна быть не меньше 1.")
+    return int(min_support)
 
 
-def get_federal_district(region):
-    for district, regions in federal_districts.items():
-        if region in regions:
-            return district
-    return "Неизвестно"
+def _extensions(occurrence_ids: np.ndarray, occurrence_positions: np.ndarray, items: np.ndarray,
+                ends: np.ndarray, chunk_size: int):
+    """
+    Перебирает блоками расширения вхождений наборов: вхождение (набор, позиция последнего навыка в строке)
+    дополняется каждым следующим навыком той же строки. Размер блока ограничен `chunk_size` расширений.
+    Возвращает тройки (номер набора-родителя, новый навык, позиция нового навыка).
+    """
+    lengths = ends[occurrence_positions] - occurrence_positions - 1
+    bounds = np.concatenate([[0], np.cumsum(lengths)])
+    start = 0
+    while start < len(lengths):
+        stop = max(int(np.searchsorted(bounds, bounds[start] + chunk_size, side='right')) - 1, start + 1)
+        check_cancelled()
+        block_lengths = lengths[start:stop]
+        total = int(block_lengths.sum())
+        if total:
+            owners = np.repeat(np.arange(start, stop), block_lengths)
+            offsets = np.arange(total) - np.repeat(bounds[start:stop] - bounds[start], block_lengths)
+            positions = occurrence_positions[owners] + 1 + offsets
+            yield occurrence_ids[owners], items[positions], positions
+        start = stop
+
+
+def _mine_itemsets(incidence: sp.csr_matrix, min_count: int, max_size: int,
+                   chunk_size: int = 20_000_000) -> List[Tuple[np.ndarray, np.ndarray]]:
+    """
+    Находит частые наборы размеров 1..max_size по бинарной CSR-матрице «вакансия × навык».
+
+    Уровень L+1 строится из вхождений частых наборов уровня L: каждое вхождение расширяется следующими
+    навыками строки, кандидат кодируется ключом «номер набора-родителя × число навыков + навык».
+    Кандидат отбрасывается до подсчета, если его подмножество без предпоследнего навыка не частое (Apriori),
+    остальные считаются сортировкой ключей (`np.unique`) поблочно. Память пропорциональна числу вхождений
+    частых наборов, а не числу всех сочетаний.
 
+    :return: Для каждого размера пара (навыки наборов - массив (m, размер) столбцов матрицы, поддержка - (m,)).
+    """
+    item_counts = np.bincount(incidence.indices, minlength=incidence.shape[1])
+    frequent_items = np.flatnonzero(item_counts >= min_count)
+    if not len(frequent_items):
+        return []
+    n_items = len(frequent_items)
+
+    # Транзакции только из частых навыков; новые коды сохраняют порядок столбцов внутри строк
+    remap = np.full(incidence.shape[1], -1, dtype=np.int64)
+    remap[frequent_items] = np.arange(n_items)
+    codes = remap[incidence.indices]
+    row_of = np.repeat(np.arange(incidence.shape[0]), np.diff(incidence.indptr))[codes >= 0]
+    items = codes[codes >= 0]
+    row_bounds = np.searchsorted(row_of, np.arange(incidence.shape[0] + 1))
+    ends = row_bounds[row_of + 1]
+
+    levels = [(np.arange(n_items, dtype=np.int64), np.zeros(n_items, dtype=np.int64), item_counts[frequent_items])]
+    occurrence_ids, occurrence_positions = items, np.arange(len(items))
+
+    for size in range(2, max_size + 1):
+        keys, parents, _ = levels[-1]
+
+        def candidates():
+            for parent, item, positions in _extensions(occurrence_ids, occurrence_positions, items, ends, chunk_size):
+                key = parent * n_items + item
+                if size > 2:
+                    # Подмножество «родитель без последнего навыка + новый навык» должно быть частым
+                    subset = parents[parent] * n_items + item
+                    found = np.minimum(np.searchsorted(keys, subset), len(keys) - 1)
+                    known = keys[found] == subset
+                    key, positions = key[known], positions[known]
+                yield key, positions
+
+        block_keys, block_counts = [], []
+        for key, _ in candidates():
+            unique, counts = np.unique(key, return_counts=True)
+            block_keys.append(unique)
+            block_counts.append(counts)
+        if not block_keys:
+            break
+        unique, inverse = np.unique(np.concatenate(block_keys), return_inverse=True)
+        counts = np.bincount(inverse, weights=np.concatenate(block_counts)).astype(np.int64)
+        frequent = counts >= min_count
+        if not frequent.any():
+            break
+        new_keys = unique[frequent]
+        levels.append((new_keys, new_keys // n_items, counts[frequent]))
+
+        if size < max_size:
+            # Вхождения новых частых наборов - второй проход по тем же кандидатам
+            ids, positions_list = [], []
+            for key, positions in candidates():
+                found = np.minimum(np.searchsorted(new_keys, key), len(new_keys) - 1)
+                known = new_keys[found] == key
+                ids.append(found[known])
+                positions_list.append(positions[known])
+            occurrence_ids, occurrence_positions = np.concatenate(ids), np.concatenate(positions_list)
+
+    # Навыки наборов восстанавливаются по цепочке родителей
+    result = []
+    for size, (keys, _, counts) in enumerate(levels, start=1):
+        members = np.empty((len(keys), size), dtype=np.int64)
+        current = keys
+        for level in range(size - 1, -1, -1):
+            members[:, level] = current % n_items
+            if level:
+                current = levels[level - 1][0][current // n_items]
+        result.append((frequent_items[members], counts))
+    return result
+
+
+@instrument()
+def frequent_itemsets(skills: Union[pd.Series, EncodedSkills], min_support: Union[int, float] = 0.01,
+                      max_size: int = 3, min_size: int = 1, chunk_size: int = 20_000_000) -> pd.DataFrame:
+    """
+    Находит частые наборы навыков (встречающиеся вместе не менее чем в min_support вакансий).
 
+    Наборы растут по уровням с отсечением по поддержке (Apriori): кандидаты размера L+1 порождаются только
+    из вхождений частых наборов размера L и считаются сортировкой целочисленных ключей блоками
+    по `chunk_size`, поэтому поиск применим к сотням тысяч вакансий при разумной поддержке.
+    Навык, повторенный в вакансии, учитывается один раз.
+
+    :param skills: Series списков навыков или `EncodedSkills`.
+    :param min_support: Минимальная поддержка: доля вакансий (float в (0, 1]) или число вакансий (int).
+    :param max_size: Наибольший размер набора.
+    :param min_size: Наименьший размер набора в результате.
+    :param chunk_size: Наибольшее число кандидатов в одном блоке подсчета.
+    :return: DataFrame в длинном формате, по строке на набор: 'Itemset' (кортеж навыков по словарю),
+     'Size', 'Count' (число вакансий) и 'Support' (доля вакансий); по убыванию Count внутри размера.
+
+
+    Пример использования:
+      >>> itemsets = frequent_itemsets(data['Обработанные навыки'], min_support=0.005, max_size=4)
+      >>> rules = association_rules(itemsets, min_confidence=0.6)
+
+    """
+    if max_size < 1 or min_size < 1:
+        raise ValueError("Размеры набора max_size и min_size должны быть не меньше 1.")
+    incidence, vocabulary = _transactions(skills)
+    n_transactions = incidence.shape[0]
+    levels = _mine_itemsets(incidence, _min_count(min_support, n_transactions), max_size, chunk_size)
+
+    vocabulary = np.asarray(vocabulary, dtype=object)
+    frames = []
+    for members, counts in levels:
+        size = members.shape[1]
+        if size < min_size:
+            continue
+        order = np.lexsort(tuple(members[:, column] for column in range(size - 1, -1, -1)) + (-counts,))
+        names = vocabulary[members[order]]
+        frames.append(pd.DataFrame({'Itemset': list(map(tuple, names)), 'Size': size, 'Count': counts[order],
+                                    'Support': counts[order] / max(n_transactions, 1)}))
+    if not frames:
+        return pd.DataFrame({'Itemset': pd.Series(dtype=object), 'Size': pd.Series(dtype=np.int64),
+                             'Count': pd.Series(dtype=np.int64), 'Support': pd.Series(dtype=np.float64)})
+    return pd.concat(frames, ignore_index=True)
+
+
+@instrument()
+def association_rules(itemsets: pd.DataFrame, min_confidence: float = 0.5,
+                      min_lift: Optional[float] = None) -> pd.DataFrame:
+    """
+    Строит ассоциативные правила «посылка → следствие» по частым наборам.
+
+    Для каждого набора из двух и более навыков перебираются все разбиения на непустые посылку и следствие.
+    Поддержки подмножеств берутся из тех же результатов: все подмножества частого набора тоже частые.
+
+    :param itemsets: Результат `frequent_itemsets` с min_size=1 (нужны поддержки всех подмножеств).
+    :param min_confidence: Минимальная достоверность P(следствие | посылка).
+    :param min_lift: Минимальный подъем (lift); None - без ограничения.
+    :return: DataFrame с полями 'Antecedent', 'Consequent' (кортежи навыков), 'Count', 'Support',
+     'Confidence' и 'Lift' по убыванию Lift.
+
+
+    Пример использования:
+      >>> rules = association_rules(frequent_itemsets(data['Обработанные навыки'], min_support=0.01))
+      >>> rules[rules['Antecedent'] == ('Python',)]
+
+    """
+    columns = ['Antecedent', 'Consequent', 'Count', 'Support', 'Confidence', 'Lift']
+    if itemsets.empty:
+        return pd.DataFrame(columns=columns)
+    n_transactions = float((itemsets['Count'] / itemsets['Support']).iloc[0])
+    counts = dict(zip(itemsets['Itemset'], itemsets['Count']))
+
+    rules = []
+    for size, group in itemsets[itemsets['Size'] >= 2].groupby('Size'):
+        members = list(group['Itemset'])
+        totals = group['Count'].to_numpy(dtype=np.float64)
+        for antecedent_size in range(1, size):
+            for positions in combinations(range(size), antecedent_size):
+                rest = [position for position in range(size) if position not in positions]
+                antecedents = [tuple(itemset[position] for position in positions) for itemset in members]
+                consequents = [tuple(itemset[position] for position in rest) for itemset in members]
+                try:
+                    antecedent_counts = np.array([counts[itemset] for itemset in antecedents], dtype=np.float64)
+                    consequent_counts = np.array([counts[itemset] for itemset in consequents], dtype=np.float64)
+                except KeyError:
+                    raise ValueError("Для правил нужны поддержки всех подмножеств: "
+                                     "вызовите frequent_itemsets с min_size=1.") from None
+                confidence = totals / antecedent_counts
+                rules.append(pd.DataFrame({
+                    'Antecedent': antecedents, 'Consequent': consequents, 'Count': totals.astype(np.int64),
+                    'Support': totals / n_transactions, 'Confidence': confidence,
+                    'Lift': confidence / (consequent_counts / n_transactions)}))
+    if not rules:
+        return pd.DataFrame(columns=columns)
+    rules = pd.concat(rules, ignore_index=True)
+    keep = rules['Confidence'] >= min_confidence
+    if min_lift is not None:
+        keep &= rules['Lift'] >= min_lift
+    return rules[keep].sort_values(['Lift', 'Confidence'], ascending=False, ignore_index=True)
+
+
+@instrument()
 def create_co_occurrence_matrix(df: pd.DataFrame, skills_field: str,
-                                combination_size: int = 2) -> pd.DataFrame:
+                                combination_size: int = 2,
+                                sparse: bool = False,
+                                encoded: Optional[EncodedSkills] = None,
+                                rows: Optional[np.ndarray] = None,
+                                min_support: Union[int, float] = 1,
+                                n_jobs: Optional[int] = None) -> pd.DataFrame:
     """
     Создает матрицу co-occurrence для навыков, основываясь на столбце, где каждый элемент является списком навыков.
 
+    Подсчет выполняется через разреженную матрицу инцидентности «вакансия × навык» X как XᵀX,
+    поэтому время и память зависят от числа ненулевых пар, а не от квадрата размера словаря.
+
     :param df: DataFrame с исходными данными.
     :param skills_field: Название столбца, содержащего списки навыков.
-    :param combination_size: Размер комбинации для подсчета co-occurrence (2 для пар, 3 для троек).
-    :return:
-        - Если combination_size = 2: возвращает квадратную матрицу (DataFrame) с подсчетом парного сосуществования навыков.
-        - Если combination_size = 3: возвращает DataFrame с колонками ['Skill1', 'Skill2', 'Skill3', 'Count'],
-          где каждая строка представляет уникальную тройку навыков и количество их совместного появления.
-    """
-    # Определяем все уникальные навыки
-    all_skills = set()
-    for skills in df[skills_field].dropna():
-        all_skills.update(skills)
-    all_skills = sorted(list(all_skills))
-    skill_index = {skill: idx for idx, skill in enumerate(all_skills)}
-
-    if combination_size:
-        # Инициализируем квадратную матрицу для подсчета пар
-        co_occurrence = np.zeros((len(all_skills), len(all_skills)), dtype=int)
-        for skills in df[skills_field].dropna():
-            unique_skills = [s for s in skills if s in skill_index]
-            for pair in combinations(unique_skills, combination_size):
-                i, j = skill_index[pair[0]], skill_index[pair[1]]
-                co_occurrence[i, j] += 1
-                co_occurrence[j, i] += 1
-        co_occurrence_df = pd.DataFrame(
-            co_occurrence, index=all_skills, columns=all_skills)
-        return co_occurrence_df
+    :param combination_size: Размер комбинации. Для пар (2) возвращается квадратная матрица, для 3 и более -
+     таблица частых сочетаний (см. `frequent_itemsets`).
+    :param sparse: Если True, возвращается DataFrame на основе разреженной матрицы (pd.SparseDtype)
+     наименьшего подходящего целочисленного типа; нули при этом не материализуются.
+    :param encoded: Закодированные навыки обработанного набора (`EncodedSkills`); строки выбираются по df.index,
+     а столбец `skills_field` не читается.
+    :param rows: Позиции учитываемых строк df (см. `FilterEngine.select`); подмножество DataFrame не создается.
+    :param min_support: Для combination_size >= 3 - минимальное число вакансий (int) или их доля (float),
+     в которых встречается сочетание; по умолчанию учитываются все сочетания.
+    :param n_jobs: Число процессов для подсчета пар: каждый процесс считает свою полосу навыков матрицы
+     (по умолчанию - CO_OCCURRENCE_JOBS, то есть 1; 0 - по числу ядер). Результат не зависит от числа процессов.
+    :return: Для пар - квадратная матрица (DataFrame) с подсчетом парного сосуществования навыков;
+     для combination_size >= 3 - DataFrame с полями Skill1..SkillN и Count по убыванию Count.
 
-    else:
+
+    Примеры использования:
+      >>> co_occurrence_df = create_co_occurrence_matrix(df, 'Обработанные навыки')
+    Для троек навыков, встречающихся хотя бы в 50 вакансиях:
+      >>> triples = create_co_occurrence_matrix(df, 'Обработанные навыки', combination_size=3, min_support=50)
+    Для больших словарей навыков:
+      >>> co_occurrence_df = create_co_occurrence_matrix(df, 'Обработанные навыки', sparse=True)
+    На всех ядрах сервера:
+      >>> co_occurrence_df = create_co_occurrence_matrix(df, 'Обработанные навыки', sparse=True, n_jobs=0)
+
+    """
+    if combination_size < 2:
         raise ValueError(
-            "Параметр combination_size должен быть равен 2 или 3.")
+            "Параметр combination_size должен быть не меньше 2.")
+    if combination_size > 2:
+        itemsets = frequent_itemsets(_skills_source(df, skills_field, encoded, rows), min_support=min_support,
+                                     max_size=combination_size, min_size=combination_size)
+        combinations_df = pd.DataFrame(itemsets['Itemset'].tolist(),
+                                       columns=[f'Skill{i}' for i in range(1, combination_size + 1)])
+        combinations_df['Count'] = itemsets['Count'].to_numpy()
+        return combinations_df
+
+    co_occurrence, all_skills = co_occurrence_sparse(_skills_source(df, skills_field, encoded, rows),
+                                                     n_jobs=n_jobs)
+
+    if sparse:
+        return pd.DataFrame.sparse.from_spmatrix(co_occurrence, index=all_skills, columns=all_skills)
+    return pd.DataFrame(co_occurrence.toarray().astype(int), index=all_skills, columns=all_skills)
+
+
+@instrument()
+def create_adjacency_graph(matrix: pd.DataFrame) -> nx.Graph:
+    """
+    Создает неориентированный граф по симметричной матрице смежности.
+
+    Аналог `nx.from_pandas_adjacency`, который не переводит разреженный DataFrame в плотный массив:
+    ребра строятся только по ненулевым элементам верхнего треугольника (включая диагональ).
+
+    :param matrix: Квадратная матрица смежности (плотный или разреженный DataFrame).
+    :return: Граф (Graph) с атрибутом веса ребер 'weight'.
+
+
+    Пример использования:
+      >>> G = create_adjacency_graph(create_co_occurrence_matrix(df, 'Обработанные навыки', sparse=True))
+
+    """
+    adjacency = sp.triu(_as_csr(matrix), format='coo')
+    labels = np.asarray(matrix.index, dtype=object)
+
+    G = nx.Graph()
+    G.add_nodes_from(matrix.index)
+    G.add_weighted_edges_from(zip(labels[adjacency.row], labels[adjacency.col], adjacency.data.tolist()))
+    return G
 
 #  Фильтрация матрицы по метрикам
 
 
+def _list_items_nbytes(column: pd.Series) -> int:
+    # memory_usage(deep=True) учитывает только сами списки, без элементов внутри них;
+    # одна и та же строка в нескольких списках считается один раз
+    lists = [value for value in column.to_numpy() if isinstance(value, (list, tuple))]
+    items = {id(item): item for item in chain.from_iterable(lists)}
+    return sum(map(sys.getsizeof, items.values()))
+
+
+def _graph_nbytes(G: nx.Graph, sample: int = 500) -> int:
+    """
+    Оценка объема графа networkx по выборке узлов: ключи, словари атрибутов узлов, словари смежности
+    и атрибутов ребер (словарь ребра общий для двух концов). Результат масштабируется на весь граф.
+    """
+    # Равномерная выборка: в двудольном графе узлы уровней идут подряд и сильно различаются степенью
+    nodes = list(G._adj)[::max(G.number_of_nodes() // sample, 1)]
+    if not nodes:
+        return sys.getsizeof(G._adj) + sys.getsizeof(G._node)
+
+    def dict_nbytes(attrs: dict) -> int:
+        return sys.getsizeof(attrs) + sum(map(sys.getsizeof, attrs.values()))
+
+    node_bytes, edge_bytes, degree = 0, 0, 0
+    for node in nodes:
+        neighbors = G._adj[node]
+        node_bytes += sys.getsizeof(node) + dict_nbytes(G._node[node]) + sys.getsizeof(neighbors)
+        edge_bytes += sum(dict_nbytes(attrs) for attrs in neighbors.values()) / 2
+        degree += len(neighbors)
+    n_nodes, n_edges = G.number_of_nodes(), G.number_of_edges()
+    per_edge = edge_bytes / degree * 2 if degree else 0
+    return int(node_bytes / len(nodes) * n_nodes + per_edge * n_edges
+               + sys.getsizeof(G._adj) + sys.getsizeof(G._node))
+
+
+def _estimate_nbytes(value: Any) -> int:
+    """
+    Приблизительный объем памяти значения для учета в LRU-кэше.
+    """
+    if isinstance(value, pd.DataFrame):
+        nbytes = int(value.memory_usage(deep=True, index=True).sum())
+        for field in value.columns[value.dtypes == object]:
+            nbytes += _list_items_nbytes(value[field])
+        return nbytes
+    if isinstance(value, np.ndarray):
+        return value.nbytes
+    if sp.issparse(value):
+        value = value.tocsr()
+        return value.data.nbytes + value.indices.nbytes + value.indptr.nbytes
+    if isinstance(value, nx.Graph):
+        # Сериализация большого графа ради оценки слишком дорога - оценка по выборке узлов
+        return _graph_nbytes(value)
+    return len(pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL))
+
+
+class LRUCache:
+    """
+    Потокобезопасный LRU-кэш с ограничением по объему памяти и необязательным хранением на диске.
+
+    При превышении `max_bytes` вытесняются давно не использованные записи. Если задан `directory`,
+    каждая запись дополнительно сохраняется в файл и при промахе в памяти загружается с диска,
+    в том числе после перезапуска процесса. Ключи должны иметь стабильное `repr`.
+
+    Пример использования:
+     >>> cache = LRUCache(max_bytes=64 * 2**20, directory='.cache/centrality')
+     >>> value = cache.get_or_compute(key, lambda: expensive(G))
+
+    """
+
+    def __init__(self, max_bytes: int = 256 * 2**20, directory: Optional[str] = None):
+        self.max_bytes = max_bytes
+        self.directory = directory
+        self.nbytes = 0
+        self._entries: "OrderedDict[Any, Tuple[Any, int]]" = OrderedDict()
+        self._lock = threading.RLock()
+        self._computing: Dict[Any, threading.Lock] = {}
+
+    def _path(self, key: Any) -> str:
+        digest = hashlib.blake2b(repr(key).encode('utf-8'), digest_size=16).hexdigest()
+        return os.path.join(self.directory, f"{digest}.pkl")
+
+    def __contains__(self, key: Any) -> bool:
+        with self._lock:
+            if key in self._entries:
+                return True
+        return self.directory is not None and os.path.exists(self._path(key))
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, key: Any, default: Any = None) -> Any:
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                return self._entries[key][0]
+
+        if self.directory is not None:
+            try:
+                with open(self._path(key), 'rb') as file:
+                    value = pickle.load(file)
+            except (OSError, pickle.UnpicklingError, EOFError):
+                return default
+            self._remember(key, value, _estimate_nbytes(value))
+            return value
+        return default
+
+    def _remember(self, key: Any, value: Any, nbytes: int) -> None:
+        with self._lock:
+            if key in self._entries:
+                self.nbytes -= self._entries.pop(key)[1]
+            if nbytes > self.max_bytes:
+                return
+            self._entries[key] = (value, nbytes)
+            self.nbytes += nbytes
+            while self.nbytes > self.max_bytes:
+                _, (_, evicted) = self._entries.popitem(last=False)
+                self.nbytes -= evicted
+
+    def put(self, key: Any, value: Any, nbytes: Optional[int] = None) -> None:
+        """
+        Сохраняет значение; `nbytes` - объем значения, если известен заранее.
+        """
+        self._remember(key, value, _estimate_nbytes(value) if nbytes is None else nbytes)
+        if self.directory is not None:
+            os.makedirs(self.directory, exist_ok=True)
+            path = self._path(key)
+            temporary = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            with open(temporary, 'wb') as file:
+                pickle.dump(value, file, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(temporary, path)
+
+    def get_or_compute(self, key: Any, compute) -> Any:
+        """
+        Возвращает значение из кэша или вычисляет его функцией без аргументов и сохраняет.
+        Одновременные запросы одного ключа из разных потоков ждут единственного вычисления.
+        """
+        missing = object()
+        value = self.get(key, missing)
+        if value is not missing:
+            return value
+
+        with self._lock:
+            computing = self._computing.setdefault(key, threading.Lock())
+        try:
+            with computing:
+                value = self.get(key, missing)
+                if value is missing:
+                    value = compute()
+                    self.put(key, value)
+        finally:
+            with self._lock:
+                self._computing.pop(key, None)
+        return value
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self.nbytes = 0
+
+
+def graph_fingerprint(G: nx.Graph, weight_attr: str = 'weight') -> str:
+    """
+    Вычисляет структурный отпечаток графа: число узлов и ребер, подписи узлов,
+    концы ребер и хеш весов ребер. Одинаковые графы дают одинаковый отпечаток в разных процессах.
+
+    :param G: Граф (Graph).
+    :param weight_attr: Имя атрибута веса ребра (если отсутствует – считается равным 1).
+    :return: Шестнадцатеричная строка.
+
+
+    Пример использования:
+      >>> key = graph_fingerprint(G)
+
+    """
+    node_index = {node: idx for idx, node in enumerate(G)}
+    edges = np.array([(node_index[u], node_index[v], w)
+                      for u, v, w in G.edges(data=weight_attr, default=1)],
+                     dtype=np.float64).reshape(-1, 3)
+
+    digest = hashlib.blake2b(digest_size=16)
+    digest.update(f"{type(G).__name__}:{G.number_of_nodes()}:{G.number_of_edges()}:".encode('utf-8'))
+    digest.update("\x1f".join(map(repr, node_index)).encode('utf-8'))
+    digest.update(np.ascontiguousarray(edges).tobytes())
+    return digest.hexdigest()
+
+
+# Кэш центральностей, общий для всех вызовов filter_matrix_from_graph в процессе.
+# Для хранения на диске достаточно задать centrality_cache.directory.
+centrality_cache = LRUCache(max_bytes=128 * 2**20)
+
+
+# Начиная с этого числа ячеек filter_matrix_from_graph по умолчанию возвращает разреженную матрицу
+SPARSE_OUTPUT_CELLS = 1_000_000
+
+
+def eigenvector_centrality_sparse(G: nx.Graph, weight: Optional[str] = 'weight',
+                                  max_iter: int = 100, tol: float = 1.0e-6) -> Dict[Any, float]:
+    """
+    Вычисляет центральность по собственному вектору степенным методом на разреженной матрице смежности.
+
+    Повторяет итерацию `nx.eigenvector_centrality` (умножение на A + I, нормировка по L2,
+    критерий сходимости по L1), но каждая итерация - одно разреженное умножение матрицы на вектор.
+
+    :param G: Граф (Graph).
+    :param weight: Имя атрибута веса ребра (если отсутствует – считается равным 1).
+    :param max_iter: Максимальное число итераций.
+    :param tol: Допуск сходимости.
+    :return: Словарь {узел: центральность}.
+
+
+    Пример использования:
+      >>> centrality = eigenvector_centrality_sparse(G)
+
+    """
+    if len(G) == 0:
+        raise nx.NetworkXPointlessConcept("cannot compute centrality for the null graph")
+
+    nodes = list(G)
+    adjacency_t = nx.to_scipy_sparse_array(G, nodelist=nodes, weight=weight, dtype=np.float64).T.tocsr()
+    x = np.full(len(nodes), 1.0 / len(nodes))
+    for _ in range(max_iter):
+        x_last = x
+        x = x_last + adjacency_t @ x_last
+        x /= np.linalg.norm(x) or 1
+        if np.abs(x - x_last).sum() < len(nodes) * tol:
+            return dict(zip(nodes, x.tolist()))
+    raise nx.PowerIterationFailedConvergence(max_iter)
+
+
+@instrument()
+def compute_centrality(G: nx.Graph, centrality_type: str = 'degree', weight_attr: str = 'weight',
+                       betweenness_k: Optional[int] = None, eigenvector_sparse: bool = False,
+                       seed: Optional[int] = 0, cache: Optional[LRUCache] = centrality_cache) -> Dict[Any, float]:
+    """
+    Вычисляет центральность узлов графа.
+
+    Результат кэшируется по отпечатку графа (`graph_fingerprint`), типу центральности и ее параметрам,
+    поэтому повторные вызовы для неизменного графа не пересчитывают центральность.
+
+    :param G: Граф (Graph).
+    :param centrality_type: 'degree', 'betweenness', 'closeness' или 'eigenvector'.
+    :param weight_attr: Имя атрибута веса ребра.
+    :param betweenness_k: Число опорных узлов для приближенной центральности по посредничеству;
+     None - точный расчет за O(VE).
+    :param eigenvector_sparse: Считать центральность по собственному вектору разреженным степенным методом.
+    :param seed: Зерно выбора опорных узлов при betweenness_k.
+    :param cache: Кэш результатов (по умолчанию общий `centrality_cache`); None - без кэширования.
+    :return: Словарь {узел: центральность} в порядке узлов графа.
+
+
+    Пример использования:
+      >>> centrality = compute_centrality(G, 'betweenness', betweenness_k=256)
+
+    """
+    centrality_type = centrality_type.lower()
+    sampled = centrality_type == 'betweenness' and betweenness_k is not None and betweenness_k < len(G)
+    if cache is None or (sampled and seed is None):
+        return _compute_centrality(G, centrality_type, weight_attr, betweenness_k, eigenvector_sparse, seed)
+
+    key = ('centrality', graph_fingerprint(G, weight_attr), centrality_type, weight_attr,
+           betweenness_k if sampled else None, eigenvector_sparse if centrality_type == 'eigenvector' else None,
+           seed if sampled else None)
+    return dict(cache.get_or_compute(key, lambda: _compute_centrality(
+        G, centrality_type, weight_attr, betweenness_k, eigenvector_sparse, seed)))
+
+
+def _compute_centrality(G: nx.Graph, centrality_type: str, weight_attr: str, betweenness_k: Optional[int],
+                        eigenvector_sparse: bool, seed: Optional[int]) -> Dict[Any, float]:
+    if centrality_type == 'degree':
+        return nx.degree_centrality(G)
+    if centrality_type == 'betweenness':
+        if betweenness_k is not None and betweenness_k < len(G):
+            return nx.betweenness_centrality(G, k=betweenness_k, weight=weight_attr, seed=seed)
+        return nx.betweenness_centrality(G, weight=weight_attr)
+    if centrality_type == 'closeness':
+        return nx.closeness_centrality(G)
+    if centrality_type == 'eigenvector':
+        if eigenvector_sparse:
+            return eigenvector_centrality_sparse(G, weight=weight_attr)
+        return nx.eigenvector_centrality(G, weight=weight_attr)
+    raise ValueError(f"Неизвестный тип центральности: {centrality_type}. "
+                     "Поддерживаются 'degree', 'betweenness', 'closeness', 'eigenvector'")
+
+
+def _adjacency(G: nx.Graph, nodelist: List[Any], weight_attr: str) -> sp.csr_matrix:
+    # to_scipy_sparse_array не принимает пустой список узлов
+    if not nodelist:
+        return sp.csr_matrix((0, 0), dtype=np.int64)
+    return nx.to_scipy_sparse_array(G, nodelist=nodelist, weight=weight_attr, format='csr')
+
+
+def _top_nodes(nodes: List[Any], centrality: Dict[Any, float], top_n: int) -> List[Any]:
+    # Узлы с равной центральностью остаются в порядке графа, как при устойчивой сортировке
+    values = np.fromiter((centrality[node] for node in nodes), dtype=np.float64, count=len(nodes))
+    return [nodes[idx] for idx in _top_k_positions(values, top_n)]
+
+
+@instrument()
 def filter_matrix_from_graph(G: nx.Graph, centrality_type: str = 'degree',
                              top_n: int = 400, top_n_rows: int = None,
                              top_n_cols: int = None,
-                             weight_attr: str = 'weight') -> pd.DataFrame:
+                             weight_attr: str = 'weight',
+                             betweenness_k: Optional[int] = None,
+                             eigenvector_sparse: bool = False,
+                             sparse: Optional[bool] = None) -> pd.DataFrame:
     """
     Фильтрует граф на основе выбранной центральности, оставляя топ-N узлов.
 
@@ -108,6 +992,9 @@ def filter_matrix_from_graph(G: nx.Graph, centrality_type: str = 'degree',
     Для обычного графа возвращается квадратная матрица смежности
     только для топ-N узлов.
 
+    Матрица смежности отобранных узлов извлекается одним вызовом `nx.to_scipy_sparse_array`
+    по карте «узел → индекс» и нарезается блоком, без поэлементной записи.
+
     :param G: входной граф (networkx.Graph).
     :param centrality_type: тип центральности для фильтрации. Поддерживаются:
      'degree', 'betweenness', 'closeness', 'eigenvector'.
@@ -115,6 +1002,10 @@ def filter_matrix_from_graph(G: nx.Graph, centrality_type: str = 'degree',
     :param top_n_rows: количество строк (узлов второй доли) для двудольного графа.
     :top_n_cols: количество столбцов (узлов первой доли) для двудольного графа.
     :weight_attr: имя атрибута веса ребра (если отсутствует – считается равным 1).
+    :param betweenness_k: число опорных узлов для приближенной центральности по посредничеству (None - точно).
+    :param eigenvector_sparse: считать центральность по собственному вектору разреженным степенным методом.
+    :param sparse: вернуть разреженный DataFrame (pd.SparseDtype). По умолчанию (None) разреженный результат
+     возвращается, если в матрице больше SPARSE_OUTPUT_CELLS ячеек.
     :return: DataFrame, представляющий отфильтрованную матрицу смежности.
 
 
@@ -123,32 +1014,21 @@ def filter_matrix_from_graph(G: nx.Graph, centrality_type: str = 'degree',
       >>> filtered_matrix = filter_matrix_from_graph(G, centrality_type='betweenness', top_n_rows=400, top_n_cols=400)
     Для обычного графа:
       >>> filtered_matrix = filter_matrix_from_graph(G, centrality_type='degree', top_n=300)
+    Для больших графов с приближенной центральностью:
+      >>> filtered_matrix = filter_matrix_from_graph(G, centrality_type='betweenness', betweenness_k=256, top_n=5000)
 
     """
 
-    # Выбор функции вычисления центральности
-    centrality_type = centrality_type.lower()
-    if centrality_type == 'degree':
-        centrality = nx.degree_centrality(G)
-    elif centrality_type == 'betweenness':
-        centrality = nx.betweenness_centrality(G, weight=weight_attr)
-    elif centrality_type == 'closeness':
-        centrality = nx.closeness_centrality(G)
-    elif centrality_type == 'eigenvector':
-        centrality = nx.eigenvector_centrality(G, weight=weight_attr)
-    else:
-        raise ValueError(f"Неизвестный тип центральности: {centrality_type}. "
-                         "Поддерживаются 'degree', 'betweenness', 'closeness', 'eigenvector'")
+    centrality = compute_centrality(G, centrality_type, weight_attr,
+                                    betweenness_k=betweenness_k, eigenvector_sparse=eigenvector_sparse)
 
     all_have_bipartite = all('bipartite' in data for _,
                              data in G.nodes(data=True))
 
     if all_have_bipartite:
         # Получаем узлы для обеих долей
-        first_nodes = [node for node, data in G.nodes(
-            data=True) if data.get("bipartite") == 1]
-        second_nodes = [node for node, data in G.nodes(
-            data=True) if data.get("bipartite") == 2]
+        first_nodes = [node for node, level in G.nodes(data='bipartite') if level == 1]
+        second_nodes = [node for node, level in G.nodes(data='bipartite') if level == 2]
 
         # Если отдельно не заданы, используем top_n
         if top_n_cols is None:
@@ -157,63 +1037,352 @@ def filter_matrix_from_graph(G: nx.Graph, centrality_type: str = 'degree',
             top_n_rows = top_n
 
         # Отбираем топ-N узлов для каждого уровня по значению центральности
-        centrality_first = {node: centrality[node] for node in first_nodes}
-        top_first = sorted(centrality_first, key=centrality_first.get, reverse=True)[
-            :top_n_cols]
-
-        centrality_second = {node: centrality[node] for node in second_nodes}
-        top_second = sorted(centrality_second, key=centrality_second.get, reverse=True)[
-            :top_n_rows]
-
-        # Создаем DataFrame нужного размера и заполняем его нулями
-        filtered_matrix = pd.DataFrame(0, index=top_second, columns=top_first)
-
-        # Заполняем матрицу: поскольку ребро в двудольном графе соединяет узлы из разных уровней,
-        # ищем ребра между выбранными узлами
-        for u, v, data in G.edges(data=True):
-            # Определяем вес ребра (если нет атрибута, считаем его равным 1)
-            w = data.get(weight_attr, 1)
-            # Ребро может быть задано в любом порядке, определяем доли
-            if u in top_first and v in top_second:
-                filtered_matrix.at[v, u] = w
-            elif u in top_second and v in top_first:
-                filtered_matrix.at[u, v] = w
+        top_first = _top_nodes(first_nodes, centrality, top_n_cols)
+        top_second = _top_nodes(second_nodes, centrality, top_n_rows)
+
+        # Ребра между выбранными узлами разных уровней: строки - вторая доля, столбцы - первая
+        adjacency = _adjacency(G, top_second + top_first, weight_attr)
+        block = adjacency[:len(top_second), len(top_second):]
+        index, columns = top_second, top_first
 
     else:
         # Граф не двудолен, работаем с единым списком узлов.
         # Отбираем топ-N узлов по центральности.
-        nodes_sorted = sorted(
-            centrality, key=centrality.get, reverse=True)[:top_n]
+        nodes_sorted = _top_nodes(list(G), centrality, top_n)
+        block = _adjacency(G, nodes_sorted, weight_attr)
+        index, columns = nodes_sorted, nodes_sorted
+
+    if not block.nnz:
+        block = sp.csr_matrix(block.shape, dtype=np.int64)
+    if sparse is None:
+        sparse = block.shape[0] * block.shape[1] > SPARSE_OUTPUT_CELLS
+    if sparse:
+        return pd.DataFrame.sparse.from_spmatrix(block, index=index, columns=columns)
+    return pd.DataFrame(block.toarray(), index=index, columns=columns)
+
+
+# Прореживание графа перед передачей в виджет
+
+SPARSIFY_METHODS = ('disparity', 'top_k', 'threshold', 'centrality', 'none')
+
+
+def _disparity_significance(adjacency: sp.csr_matrix, rows: np.ndarray, cols: np.ndarray,
+                            weights: np.ndarray) -> np.ndarray:
+    """
+    Уровень значимости ребер по фильтру диспаритета (Serrano et al., 2009): для узла степени k и силы s
+    ребро веса w значимо на уровне (1 - w / s)^(k - 1); у ребра берется минимум по двум концам.
+    Петли не учитываются ни в силе, ни в степени узла и сами значимыми не считаются.
+    """
+    adjacency = adjacency - sp.diags(adjacency.diagonal(), format='csr', dtype=adjacency.dtype)
+    adjacency.eliminate_zeros()
+    strength = np.asarray(adjacency.sum(axis=1), dtype=np.float64).ravel()
+    degree = np.diff(adjacency.indptr)
+
+    def endpoint(nodes):
+        share = np.divide(weights, strength[nodes], out=np.ones(len(nodes)), where=strength[nodes] > 0)
+        return np.where(degree[nodes] > 1, (1.0 - share) ** (degree[nodes] - 1), 1.0)
+
+    return np.where(rows == cols, 1.0, np.minimum(endpoint(rows), endpoint(cols)))
+
+
+def _top_k_per_node(adjacency: sp.csr_matrix, rows: np.ndarray, cols: np.ndarray, top_k: int) -> np.ndarray:
+    """
+    Отмечает ребра, входящие в top_k сильнейших связей хотя бы одного из концов.
+    """
+    owners = np.repeat(np.arange(adjacency.shape[0]), np.diff(adjacency.indptr))
+    order = np.lexsort((-adjacency.data, owners))
+    ranks = np.empty(adjacency.nnz, dtype=np.int64)
+    ranks[order] = np.arange(adjacency.nnz) - adjacency.indptr[owners[order]]
+    strongest = sp.csr_matrix(((ranks < top_k).astype(np.int8), adjacency.indices, adjacency.indptr),
+                              shape=adjacency.shape)
+    strongest = strongest + strongest.T
+    if not len(rows):
+        return np.zeros(0, dtype=bool)
+    return np.asarray(strongest[rows, cols]).ravel() > 0
+
+
+@instrument()
+def sparsify_graph(G: nx.Graph, method: str = 'disparity', max_edges: Optional[int] = 5000,
+                   alpha: float = 0.05, top_k: int = 10, min_weight: float = 0,
+                   centrality_type: str = 'degree', top_n: int = 400,
+                   weight_attr: str = 'weight', keep_isolates: bool = False) -> nx.Graph:
+    """
+    Прореживает граф перед отображением, не изменяя исходный граф.
+
+    Методы:
+      - 'disparity' - магистраль по фильтру диспаритета: остаются ребра, значимые на уровне `alpha`
+        хотя бы для одного из концов;
+      - 'top_k' - ребра, входящие в `top_k` сильнейших связей хотя бы одного из концов;
+      - 'threshold' - ребра с весом не меньше `min_weight`;
+      - 'centrality' - ребра между узлами, отобранными `filter_matrix_from_graph` по центральности;
+      - 'none' - без отбора.
+
+    Порог `min_weight` применяется во всех методах. Если ребер остается больше `max_edges`,
+    сохраняются самые значимые (для 'disparity') или самые тяжелые ребра.
+
+    :param G: Исходный граф.
+    :param method: Метод прореживания (см. SPARSIFY_METHODS).
+    :param max_edges: Максимальное число ребер результата (None - без ограничения).
+    :param alpha: Уровень значимости для фильтра диспаритета.
+    :param top_k: Число сильнейших связей узла для метода 'top_k'.
+    :param min_weight: Минимальный вес ребра.
+    :param centrality_type: Тип центральности для метода 'centrality'.
+    :param top_n: Число узлов (каждой доли для двудольного графа) для метода 'centrality'.
+    :param weight_attr: Имя атрибута веса ребра.
+    :param keep_isolates: Сохранять узлы, оставшиеся без ребер.
+    :return: Новый граф с атрибутами узлов и ребер исходного графа.
+
+
+    Пример использования:
+      >>> backbone = sparsify_graph(G, method='disparity', alpha=0.05, max_edges=5000)
+      >>> Sigma(backbone)
+
+    """
+    if method not in SPARSIFY_METHODS:
+        raise ValueError(f"Неизвестный метод прореживания: {method}. Поддерживаются: {', '.join(SPARSIFY_METHODS)}.")
+
+    nodes = list(G)
+    adjacency = _adjacency(G, nodes, weight_attr)
+    upper = sp.triu(adjacency, format='coo')
+    rows, cols, weights = upper.row, upper.col, upper.data.astype(np.float64)
+
+    keep = weights >= min_weight
+    scores = weights
+    if method == 'disparity':
+        significance = _disparity_significance(adjacency, rows, cols, weights)
+        keep &= significance < alpha
+        scores = -significance
+    elif method == 'top_k':
+        keep &= _top_k_per_node(adjacency, rows, cols, top_k)
+    elif method == 'centrality':
+        matrix = filter_matrix_from_graph(G, centrality_type, top_n=top_n, weight_attr=weight_attr, sparse=True)
+        selected = np.asarray(pd.Index(nodes).isin(list(matrix.index) + list(matrix.columns)))
+        keep &= selected[rows] & selected[cols]
+
+    kept = np.flatnonzero(keep)
+    if max_edges is not None and len(kept) > max_edges:
+        kept = kept[_top_k_positions(scores[kept], max_edges)]
+        kept.sort()
+
+    H = G.__class__()
+    if keep_isolates:
+        H.add_nodes_from(G.nodes(data=True))
+    else:
+        used = np.zeros(len(nodes), dtype=bool)
+        used[rows[kept]] = used[cols[kept]] = True
+        H.add_nodes_from((nodes[idx], G.nodes[nodes[idx]]) for idx in np.flatnonzero(used))
+    H.add_edges_from((nodes[u], nodes[v], dict(G[nodes[u]][nodes[v]])) for u, v in zip(rows[kept], cols[kept]))
+    return H
 
-        # Создаем квадратную матрицу смежности с индексами и столбцами равными отобранным узлам
-        filtered_matrix = pd.DataFrame(
-            0, index=nodes_sorted, columns=nodes_sorted)
 
-        # Заполняем матрицу весами ребер (если ребро существует, используем вес или 1)
-        for u, v, data in G.edges(data=True):
-            if u in nodes_sorted and v in nodes_sorted:
-                w = data.get(weight_attr, 1)
-                filtered_matrix.at[u, v] = w
-                filtered_matrix.at[v, u] = w  # так как граф неориентированный
+# Сообщества и раскладка графа на сервере
 
-    return filtered_matrix
+# Кэш разбиений и раскладок по отпечатку графа, общий для всех сессий
+layout_cache = LRUCache(max_bytes=64 * 2**20)
+
+
+def _stable_labels(communities: List[set], previous: Optional[Dict[Any, int]]) -> Dict[Any, int]:
+    """
+    Нумерует сообщества так, чтобы они по возможности сохраняли номера предыдущего разбиения:
+    пары «новое сообщество - прежний номер» назначаются жадно по убыванию числа общих узлов,
+    остальные сообщества получают новые номера.
+    """
+    previous = previous or {}
+    overlaps = []
+    for position, members in enumerate(communities):
+        counts = defaultdict(int)
+        for node in members:
+            if node in previous:
+                counts[previous[node]] += 1
+        overlaps.extend((count, -position, label) for label, count in counts.items())
+
+    labels, used = {}, set()
+    for count, position, label in sorted(overlaps, reverse=True):
+        if -position not in labels and label not in used:
+            labels[-position] = label
+            used.add(label)
+
+    next_label = max(chain(used, previous.values()), default=-1) + 1
+    assignment = {}
+    # Сообщества без соответствия нумеруются по убыванию размера
+    for position in sorted(range(len(communities)), key=lambda idx: -len(communities[idx])):
+        if position not in labels:
+            labels[position] = next_label
+            next_label += 1
+        assignment.update(dict.fromkeys(communities[position], labels[position]))
+    return assignment
+
+
+@instrument()
+def detect_communities(G: nx.Graph, weight_attr: str = 'weight', resolution: float = 1.0, seed: int = 0,
+                       previous: Optional[Dict[Any, int]] = None,
+                       cache: Optional[LRUCache] = layout_cache) -> Dict[Any, int]:
+    """
+    Выделяет сообщества методом Louvain (`nx.community.louvain_communities`).
+
+    Разбиение кэшируется по отпечатку графа, а номера сообществ согласуются с предыдущим разбиением,
+    поэтому цвета сообществ в виджете не перемешиваются при небольшом изменении фильтров.
+
+    :param G: Граф (Graph).
+    :param weight_attr: Имя атрибута веса ребра.
+    :param resolution: Параметр разрешения модулярности (больше - мельче сообщества).
+    :param seed: Зерно случайного порядка обхода узлов.
+    :param previous: Предыдущее разбиение {узел: номер} для согласования номеров.
+    :param cache: Кэш разбиений; None - без кэширования.
+    :return: Словарь {узел: номер сообщества}.
+
+
+    Пример использования:
+      >>> communities = detect_communities(G)
+      >>> communities = detect_communities(G_new, previous=communities)
+
+    """
+    def compute():
+        return [set(members) for members in nx.community.louvain_communities(
+            G, weight=weight_attr, resolution=resolution, seed=seed)]
+
+    if cache is None:
+        communities = compute()
+    else:
+        key = ('communities', graph_fingerprint(G, weight_attr), resolution, seed)
+        communities = cache.get_or_compute(key, compute)
+    return _stable_labels(communities, previous)
+
+
+@instrument()
+def compute_layout(G: nx.Graph, previous: Optional[Dict[Any, Tuple[float, float]]] = None,
+                   iterations: int = 50, warm_iterations: int = 15, keep_share: float = 0.5, seed: int = 0,
+                   cache: Optional[LRUCache] = layout_cache) -> Dict[Any, Tuple[float, float]]:
+    """
+    Вычисляет двумерную раскладку графа силовым алгоритмом (`nx.spring_layout`).
+
+    При заданной предыдущей раскладке выполняется теплый старт: новые узлы начинают со средней позиции
+    размещенных соседей, а число итераций сокращается до `warm_iterations`. Если прежние позиции известны
+    не менее чем для доли `keep_share` узлов, эти узлы закрепляются и размещаются только новые, поэтому
+    при небольших изменениях графа узлы остаются на своих местах. Результат кэшируется по отпечатку графа.
+    Веса ребер не учитываются: большие счетчики co-occurrence стягивают силовую раскладку в точку.
+
+    :param G: Граф (Graph).
+    :param previous: Предыдущая раскладка {узел: (x, y)}.
+    :param iterations: Число итераций без теплого старта.
+    :param warm_iterations: Число итераций при теплом старте.
+    :param keep_share: Минимальная доля узлов с известными позициями, при которой они закрепляются.
+    :param seed: Зерно начальной раскладки.
+    :param cache: Кэш раскладок; None - без кэширования.
+    :return: Словарь {узел: (x, y)} с координатами в [-1, 1].
+
+
+    Пример использования:
+      >>> positions = compute_layout(G)
+      >>> positions = compute_layout(G_new, previous=positions)
+
+    """
+    def compute():
+        if len(G) == 0:
+            return {}
+        known = {node: previous[node] for node in G if previous and node in previous}
+        if not known:
+            positions = nx.spring_layout(G, iterations=iterations, seed=seed, weight=None)
+        else:
+            rng = np.random.default_rng(seed)
+            initial = {node: np.asarray(position, dtype=np.float64) for node, position in known.items()}
+            for node in G:
+                if node not in initial:
+                    placed = [known[nbr] for nbr in G[node] if nbr in known]
+                    center = np.mean(placed, axis=0) if placed else np.zeros(2)
+                    initial[node] = center + rng.normal(scale=0.05, size=2)
+            fixed = list(known) if len(known) >= keep_share * len(G) else None
+            if fixed is not None and len(fixed) == len(G):
+                positions = initial
+            else:
+                positions = nx.spring_layout(G, pos=initial, fixed=fixed, iterations=warm_iterations,
+                                             seed=seed, weight=None)
+        return {node: (float(x), float(y)) for node, (x, y) in positions.items()}
+
+    if cache is None:
+        return compute()
+    # Веса в отпечатке не нужны: раскладка от них не зависит
+    key = ('layout', graph_fingerprint(G, weight_attr=None), iterations, warm_iterations, keep_share, seed)
+    return dict(cache.get_or_compute(key, compute))
+
+
+class GraphLayout:
+    """
+    Сообщества и раскладка для последовательности графов одной вкладки.
+
+    Хранит результат предыдущего вызова и передает его в `detect_communities` и `compute_layout`,
+    поэтому номера сообществ и позиции узлов сохраняются между перерисовками.
+
+    :param resolution: Параметр разрешения для Louvain.
+    :param seed: Зерно разбиения и раскладки.
+
+
+    Пример использования:
+      >>> layout = GraphLayout()
+      >>> G = layout.apply(G)
+      >>> Sigma(G, layout=layout.sigma_layout(G), node_color='community')
+
+    """
+
+    def __init__(self, resolution: float = 1.0, seed: int = 0):
+        self.resolution = resolution
+        self.seed = seed
+        self.communities = None
+        self.positions = None
+
+    @instrument()
+    def apply(self, G: nx.Graph, weight_attr: str = 'weight') -> nx.Graph:
+        """
+        Записывает в атрибуты узлов графа номер сообщества ('community') и координаты ('x', 'y').
+        """
+        self.communities = detect_communities(G, weight_attr, self.resolution, self.seed, previous=self.communities)
+        self.positions = compute_layout(G, previous=self.positions, seed=self.seed)
+        nx.set_node_attributes(G, self.communities, 'community')
+        nx.set_node_attributes(G, {node: x for node, (x, _) in self.positions.items()}, 'x')
+        nx.set_node_attributes(G, {node: y for node, (_, y) in self.positions.items()}, 'y')
+        return G
+
+    def sigma_layout(self, G: nx.Graph) -> Dict[Any, Dict[str, float]]:
+        """
+        Раскладка в формате параметра `layout` виджета Sigma: {узел: {'x': ..., 'y': ...}}.
+        """
+        return {node: {'x': self.positions[node][0], 'y': self.positions[node][1]} for node in G}
 
 # 3.1. Создание функции для создания двумодальных матриц
 
 
-def create_group_values_matrix(df: pd.DataFrame, group_field: str, value_field: str) -> pd.DataFrame:
+def _group_values_kernel(incidence: sp.csr_matrix, group_codes: np.ndarray, n_groups: int) -> sp.csr_matrix:
+    """
+    Сворачивает матрицу инцидентности «строка × значение» в матрицу «значение × группа» по кодам групп строк.
+    """
+    occurrences = incidence.tocoo()
+    return sp.coo_matrix((occurrences.data.astype(np.int64), (occurrences.col, group_codes[occurrences.row])),
+                         shape=(incidence.shape[1], n_groups)).tocsr()
+
+
+@instrument()
+def create_group_values_matrix(df: pd.DataFrame, group_field: str, value_field: str,
+                               sparse: bool = False,
+                               encoded: Optional[EncodedSkills] = None,
+                               rows: Optional[np.ndarray] = None) -> pd.DataFrame:
     """
     Создает матрицу значений, группируя по `group_field` и учитывая значения из `value_field`.
 
     Если значения в `value_field` представлены в виде списков (например, навыков),
-    создается матрица, где строки соответствуют уникальным значениям внутри списков,
-    а столбцы - группам из `group_field`.
+    создается матрица, где строки соответствуют уникальным значениям внутри списков (в отсортированном порядке),
+    а столбцы - группам из `group_field`. Подсчет выполняется одним проходом по кодам значений
+    с построением разреженной COO-матрицы, без поэлементной записи в DataFrame.
 
     Если значения не являются списками, используется метод `pd.crosstab`.
 
     :param df: DataFrame с исходными данными.
     :param group_field: Название колонки для группировки.
     :param value_field: Название колонки с значениями (списками или отдельными значениями).
+    :param sparse: Если True, возвращается DataFrame на основе разреженной матрицы (pd.SparseDtype)
+     наименьшего подходящего целочисленного типа.
+    :param encoded: Закодированные списки `value_field` обработанного набора (`EncodedSkills`);
+     строки выбираются по df.index.
+    :param rows: Позиции учитываемых строк df (см. `FilterEngine.select`); подмножество DataFrame не создается.
     :return: Матрица значений в виде DataFrame.
 
 
@@ -222,35 +1391,42 @@ def create_group_values_matrix(df: pd.DataFrame, group_field: str, value_field:
       >>> skills_roles_matrix = create_group_values_matrix(df_construction, 'role_name', 'raw_skills')
     Для значения для параметра 'value_field' представлены в виде строки:
       >>> employers_roles_matrix =  create_group_values_matrix(df_construction, 'employer_name', 'role_name')
+    Разреженный результат для больших выборок:
+      >>> skills_roles_matrix = create_group_values_matrix(df_construction, 'role_name', 'raw_skills', sparse=True)
 
     """
-    sample_value = df[value_field].dropna().iloc[0]  # Определяем тип значений
-
-    if isinstance(sample_value, list):
-        # Группировка и разворачивание списков значений
-        role_values = (
-            df.groupby(group_field)[value_field]
-              .apply(lambda x: [item for sublist in x for item in sublist])
-              .to_dict()
-        )
-
-        # Определяем все уникальные значения для строк матрицы
-        all_values = {item for values in role_values.values()
-                      for item in values}
-
-        # Создаем пустую матрицу
-        matrix = pd.DataFrame(0, index=list(all_values),
-                              columns=role_values.keys())
-
-        # Заполняем матрицу
-        for group, values in role_values.items():
-            for value in values:
-                matrix.loc[value, group] += 1
+    if rows is not None and encoded is None and not isinstance(df[value_field].iloc[rows].dropna().iloc[0], list):
+        return create_group_values_matrix(df.iloc[rows], group_field, value_field, sparse=sparse)
+    group_column = df[group_field] if rows is None else df[group_field].iloc[rows]
+
+    # Определяем тип значений
+    if encoded is not None or isinstance(df[value_field].dropna().iloc[0], list):
+        # Коды групп; строки без группы не учитываются, как и в groupby
+        group_codes, groups = pd.factorize(group_column, sort=True)
+        has_group = group_codes >= 0
+        selected = np.flatnonzero(has_group) if rows is None else np.asarray(rows)[has_group]
+
+        # Один проход по развернутым спискам: позиции строк и коды значений
+        incidence, all_values = skills_incidence_matrix(_skills_source(df, value_field, encoded, selected))
+        counts = _group_values_kernel(incidence, group_codes[has_group], len(groups))
+        index, columns = all_values, groups
+    elif sparse:
+        # Та же ориентация, что и у crosstab: строки - группы, столбцы - значения
+        pairs = df[[group_field, value_field]].dropna()
+        group_codes, groups = pd.factorize(pairs[group_field], sort=True)
+        value_codes, values = pd.factorize(pairs[value_field], sort=True)
+        counts = sp.coo_matrix((np.ones(len(pairs), dtype=np.int64), (group_codes, value_codes)),
+                               shape=(len(groups), len(values))).tocsr()
+        index, columns = groups.rename(group_field), values.rename(value_field)
     else:
         # Используем crosstab для случаев без списков
-        matrix = pd.crosstab(df[group_field], df[value_field])
+        return pd.crosstab(df[group_field], df[value_field])
 
-    return matrix
+    if sparse:
+        max_value = counts.data.max() if counts.nnz else 0
+        return pd.DataFrame.sparse.from_spmatrix(counts.astype(_smallest_int_dtype(max_value)),
+                                                 index=index, columns=columns)
+    return pd.DataFrame(counts.toarray(), index=index, columns=columns)
 
 
 # 3.2. Функции для нормализации матрицы и создание одномодальных и многоуровневых матриц
@@ -273,16 +1449,41 @@ def normalize_matrix(matrix: pd.DataFrame) -> pd.DataFrame:
                         columns=matrix.columns)
 
 
+def _without_diagonal(matrix: sp.spmatrix) -> sp.csr_matrix:
+    coo = matrix.tocoo()
+    off_diagonal = (coo.row != coo.col) & (coo.data != 0)
+    return sp.csr_matrix((coo.data[off_diagonal], (coo.row[off_diagonal], coo.col[off_diagonal])),
+                         shape=coo.shape)
+
+
+def _sized(matrix: sp.csr_matrix) -> sp.csr_matrix:
+    max_value = matrix.data.max() if matrix.nnz else 0
+    return matrix.astype(_smallest_int_dtype(max_value))
+
+
+@instrument()
 def create_whole_matrix(group_matrix: pd.DataFrame, df_data: Optional[pd.DataFrame] = None,
                         use_co_occurrence: bool = False,
-                        skills_field: str = 'raw_skills') -> Tuple[pd.DataFrame, pd.DataFrame, pd.DataFrame]:
+                        skills_field: str = 'raw_skills',
+                        sparse: bool = False,
+                        encoded: Optional[EncodedSkills] = None,
+                        n_jobs: Optional[int] = None) -> Tuple[pd.DataFrame, pd.DataFrame, pd.DataFrame]:
     """
     Создает полную сеть связей между навыками и профессиями.
 
-    :param group_matrix: Матрица соответствия (строки – навыки, столбцы – группы/профессии).
+    Обе проекции считаются как разреженные произведения бинарной матрицы соответствия B (BBᵀ и BᵀB),
+    co-occurrence навыков - тем же ядром XᵀX, что и в `create_co_occurrence_matrix`, а объединенная
+    матрица собирается блочно (`scipy.sparse.bmat`) без промежуточных плотных копий блоков.
+
+    :param group_matrix: Матрица соответствия (строки – навыки, столбцы – группы/профессии),
+     плотный или разреженный DataFrame.
     :param df_data: Исходный DataFrame с данными (используется при вычислении co-occurrence).
     :param use_co_occurrence: Флаг использования co-occurrence матрицы навыков.
     :param skills_field: Название столбца с навыками в df_data.
+    :param sparse: Если True, все три матрицы возвращаются как разреженные DataFrame (pd.SparseDtype)
+     наименьшего подходящего целочисленного типа.
+    :param encoded: Закодированные навыки обработанного набора (`EncodedSkills`); строки выбираются по df_data.index.
+    :param n_jobs: Число процессов для co-occurrence навыков (см. `create_co_occurrence_matrix`).
     :return: Кортеж из трёх матриц (row_matrix, column_matrix, whole_matrix).
 
 
@@ -291,89 +1492,438 @@ def create_whole_matrix(group_matrix: pd.DataFrame, df_data: Optional[pd.DataFra
       >>> skills_matrix, jobs_matrix, whole_matrix = create_whole_matrix(skills_roles_matrix, df_construction, use_co_occurrence=True, skills_field='raw_skills')
     Если параметр use_co_occurrence = False:
       >>> roles_matrix, regions_matrix, whole_matrix = create_whole_matrix(roles_regions_matrix)
+    Для больших словарей:
+      >>> skills_matrix, jobs_matrix, whole_matrix = create_whole_matrix(skills_roles_matrix, sparse=True)
 
     """
-    group_matrix = (group_matrix > 0).astype(int)
+    binary = _as_csr(group_matrix)
+    binary.data = (binary.data > 0).astype(np.int64)
+    binary.eliminate_zeros()
     all_row = group_matrix.index.tolist()
+    all_column = group_matrix.columns.tolist()
 
     if use_co_occurrence and df_data is not None:
-        # Создание co-occurrence матрицы навыков
-        skill_index = {skill: idx for idx, skill in enumerate(all_row)}
-        co_occurrence = np.zeros((len(all_row), len(all_row)), dtype=int)
-
-        for skills in df_data[skills_field]:
-            unique_skills = [s for s in skills if s in skill_index]
-            for pair in combinations(unique_skills, 2):
-                i, j = skill_index[pair[0]], skill_index[pair[1]]
-                co_occurrence[i, j] += 1
-                co_occurrence[j, i] += 1
-
-        row_matrix = pd.DataFrame(
-            co_occurrence, index=all_row, columns=all_row)
+        # Co-occurrence навыков по словарю строк матрицы соответствия
+        incidence, _ = skills_incidence_matrix(_skills_source(df_data, skills_field, encoded), vocabulary=all_row)
+        row_sim = _co_occurrence_kernel(incidence, n_jobs)
     else:
         # Матрица схожести навыков через произведение
-        row_sim = group_matrix.values.dot(group_matrix.values.T)
-        row_matrix = pd.DataFrame(row_sim, index=all_row, columns=all_row)
-
-    np.fill_diagonal(row_matrix.values, 0)
+        row_sim = binary @ binary.T
+    row_sim = _without_diagonal(row_sim)
     # row_matrix = normalize_matrix(row_matrix)
 
     # Матрица схожести профессий (групп)
     # group_matrix = normalize_matrix(group_matrix)
 
-    column_sim = group_matrix.T.values.dot(group_matrix.values)
-    column_matrix = pd.DataFrame(
-        column_sim, index=group_matrix.columns, columns=group_matrix.columns)
-    np.fill_diagonal(column_matrix.values, 0)
+    column_sim = _without_diagonal(binary.T @ binary)
     # column_matrix = normalize_matrix(column_matrix)
 
     # Создание объединённой матрицы
-    row_part = row_matrix.values
-    column_part = column_matrix.values
-    top = np.hstack([row_part, group_matrix.values])
-    bottom = np.hstack([group_matrix.T.values, column_part])
-    whole_matrix = np.vstack([top, bottom])
-
-    whole_index = all_row + list(group_matrix.columns)
-    whole_matrix = pd.DataFrame(
-        whole_matrix, index=whole_index, columns=whole_index)
-    np.fill_diagonal(whole_matrix.values, 0)
-
+    whole = sp.bmat([[row_sim, binary], [binary.T, column_sim]], format='csr')
+    whole_index = all_row + all_column
+
+    if sparse:
+        return (pd.DataFrame.sparse.from_spmatrix(_sized(row_sim), index=all_row, columns=all_row),
+                pd.DataFrame.sparse.from_spmatrix(_sized(column_sim), index=all_column, columns=all_column),
+                pd.DataFrame.sparse.from_spmatrix(_sized(whole), index=whole_index, columns=whole_index))
+
+    row_matrix = pd.DataFrame(row_sim.toarray().astype(int), index=all_row, columns=all_row)
+    column_matrix = pd.DataFrame(column_sim.toarray().astype(int),
+                                 index=group_matrix.columns, columns=group_matrix.columns)
+    whole_matrix = pd.DataFrame(whole.toarray().astype(int), index=whole_index, columns=whole_index)
     return row_matrix, column_matrix, whole_matrix
 
 
-def create_bipartite_graph(matrix: pd.DataFrame) -> nx.Graph:
+@instrument()
+def create_bipartite_graph(matrix: Union[pd.DataFrame, sp.spmatrix],
+                           index: Optional[List[Any]] = None,
+                           columns: Optional[List[Any]] = None) -> nx.Graph:
     """
     Создает двудольный граф на основе переданной матрицы.
 
-    :param matrix: Матрица связей (DataFrame), где строки и столбцы представляют две группы узлов.
+    Ребра строятся только по положительным элементам матрицы, которые извлекаются напрямую
+    из массива или разреженной структуры и добавляются одним вызовом `add_weighted_edges_from`,
+    поэтому время построения зависит от числа ребер, а не от размера матрицы.
+
+    :param matrix: Матрица связей (плотный или разреженный DataFrame либо матрица scipy.sparse),
+     где строки и столбцы представляют две группы узлов.
      По столбцам - это уровень первый (bipartite=1), а по строкам - это уровень второй (bipartite=2)
+    :param index: Подписи строк для матрицы scipy.sparse (для DataFrame берутся из matrix.index).
+    :param columns: Подписи столбцов для матрицы scipy.sparse (для DataFrame берутся из matrix.columns).
     :return: Двудольный граф (Graph).
 
     Пример использования:
      >>> G = create_bipartite_graph(skills_roles_matrix)
+    Для разреженной матрицы scipy:
+     >>> G = create_bipartite_graph(counts, index=skills, columns=roles)
 
     """
+    if isinstance(matrix, pd.DataFrame):
+        index, columns = matrix.index, matrix.columns
+    elif index is None or columns is None:
+        raise ValueError("Для матрицы scipy.sparse необходимо передать index и columns.")
+
     G = nx.Graph()
 
     # Извлекаем узлы для обеих групп
-    first_nodes = matrix.columns.tolist()
-    second_nodes = matrix.index.tolist()
+    first_nodes = np.asarray(columns, dtype=object)
+    second_nodes = np.asarray(index, dtype=object)
 
     # Добавляем узлы с указанием bipartite уровня
     G.add_nodes_from(first_nodes, bipartite=1)
     G.add_nodes_from(second_nodes, bipartite=2)
 
-    # Добавляем ребра с весом
-    for second in second_nodes:
-        for first in first_nodes:
-            weight = matrix.loc[second, first]
-            if weight > 0:
-                G.add_edge(first, second, weight=weight)
+    # Координаты положительных элементов в порядке строк, как при обходе строк и столбцов
+    weights = _as_csr(matrix).tocoo()
+    positive = weights.data > 0
+    G.add_weighted_edges_from(zip(first_nodes[weights.col[positive]],
+                                  second_nodes[weights.row[positive]],
+                                  weights.data[positive].tolist()))
 
     return G
 
 
+# Инкрементальное обновление матриц и графов при изменении выборки строк
+
+class _IncrementalCounts(abc.ABC):
+    """
+    Общая часть инкрементальных матриц: хранит текущую выборку строк и счетчики по всему словарю набора,
+    а при новой выборке применяет знаковую разность по вошедшим и вышедшим строкам.
+    Если изменилось больше строк, чем содержит новая выборка, счетчики пересчитываются целиком.
+    """
+
+    def __init__(self, data: pd.DataFrame, encoded: EncodedSkills, shape: Tuple[int, int]):
+        self._encoded = encoded
+        self._positions = data.index.to_numpy()
+        self.rows = np.empty(0, dtype=np.int64)
+        self.counts = sp.csr_matrix(shape, dtype=np.int64)
+        self.row_totals = np.zeros(shape[0], dtype=np.int64)
+        self.column_totals = np.zeros(shape[1], dtype=np.int64)
+        self._graph = None
+        self._pending = None
+        self._graph_rows = self._graph_columns = None
+
+    def _incidence(self, rows: np.ndarray) -> sp.csr_matrix:
+        return self._encoded.take(self._positions[rows]).csr()
+
+    @abc.abstractmethod
+    def aggregate(self, rows: np.ndarray) -> Tuple[sp.csr_matrix, np.ndarray, np.ndarray]:
+        """
+        Считает состояние для набора строк: счетчики по всему словарю и суммы по строкам и столбцам матрицы
+        (по ним определяется, какие строки и столбцы присутствуют в результате).
+        """
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def _labels(self, present_rows: np.ndarray, present_columns: np.ndarray) -> Tuple[Any, Any]:
+        raise NotImplementedError
+
+    @instrument()
+    def update(self, rows: np.ndarray,
+               state: Optional[Tuple[sp.csr_matrix, np.ndarray, np.ndarray]] = None) -> sp.csr_matrix:
+        """
+        Переводит счетчики на новую выборку строк.
+
+        :param rows: Позиции строк набора (см. `FilterEngine.select`).
+        :param state: Готовое состояние для `rows` (см. `aggregate`, `TimeSnapshots.aggregate`);
+         если задано, строки не агрегируются.
+        :return: Разность счетчиков (новые минус прежние) в координатах всего словаря.
+        """
+        check_cancelled()
+        rows = np.unique(np.asarray(rows, dtype=np.int64))
+        entering = np.setdiff1d(rows, self.rows, assume_unique=True)
+        leaving = np.setdiff1d(self.rows, rows, assume_unique=True)
+        if not len(entering) and not len(leaving):
+            return sp.csr_matrix(self.counts.shape, dtype=np.int64)
+
+        if state is None and len(entering) + len(leaving) < len(rows):
+            added, added_rows, added_columns = self.aggregate(entering)
+            removed, removed_rows, removed_columns = self.aggregate(leaving)
+            check_cancelled()
+            delta = (added - removed).tocsr()
+            self.counts = self.counts + delta
+            self.counts.eliminate_zeros()
+            self.row_totals += added_rows - removed_rows
+            self.column_totals += added_columns - removed_columns
+        else:
+            counts, row_totals, column_totals = state if state is not None else self.aggregate(rows)
+            check_cancelled()
+            delta = (counts - self.counts).tocsr()
+            self.counts, self.row_totals, self.column_totals = counts, row_totals.copy(), column_totals.copy()
+
+        delta.eliminate_zeros()
+        self.rows = rows
+        if self._graph is not None:
+            self._pending = delta if self._pending is None else self._pending + delta
+        return delta
+
+    def to_frame(self, state: Tuple[sp.csr_matrix, np.ndarray, np.ndarray], sparse: bool = False) -> pd.DataFrame:
+        """
+        Переводит состояние (см. `aggregate`) в DataFrame того же вида, что и у соответствующего построителя матрицы.
+        """
+        counts, row_totals, column_totals = state
+        present_rows, present_columns = np.flatnonzero(row_totals > 0), np.flatnonzero(column_totals > 0)
+        index, columns = self._labels(present_rows, present_columns)
+        counts = counts[present_rows][:, present_columns]
+        if sparse:
+            max_value = counts.data.max() if counts.nnz else 0
+            return pd.DataFrame.sparse.from_spmatrix(counts.astype(_smallest_int_dtype(max_value)),
+                                                     index=index, columns=columns)
+        return pd.DataFrame(counts.toarray(), index=index, columns=columns)
+
+    @instrument()
+    def matrix(self, sparse: bool = False) -> pd.DataFrame:
+        """
+        Матрица текущей выборки.
+        """
+        return self.to_frame((self.counts, self.row_totals, self.column_totals), sparse)
+
+    @abc.abstractmethod
+    def _build_graph(self) -> nx.Graph:
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def _patch_graph(self, G: nx.Graph, delta: sp.coo_matrix, rows: np.ndarray, columns: np.ndarray) -> None:
+        raise NotImplementedError
+
+    @instrument()
+    def graph(self) -> nx.Graph:
+        """
+        Возвращает граф текущей выборки. Граф строится при первом вызове, а затем изменяется на месте:
+        добавляются и удаляются только узлы и ребра, чьи счетчики перешли через ноль, у остальных
+        затронутых ребер обновляется вес.
+
+        При отмене (см. `CancellationToken`) во время изменения графа накопленная разность сохраняется
+        и применяется повторно при следующем вызове: веса берутся из счетчиков, поэтому повтор безопасен.
+        """
+        check_cancelled()
+        if self._graph is None:
+            self._graph = self._build_graph()
+        elif self._pending is not None:
+            delta = self._pending.tocsr()
+            delta.eliminate_zeros()
+            self._patch_graph(self._graph, delta.tocoo(), self.row_totals > 0, self.column_totals > 0)
+            # Кэш матриц схожести привязан к графу и должен быть перестроен
+            _similarity_cache.pop(self._graph, None)
+        self._pending = None
+        self._graph_rows, self._graph_columns = self.row_totals > 0, self.column_totals > 0
+        return self._graph
+
+    def _edge_weights(self, rows: np.ndarray, columns: np.ndarray) -> np.ndarray:
+        if not len(rows):
+            return np.empty(0, dtype=np.int64)
+        return np.asarray(self.counts[rows, columns]).ravel()
+
+    @staticmethod
+    def _apply_edges(G: nx.Graph, sources: np.ndarray, targets: np.ndarray, weights: np.ndarray) -> None:
+        for position, (source, target, weight) in enumerate(zip(sources, targets, weights.tolist())):
+            if not position % 10000:
+                check_cancelled()
+            if weight:
+                G.add_edge(source, target, weight=weight)
+            elif G.has_edge(source, target):
+                G.remove_edge(source, target)
+
+
+class IncrementalCoOccurrence(_IncrementalCounts):
+    """
+    Матрица co-occurrence навыков, поддерживаемая по разностям при изменении выборки строк.
+
+    Результат `matrix` совпадает с `create_co_occurrence_matrix` для той же выборки, а `graph` -
+    с `create_adjacency_graph` по этой матрице. Разности считаются тем же ядром `_co_occurrence_kernel`.
+
+    :param data: Обработанный DataFrame (см. `process_vacancies`).
+    :param skills_field: Название столбца со списками навыков.
+    :param encoded: Закодированные навыки набора (`EncodedSkills`); если не заданы, строятся по `skills_field`.
+
+
+    Пример использования:
+      >>> counts = IncrementalCoOccurrence(data, 'Обработанные навыки')
+      >>> counts.update(engine.select(**{'Название региона': ['Москва']}))
+      >>> matrix, G = counts.matrix(sparse=True), counts.graph()
+      >>> counts.update(engine.select(**{'Название региона': ['Москва', 'Санкт-Петербург']}))
+      >>> G = counts.graph()  # тот же объект графа с измененными ребрами
+
+    """
+
+    def __init__(self, data: pd.DataFrame, skills_field: str, encoded: Optional[EncodedSkills] = None):
+        encoded = encoded if encoded is not None else EncodedSkills.from_series(data[skills_field])
+        size = len(encoded.vocabulary)
+        super().__init__(data, encoded, (size, size))
+
+    def aggregate(self, rows: np.ndarray) -> Tuple[sp.csr_matrix, np.ndarray, np.ndarray]:
+        incidence = self._incidence(rows)
+        totals = np.asarray(incidence.sum(axis=0), dtype=np.int64).ravel()
+        return _co_occurrence_kernel(incidence).astype(np.int64), totals, totals.copy()
+
+    def _labels(self, present_rows: np.ndarray, present_columns: np.ndarray) -> Tuple[Any, Any]:
+        skills = self._encoded.vocabulary[present_rows].tolist()
+        return skills, skills
+
+    def _build_graph(self) -> nx.Graph:
+        return create_adjacency_graph(self.matrix(sparse=True))
+
+    def _patch_graph(self, G: nx.Graph, delta: sp.coo_matrix, rows: np.ndarray, columns: np.ndarray) -> None:
+        labels = self._encoded.vocabulary
+        upper = delta.row <= delta.col
+        sources, targets = delta.row[upper], delta.col[upper]
+        self._apply_edges(G, labels[sources], labels[targets], self._edge_weights(sources, targets))
+        G.remove_nodes_from(labels[self._graph_rows & ~rows].tolist())
+        G.add_nodes_from(labels[rows & ~self._graph_rows].tolist())
+
+
+class IncrementalGroupValues(_IncrementalCounts):
+    """
+    Матрица «значение × группа» по спискам значений (например, навыков по специальностям),
+    поддерживаемая по разностям при изменении выборки строк.
+
+    Результат `matrix` совпадает с `create_group_values_matrix` для той же выборки, а `graph` -
+    с `create_bipartite_graph` по этой матрице.
+
+    :param data: Обработанный DataFrame (см. `process_vacancies`).
+    :param group_field: Название колонки для группировки.
+    :param value_field: Название колонки со списками значений.
+    :param encoded: Закодированные списки `value_field` (`EncodedSkills`); если не заданы, строятся по `value_field`.
+
+
+    Пример использования:
+      >>> counts = IncrementalGroupValues(data, 'Название специальности', 'Обработанные навыки')
+      >>> counts.update(rows)
+      >>> G = create_bipartite_graph(counts.matrix(sparse=True))
+
+    """
+
+    def __init__(self, data: pd.DataFrame, group_field: str, value_field: str,
+                 encoded: Optional[EncodedSkills] = None):
+        encoded = encoded if encoded is not None else EncodedSkills.from_series(data[value_field])
+        self._group_codes, self._groups = pd.factorize(data[group_field], sort=True)
+        super().__init__(data, encoded, (len(encoded.vocabulary), len(self._groups)))
+
+    def aggregate(self, rows: np.ndarray) -> Tuple[sp.csr_matrix, np.ndarray, np.ndarray]:
+        # Строки без группы не учитываются, как и в create_group_values_matrix
+        rows = rows[self._group_codes[rows] >= 0]
+        group_codes = self._group_codes[rows]
+        incidence = self._incidence(rows)
+        counts = _group_values_kernel(incidence, group_codes, len(self._groups))
+        return (counts, np.asarray(incidence.sum(axis=0), dtype=np.int64).ravel(),
+                np.bincount(group_codes, minlength=len(self._groups)).astype(np.int64))
+
+    def _labels(self, present_rows: np.ndarray, present_columns: np.ndarray) -> Tuple[Any, Any]:
+        return self._encoded.vocabulary[present_rows].tolist(), self._groups[present_columns]
+
+    def _build_graph(self) -> nx.Graph:
+        return create_bipartite_graph(self.matrix(sparse=True))
+
+    def _patch_graph(self, G: nx.Graph, delta: sp.coo_matrix, rows: np.ndarray, columns: np.ndarray) -> None:
+        values = self._encoded.vocabulary
+        groups = np.asarray(self._groups, dtype=object)
+        self._apply_edges(G, groups[delta.col], values[delta.row], self._edge_weights(delta.row, delta.col))
+        G.remove_nodes_from(groups[self._graph_columns & ~columns].tolist())
+        G.remove_nodes_from(values[self._graph_rows & ~rows].tolist())
+        G.add_nodes_from(groups[columns & ~self._graph_columns].tolist(), bipartite=1)
+        G.add_nodes_from(values[rows & ~self._graph_rows].tolist(), bipartite=2)
+
+
+class TimeSnapshots:
+    """
+    Накопленные по периодам (день, неделя, месяц) снимки счетчиков для запросов по диапазону дат.
+
+    Снимок k содержит сумму счетчиков всех периодов до k-го включительно, поэтому состояние для диапазона
+    из целых периодов - разность двух снимков. Строки неполных периодов на границах диапазона
+    досчитываются тем же ядром (`aggregate` счетчиков). Память - число периодов × размер снимка,
+    поэтому для длинных выгрузок лучше подходит помесячная разбивка.
+
+    :param counts: Счетчики, задающие вид матрицы (`IncrementalCoOccurrence` или `IncrementalGroupValues`).
+    :param dates: Даты публикации для всех строк набора.
+    :param rows: Позиции строк, отобранных остальными фильтрами; по умолчанию - все строки.
+    :param freq: Частота периодов pandas: 'D', 'W' или 'M'.
+
+
+    Пример использования:
+      >>> counts = IncrementalCoOccurrence(data, 'Обработанные навыки')
+      >>> snapshots = TimeSnapshots(counts, data['Дата публикации'])
+      >>> matrix = snapshots.matrix('2024-02-10', '2024-06-30', sparse=True)
+      >>> monthly = [snapshots.period_matrix(i, sparse=True) for i in range(len(snapshots.periods))]
+
+    """
+
+    @instrument()
+    def __init__(self, counts: _IncrementalCounts, dates: pd.Series,
+                 rows: Optional[np.ndarray] = None, freq: str = 'M'):
+        self.counts = counts
+        rows = np.arange(len(dates)) if rows is None else np.asarray(rows, dtype=np.int64)
+        values = dates.to_numpy().astype('datetime64[ns]')[rows]
+        dated = ~np.isnat(values)
+
+        order = np.argsort(values[dated], kind='stable')
+        self._rows = rows[dated][order]
+        self._dates = values[dated][order]
+        self._undated = rows[~dated]
+
+        period_codes, self.periods = pd.factorize(pd.PeriodIndex(self._dates, freq=freq), sort=True)
+        self._starts = self.periods.start_time.to_numpy()
+        self._ends = self.periods.end_time.to_numpy()
+
+        # Даты отсортированы, поэтому строки каждого периода образуют непрерывный отрезок
+        self._bounds = np.searchsorted(period_codes, np.arange(len(self.periods) + 1))
+        state = counts.aggregate(self._rows[:0])
+        self._snapshots = [state]
+        for start, stop in zip(self._bounds[:-1], self._bounds[1:]):
+            check_cancelled()
+            state = self._add(state, counts.aggregate(self._rows[start:stop]))
+            self._snapshots.append(state)
+
+    @staticmethod
+    def _add(left: Tuple, right: Tuple) -> Tuple:
+        return tuple(a + b for a, b in zip(left, right))
+
+    @staticmethod
+    def _subtract(left: Tuple, right: Tuple) -> Tuple:
+        return tuple(a - b for a, b in zip(left, right))
+
+    @instrument()
+    def aggregate(self, start=None, end=None) -> Tuple[sp.csr_matrix, np.ndarray, np.ndarray]:
+        """
+        Состояние счетчиков (см. `aggregate` счетчиков) для строк с датой в [start, end] включительно.
+        Без обеих границ учитываются все строки, включая строки без даты, как при отключенном фильтре дат.
+        """
+        if start is None and end is None:
+            return self._add(self._snapshots[-1], self.counts.aggregate(self._undated))
+
+        first, lower = 0, 0
+        last, upper = len(self._dates), len(self.periods)
+        if start is not None:
+            start = pd.Timestamp(start).to_datetime64()
+            first = np.searchsorted(self._dates, start, side='left')
+            lower = np.searchsorted(self._starts, start, side='left')
+        if end is not None:
+            end = pd.Timestamp(end).to_datetime64()
+            last = np.searchsorted(self._dates, end, side='right')
+            upper = np.searchsorted(self._ends, end, side='right')
+
+        if lower >= upper:
+            return self.counts.aggregate(self._rows[first:last])
+
+        # Целые периоды - разность снимков, неполные граничные периоды считаются по строкам
+        state = self._subtract(self._snapshots[upper], self._snapshots[lower])
+        partial = np.concatenate([self._rows[first:self._bounds[lower]], self._rows[self._bounds[upper]:last]])
+        if len(partial):
+            state = self._add(state, self.counts.aggregate(partial))
+        return state
+
+    def matrix(self, start=None, end=None, sparse: bool = False) -> pd.DataFrame:
+        """
+        Матрица для диапазона дат [start, end].
+        """
+        return self.counts.to_frame(self.aggregate(start, end), sparse)
+
+    def period_matrix(self, position: int, sparse: bool = False) -> pd.DataFrame:
+        """
+        Матрица одного периода `self.periods[position]` - разность соседних снимков, без пересчета строк.
+        """
+        return self.counts.to_frame(self._subtract(self._snapshots[position + 1], self._snapshots[position]), sparse)
+
+
 def generalized_jaccard(vector_a: np.ndarray, vector_b: np.ndarray) -> float:
     """
     Вычисляет обобщенный коэффициент Жаккара между двумя векторами.
@@ -392,18 +1942,672 @@ def generalized_jaccard(vector_a: np.ndarray, vector_b: np.ndarray) -> float:
     return min_sum / max_sum if max_sum != 0 else 0
 
 
+# Кэш матриц инцидентности графов для поиска схожих узлов: граф -> {уровень: данные}
+_similarity_cache: "weakref.WeakKeyDictionary[nx.Graph, Dict[int, Dict[str, Any]]]" = weakref.WeakKeyDictionary()
+
+
+def _level_incidence(G: nx.Graph, expected_level: int, weight: str = 'weight') -> Dict[str, Any]:
+    """
+    Возвращает взвешенную матрицу инцидентности «узлы уровня × все узлы графа» для уровня `expected_level`.
+
+    Матрица строится один раз на граф и уровень и переиспользуется, пока не изменится число узлов и ребер.
+    После изменения весов ребер без изменения структуры кэш нужно сбросить через `_similarity_cache.pop(G)`.
+    """
+    signature = (G.number_of_nodes(), G.number_of_edges(), weight)
+    levels = _similarity_cache.setdefault(G, {})
+    cached = levels.get(expected_level)
+    if cached is not None and cached['signature'] == signature:
+        return cached
+
+    node_index = {node: idx for idx, node in enumerate(G)}
+    row_nodes = [node for node, level in G.nodes(data='bipartite') if level == expected_level]
+
+    indptr = [0]
+    indices, data = [], []
+    for node in row_nodes:
+        neighbors = G._adj[node]
+        indices.extend(node_index[nbr] for nbr in neighbors)
+        data.extend(attrs[weight] for attrs in neighbors.values())
+        indptr.append(len(indices))
+
+    incidence = sp.csr_matrix((np.asarray(data), np.asarray(indices, dtype=np.int64), np.asarray(indptr)),
+                              shape=(len(row_nodes), len(node_index)))
+    cached = {
+        'signature': signature,
+        'nodes': row_nodes,
+        'row_position': {node: idx for idx, node in enumerate(row_nodes)},
+        'node_index': node_index,
+        'by_column': incidence.tocsc(),
+        'row_sums': np.asarray(incidence.sum(axis=1)).ravel(),
+    }
+    levels[expected_level] = cached
+    return cached
+
+
+def _top_k_positions(scores: np.ndarray, k: Optional[int]) -> np.ndarray:
+    """
+    Возвращает позиции k наибольших значений по убыванию; равные значения упорядочены по позиции,
+    как при устойчивой сортировке. Отбор кандидатов выполняется частичной сортировкой (np.partition).
+    """
+    n = len(scores)
+    if k is None or k >= n:
+        return np.argsort(-scores, kind='stable')[:k]
+    if k <= 0:
+        return np.array([], dtype=np.int64)
+    threshold = np.partition(scores, n - k)[n - k]
+    candidates = np.flatnonzero(scores >= threshold)
+    return candidates[np.argsort(-scores[candidates], kind='stable')[:k]]
+
+
+def _jaccard_against(vectors: sp.spmatrix, row_sums: np.ndarray,
+                     target_columns: np.ndarray, target_weights: np.ndarray) -> np.ndarray:
+    """
+    Обобщенный коэффициент Жаккара целевого вектора (заданного столбцами и весами) со всеми строками `vectors`.
+    """
+    # Столбцы соседей целевого узла: поэлементный минимум с весами цели и суммы по строкам
+    overlap = vectors[:, target_columns].tocsc()
+    overlap.data = np.minimum(overlap.data, np.repeat(target_weights, np.diff(overlap.indptr)))
+    min_sum = np.asarray(overlap.sum(axis=1)).ravel()
+    max_sum = target_weights.sum() + row_sums - min_sum
+
+    scores = np.zeros(len(min_sum), dtype=np.float64)
+    np.divide(min_sum, max_sum, out=scores, where=max_sum != 0)
+    return scores
+
+
+def generalized_jaccard_scores(G: nx.Graph, target_node: Any,
+                               level_target: str = "first") -> Tuple[List[Any], np.ndarray]:
+    """
+    Вычисляет обобщенный коэффициент Жаккара между целевым узлом и всеми узлами заданного уровня за один проход.
+
+    Сумма минимумов считается только по столбцам соседей целевого узла во взвешенной матрице инцидентности,
+    а сумма максимумов восстанавливается как sum(a) + sum(b) - sum(min(a, b)).
+    Для целочисленных весов результат в точности совпадает с `generalized_jaccard`.
+
+    :param G: Двудольный граф (Graph).
+    :param target_node: Целевой узел (должен присутствовать в графе).
+    :param level_target: Уровень узлов-кандидатов ('first' или 'second').
+    :return: Кортеж (список узлов-кандидатов без целевого узла, массив коэффициентов схожести).
+
+
+    Пример использования:
+     >>> nodes, scores = generalized_jaccard_scores(G, "Монтажник", level_target="first")
+
+    """
+    expected_level = 1 if level_target == 'first' else 2
+    level = _level_incidence(G, expected_level)
+
+    target_neighbors = G._adj[target_node]
+    target_columns = np.fromiter((level['node_index'][nbr] for nbr in target_neighbors),
+                                 dtype=np.int64, count=len(target_neighbors))
+    target_weights = np.array([attrs['weight'] for attrs in target_neighbors.values()])
+
+    scores = _jaccard_against(level['by_column'], level['row_sums'], target_columns, target_weights)
+
+    nodes = level['nodes']
+    target_position = level['row_position'].get(target_node)
+    if target_position is not None:
+        nodes = nodes[:target_position] + nodes[target_position + 1:]
+        scores = np.delete(scores, target_position)
+    return nodes, scores
+
+
+def _level_vectors(source: Union[nx.Graph, pd.DataFrame, sp.spmatrix], level_target: str,
+                   index: Optional[List[Any]] = None,
+                   columns: Optional[List[Any]] = None) -> Tuple[sp.csr_matrix, List[Any], List[Any]]:
+    """
+    Возвращает взвешенные векторы узлов уровня `level_target` двудольной сети: (матрица, узлы, признаки).
+
+    Источник - граф `create_bipartite_graph` или матрица связей (столбцы - первый уровень, строки - второй).
+    """
+    if isinstance(source, nx.Graph):
+        level = _level_incidence(source, 1 if level_target == 'first' else 2)
+        return level['by_column'].tocsr(), list(level['nodes']), list(level['node_index'])
+
+    if isinstance(source, pd.DataFrame):
+        index, columns = source.index, source.columns
+    vectors = _as_csr(source)
+    # Как и в create_bipartite_graph, ребрами считаются только положительные элементы
+    vectors.data[vectors.data < 0] = 0
+    vectors.eliminate_zeros()
+    if level_target == 'first':
+        return vectors.T.tocsr(), list(columns), list(index)
+    return vectors, list(index), list(columns)
+
+
+def _top_k_triples(rows: np.ndarray, cols: np.ndarray, scores: np.ndarray,
+                   k: int) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Оставляет для каждой строки k лучших троек (строка, столбец, значение) по убыванию значения;
+    равные значения упорядочены по номеру столбца. Возвращает также ранг тройки внутри строки.
+    """
+    order = np.lexsort((cols, -scores, rows))
+    rows, cols, scores = rows[order], cols[order], scores[order]
+    rank = np.arange(len(rows)) - np.searchsorted(rows, rows)
+    keep = rank < k
+    return rows[keep], cols[keep], scores[keep], rank[keep]
+
+
+# Наибольшее число пар элементов в одной порции подсчета суммы минимумов SimilarityIndex
+MIN_SUM_CHUNK = 4_000_000
+
+# Память, которую потоки SimilarityIndex занимают одновременно, если число потоков не задано
+SIMILARITY_MEMORY_BUDGET = int(os.environ.get('NETWORK_NAVYK_SIMILARITY_MB', 512)) * 2**20
+
+
+def _similarity_jobs(block_size: int, n_nodes: int) -> int:
+    """
+    Число потоков SimilarityIndex по умолчанию: не больше числа ядер и столько, сколько блоков
+    помещается в SIMILARITY_MEMORY_BUDGET. Поток держит около трех плотных матриц блока
+    и до пяти массивов порции суммы минимумов.
+    """
+    thread_bytes = (3 * block_size * n_nodes + 5 * MIN_SUM_CHUNK) * 8
+    return max(1, min(os.cpu_count() or 1, SIMILARITY_MEMORY_BUDGET // thread_bytes))
+
+
+class SimilarityIndex:
+    """
+    Таблица k ближайших соседей по обобщенному коэффициенту Жаккара для одного уровня двудольного графа.
+
+    Для каждого узла хранятся до k соседей с положительной схожестью, поэтому рекомендации выдаются за O(k).
+    Таблица строится блоками строк, блоки обрабатываются параллельно в пуле потоков. Сумма минимумов
+    для блока считается по общим признакам: каждый ненулевой элемент строки блока сопоставляется
+    с ненулевыми элементами того же столбца, поэтому работа пропорциональна числу пересечений векторов
+    и не зависит от числа различных значений весов.
+
+    При изменении части столбцов исходной матрицы `refresh` пересчитывает только затронутые строки.
+
+    Пример использования:
+     >>> index = SimilarityIndex.from_matrix(skills_roles_matrix, level_target="second")
+     >>> index.query("Excel", top_n=5)
+     >>> index.refresh(updated_skills_roles_matrix)
+
+    """
+
+    def __init__(self, vectors: sp.csr_matrix, nodes: List[Any], features: List[Any],
+                 level_target: str = "first", k: int = 30, block_size: int = 128, n_jobs: Optional[int] = None):
+        """
+        :param vectors: Взвешенная матрица «узлы уровня × признаки» (соседи узлов в двудольном графе).
+        :param nodes: Подписи строк `vectors` (узлы уровня).
+        :param features: Подписи столбцов `vectors` (узлы другого уровня).
+        :param level_target: Уровень узлов ('first' или 'second').
+        :param k: Число хранимых соседей для каждого узла.
+        :param block_size: Число строк в блоке; память блока - около 3 · block_size · len(nodes) чисел float64.
+        :param n_jobs: Число потоков. По умолчанию - по бюджету памяти SIMILARITY_MEMORY_BUDGET
+            (переменная NETWORK_NAVYK_SIMILARITY_MB), но не больше числа ядер.
+        """
+        self.level_target = level_target
+        self.k = k
+        self.block_size = block_size
+        self.n_jobs = n_jobs
+        self._set_vectors(vectors, nodes, features)
+        self.neighbors = np.full((len(self.nodes), k), -1, dtype=np.int64)
+        self.scores = np.zeros((len(self.nodes), k), dtype=np.float64)
+        self.counts = np.zeros(len(self.nodes), dtype=np.int64)
+        self._recompute_rows(np.arange(len(self.nodes)))
+
+    @classmethod
+    def from_graph(cls, G: nx.Graph, level_target: str = "first", **kwargs) -> "SimilarityIndex":
+        """
+        Строит индекс по двудольному графу (см. `create_bipartite_graph`).
+        """
+        return cls(*_level_vectors(G, level_target), level_target=level_target, **kwargs)
+
+    @classmethod
+    @instrument()
+    def from_matrix(cls, matrix: Union[pd.DataFrame, sp.spmatrix], level_target: str = "first",
+                    index: Optional[List[Any]] = None, columns: Optional[List[Any]] = None,
+                    **kwargs) -> "SimilarityIndex":
+        """
+        Строит индекс по матрице связей без построения графа. Результат совпадает с индексом
+        по графу `create_bipartite_graph(matrix)`: столбцы - первый уровень, строки - второй.
+        """
+        return cls(*_level_vectors(matrix, level_target, index, columns), level_target=level_target, **kwargs)
+
+    def _set_vectors(self, vectors: sp.csr_matrix, nodes: List[Any], features: List[Any]) -> None:
+        self.vectors = vectors
+        self.nodes = list(nodes)
+        self.features = list(features)
+        self._position = {node: idx for idx, node in enumerate(self.nodes)}
+        self._row_sums = np.asarray(vectors.sum(axis=1), dtype=np.float64).ravel()
+        self._by_column = vectors.tocsc()
+
+    def _min_sums(self, rows: np.ndarray) -> np.ndarray:
+        """
+        Плотная матрица Σ min(a, b) для блока строк `rows` против всех узлов уровня.
+
+        Каждый элемент (строка блока, признак, вес) сопоставляется со всеми элементами столбца признака;
+        пары обрабатываются порциями не более MIN_SUM_CHUNK элементов и суммируются через np.bincount.
+        """
+        n = len(self.nodes)
+        block = self.vectors[rows].tocoo()
+        columns = self._by_column
+        lengths = np.diff(columns.indptr)[block.col]
+        bounds = np.concatenate([[0], np.cumsum(lengths)])
+        min_sum = np.zeros(len(rows) * n, dtype=np.float64)
+        start = 0
+        while start < len(lengths):
+            stop = max(int(np.searchsorted(bounds, bounds[start] + MIN_SUM_CHUNK, side='right')) - 1, start + 1)
+            counts = lengths[start:stop]
+            owners = np.repeat(np.arange(start, stop), counts)
+            positions = (np.repeat(columns.indptr[block.col[start:stop]] - (bounds[start:stop] - bounds[start]), counts)
+                         + np.arange(bounds[stop] - bounds[start]))
+            values = np.minimum(block.data[owners], columns.data[positions])
+            min_sum += np.bincount(block.row[owners] * n + columns.indices[positions], weights=values,
+                                   minlength=len(min_sum))
+            start = stop
+        return min_sum.reshape(len(rows), n)
+
+    def _block_scores(self, rows: np.ndarray) -> np.ndarray:
+        """
+        Плотная матрица коэффициентов схожести для блока строк `rows` против всех узлов уровня.
+        """
+        min_sum = self._min_sums(rows)
+        max_sum = self._row_sums[rows, None] + self._row_sums[None, :] - min_sum
+
+        scores = np.zeros_like(min_sum)
+        np.divide(min_sum, max_sum, out=scores, where=max_sum != 0)
+        # Сам узел не рекомендуется
+        scores[np.arange(len(rows)), rows] = 0
+        return scores
+
+    def _select(self, rows: np.ndarray, scores: np.ndarray) -> Tuple[np.ndarray, ...]:
+        """
+        Отбирает для каждой строки блока до k соседей с положительной схожестью.
+        """
+        n = scores.shape[1]
+        if n > self.k:
+            threshold = np.partition(scores, n - self.k, axis=1)[:, n - self.k]
+            block_rows, cols = np.nonzero((scores >= threshold[:, None]) & (scores > 0))
+        else:
+            block_rows, cols = np.nonzero(scores > 0)
+        return _top_k_triples(rows[block_rows], cols, scores[block_rows, cols], self.k)
+
+    def _write(self, rows: np.ndarray, cols: np.ndarray, scores: np.ndarray, rank: np.ndarray) -> None:
+        self.neighbors[rows, rank] = cols
+        self.scores[rows, rank] = scores
+        np.maximum.at(self.counts, rows, rank + 1)
+
+    def _clear(self, rows: np.ndarray) -> None:
+        self.neighbors[rows] = -1
+        self.scores[rows] = 0
+        self.counts[rows] = 0
+
+    def _blocks(self, rows: np.ndarray) -> List[np.ndarray]:
+        return [rows[start:start + self.block_size] for start in range(0, len(rows), self.block_size)]
+
+    def _recompute_rows(self, rows: np.ndarray, on_block=None) -> None:
+        """
+        Полностью пересчитывает строки таблицы блоками в пуле потоков. `on_block(block, scores)`
+        вызывается в потоке блока, пока плотная матрица блока еще в памяти.
+        """
+        self._clear(rows)
+        # Пул потоков не наследует контекст вызова, поэтому токен отмены передается явно
+        token = _current_token.get()
+
+        def process(block):
+            if token is not None:
+                token.check()
+            scores = self._block_scores(block)
+            if on_block is not None:
+                on_block(block, scores)
+            return self._select(block, scores)
+
+        n_jobs = self.n_jobs or _similarity_jobs(self.block_size, len(self.nodes))
+        with ThreadPoolExecutor(max_workers=n_jobs) as executor:
+            for selected in executor.map(process, self._blocks(rows)):
+                self._write(*selected)
+
+    def __contains__(self, node: Any) -> bool:
+        return node in self._position
+
+    def __len__(self) -> int:
+        return len(self.nodes)
+
+    def query(self, node: Any, top_n: Optional[int] = 5) -> List[Tuple[Any, float]]:
+        """
+        Возвращает top_n узлов, наиболее схожих с `node`, в том же порядке, что и `recommend_similar_nodes`.
+
+        Если сохранено меньше top_n соседей и список обрезан по k, строка пересчитывается точно.
+        Если положительных соседей меньше k, список дополняется узлами с нулевой схожестью по порядку узлов.
+        """
+        if node not in self._position:
+            raise ValueError(f"Узел '{node}' не найден в индексе.")
+        position = self._position[node]
+        count = self.counts[position]
+        n_candidates = len(self.nodes) - 1
+        top_n = n_candidates if top_n is None else max(min(top_n, n_candidates), 0)
+
+        if top_n > count and count == self.k:
+            scores = np.delete(self._block_scores(np.array([position]))[0], position)
+            candidates = [other for idx, other in enumerate(self.nodes) if idx != position]
+            return [(candidates[idx], float(scores[idx])) for idx in _top_k_positions(scores, top_n)]
+
+        stored = self.neighbors[position, :min(count, top_n)]
+        result = [(self.nodes[idx], float(score)) for idx, score in zip(stored, self.scores[position])]
+
+        # Все положительные соседи сохранены - остаток составляют узлы с нулевой схожестью
+        excluded = set(stored.tolist()) | {position}
+        idx = 0
+        while len(result) < top_n:
+            if idx not in excluded:
+                result.append((self.nodes[idx], 0.0))
+            idx += 1
+        return result
+
+    @instrument()
+    def refresh(self, source: Union[nx.Graph, pd.DataFrame, sp.spmatrix],
+                index: Optional[List[Any]] = None, columns: Optional[List[Any]] = None) -> int:
+        """
+        Обновляет индекс по новой версии матрицы (или графа), пересчитывая только затронутые строки.
+
+        Затронутыми считаются узлы, вектор которых изменился, новые узлы, а также узлы, в списке соседей
+        которых есть измененные или удаленные узлы. Остальные строки объединяются с новыми значениями
+        схожести для измененных узлов (матрица схожести симметрична), что дает тот же результат,
+        что и полное перестроение.
+
+        :param source: Новая матрица связей или граф (того же вида, что и при построении индекса).
+        :return: Число пересчитанных строк.
+        """
+        vectors, nodes, features = _level_vectors(source, self.level_target, index, columns)
+        old_vectors, old_nodes, old_features = self.vectors, self.nodes, self.features
+
+        position = {node: idx for idx, node in enumerate(nodes)}
+        old_to_new = np.fromiter((position.get(node, -1) for node in old_nodes), dtype=np.int64,
+                                 count=len(old_nodes))
+        kept = np.flatnonzero(old_to_new >= 0)
+
+        if np.any(np.diff(old_to_new[kept]) <= 0):
+            # Порядок сохранившихся узлов изменился - порядок равных значений не восстановить
+            self.__init__(vectors, nodes, features, self.level_target, self.k, self.block_size, self.n_jobs)
+            return len(nodes)
+
+        # Старые векторы в пространстве новых строк и признаков
+        feature_position = {feature: idx for idx, feature in enumerate(features)}
+        old_to_new_feature = np.fromiter((feature_position.get(f, -1) for f in old_features),
+                                         dtype=np.int64, count=len(old_features))
+        old_coo = old_vectors.tocoo()
+        lost = old_to_new_feature[old_coo.col] < 0
+        valid = ~lost & (old_to_new[old_coo.row] >= 0)
+        aligned = sp.csr_matrix((old_coo.data[valid],
+                                 (old_to_new[old_coo.row[valid]], old_to_new_feature[old_coo.col[valid]])),
+                                shape=vectors.shape)
+
+        difference = (vectors - aligned).tocsr()
+        difference.eliminate_zeros()
+        changed = np.diff(difference.indptr) > 0
+        changed[old_to_new[old_coo.row[lost & (old_to_new[old_coo.row] >= 0)]]] = True
+        changed[np.setdiff1d(np.arange(len(nodes)), old_to_new[kept])] = True
+
+        # Строки, в списках которых встречаются измененные или удаленные узлы
+        old_changed = np.ones(len(old_nodes), dtype=bool)
+        old_changed[kept] = changed[old_to_new[kept]]
+        stored = self.neighbors >= 0
+        stale_old = np.zeros_like(stored)
+        stale_old[stored] = old_changed[self.neighbors[stored]]
+        stale = np.zeros(len(nodes), dtype=bool)
+        stale[old_to_new[kept]] = stale_old[kept].any(axis=1)
+
+        # Переносим таблицу в новую нумерацию узлов
+        old_neighbors, old_scores, old_counts = self.neighbors, self.scores, self.counts
+        self._set_vectors(vectors, nodes, features)
+        self.neighbors = np.full((len(nodes), self.k), -1, dtype=np.int64)
+        self.scores = np.zeros((len(nodes), self.k), dtype=np.float64)
+        self.counts = np.zeros(len(nodes), dtype=np.int64)
+        remapped = np.where(old_neighbors[kept] >= 0, old_to_new[old_neighbors[kept]], -1)
+        self.neighbors[old_to_new[kept]] = remapped
+        self.scores[old_to_new[kept]] = old_scores[kept]
+        self.counts[old_to_new[kept]] = old_counts[kept]
+
+        recompute = changed | stale
+        # Порог для объединения: k-е значение строки или 0, если список не заполнен
+        kth = np.where(self.counts == self.k, self.scores[:, -1], 0.0)
+        candidates = []
+
+        def collect(block, scores):
+            # Схожесть измененных узлов с остальными строками (по симметрии - столбцы блока)
+            block_rows, cols = np.nonzero((scores > 0) & (scores >= kth[None, :]) & ~recompute[None, :])
+            candidates.append((cols, block[block_rows], scores[block_rows, cols]))
+
+        self._recompute_rows(np.flatnonzero(changed), on_block=collect)
+        self._recompute_rows(np.flatnonzero(stale & ~changed))
+
+        if candidates:
+            rows, cols, scores = (np.concatenate(parts) for parts in zip(*candidates))
+            merge_rows = np.unique(rows)
+            counts = self.counts[merge_rows]
+            stored_rows = np.repeat(merge_rows, counts)
+            stored_mask = np.arange(self.k)[None, :] < counts[:, None]
+            rows = np.concatenate([rows, stored_rows])
+            cols = np.concatenate([cols, self.neighbors[merge_rows][stored_mask]])
+            scores = np.concatenate([scores, self.scores[merge_rows][stored_mask]])
+            self._clear(merge_rows)
+            self._write(*_top_k_triples(rows, cols, scores, self.k))
+
+        return int(recompute.sum())
+
+
+class WeightedMinHashLSH:
+    """
+    Приближенный поиск схожих узлов по обобщенному коэффициенту Жаккара: взвешенный MinHash
+    (Consistent Weighted Sampling, Ioffe, 2010) и LSH-бакеты по полосам сигнатуры.
+
+    Вероятность совпадения компоненты сигнатуры двух векторов равна их обобщенному коэффициенту Жаккара,
+    поэтому узлы с совпадающей полосой из r = num_perm // bands компонент попадают в один бакет.
+    Пара со схожестью s становится кандидатом с вероятностью 1 - (1 - s^r)^b: увеличение `bands`
+    повышает полноту ценой числа кандидатов, увеличение `num_perm` при тех же `bands` - наоборот.
+    Кандидаты переранжируются точным коэффициентом, так что найденные значения схожести точные.
+
+    Пример использования:
+     >>> lsh = WeightedMinHashLSH.from_graph(G, level_target="second", num_perm=128, bands=32)
+     >>> lsh.query("Excel", top_n=5)
+     >>> lsh.recall(sample_size=200, top_n=10)
+
+    """
+
+    def __init__(self, vectors: sp.csr_matrix, nodes: List[Any], features: List[Any],
+                 level_target: str = "first", num_perm: int = 128, bands: int = 32,
+                 seed: int = 0, chunk_size: int = 16):
+        """
+        :param vectors: Взвешенная матрица «узлы уровня × признаки».
+        :param nodes: Подписи строк `vectors`.
+        :param features: Подписи столбцов `vectors`.
+        :param level_target: Уровень узлов ('first' или 'second').
+        :param num_perm: Длина сигнатуры (число хеш-функций).
+        :param bands: Число полос LSH; должно делить num_perm.
+        :param seed: Зерно генератора случайных параметров хеш-функций.
+        :param chunk_size: Число хеш-функций, обрабатываемых за один векторизованный проход.
+        """
+        if num_perm % bands:
+            raise ValueError("Параметр num_perm должен делиться на bands без остатка.")
+        self.level_target = level_target
+        self.num_perm = num_perm
+        self.bands = bands
+        self.seed = seed
+        self.vectors = vectors.tocsr()
+        self.nodes = list(nodes)
+        self.features = list(features)
+        self._position = {node: idx for idx, node in enumerate(self.nodes)}
+        self._row_sums = np.asarray(self.vectors.sum(axis=1), dtype=np.float64).ravel()
+        self.signatures = self._signatures(chunk_size)
+        self._build_buckets()
+
+    @classmethod
+    def from_graph(cls, G: nx.Graph, level_target: str = "first", **kwargs) -> "WeightedMinHashLSH":
+        """
+        Строит индекс по двудольному графу (см. `create_bipartite_graph`).
+        """
+        return cls(*_level_vectors(G, level_target), level_target=level_target, **kwargs)
+
+    @classmethod
+    @instrument()
+    def from_matrix(cls, matrix: Union[pd.DataFrame, sp.spmatrix], level_target: str = "first",
+                    index: Optional[List[Any]] = None, columns: Optional[List[Any]] = None,
+                    **kwargs) -> "WeightedMinHashLSH":
+        """
+        Строит индекс по матрице связей (например, `create_group_values_matrix`).
+        """
+        return cls(*_level_vectors(matrix, level_target, index, columns), level_target=level_target, **kwargs)
+
+    def _signatures(self, chunk_size: int) -> np.ndarray:
+        """
+        Вычисляет сигнатуры CWS: для каждой хеш-функции выбирается признак k* с минимальным
+        ln a_k = ln c_k - r_k·(t_k - β_k) - r_k, где t_k = ⌊ln w_k / r_k + β_k⌋; компонента сигнатуры - пара (k*, t_k*).
+        Пустые векторы получают сигнатуру -1 и в бакеты не попадают.
+        """
+        vectors = self.vectors
+        lengths = np.diff(vectors.indptr)
+        nonempty = np.flatnonzero(lengths > 0)
+        starts = vectors.indptr[:-1][nonempty]
+        owner = np.repeat(np.arange(len(nonempty)), lengths[nonempty])
+        columns = vectors.indices
+        log_weights = np.log(vectors.data.astype(np.float64))[:, None]
+        entries = np.arange(vectors.nnz)[:, None]
+
+        signatures = np.full((len(self.nodes), self.num_perm), -1, dtype=np.int64)
+        if not len(nonempty):
+            return signatures
+
+        for first in range(0, self.num_perm, chunk_size):
+            width = min(chunk_size, self.num_perm - first)
+            # Параметры хеш-функций зависят только от признака, а не от узла
+            rng = np.random.default_rng([self.seed, first])
+            shape = (len(self.features), width)
+            r, c, beta = rng.gamma(2.0, 1.0, shape), rng.gamma(2.0, 1.0, shape), rng.uniform(0.0, 1.0, shape)
+            r, c, beta = r[columns], c[columns], beta[columns]
+
+            t = np.floor(log_weights / r + beta)
+            log_a = np.log(c) - r * (t - beta) - r
+
+            minimum = np.minimum.reduceat(log_a, starts, axis=0)
+            candidates = np.where(log_a == minimum[owner], entries, vectors.nnz)
+            chosen = np.minimum.reduceat(candidates, starts, axis=0)
+            k_star = columns[chosen].astype(np.int64)
+            t_star = t[chosen, np.arange(width)]
+            signatures[nonempty, first:first + width] = (k_star << 32) | (t_star.astype(np.int64) & 0xFFFFFFFF)
+        return signatures
+
+    def _build_buckets(self) -> None:
+        rows_per_band = self.num_perm // self.bands
+        multipliers = np.random.default_rng([self.seed, self.num_perm]).integers(
+            1, np.iinfo(np.int64).max, rows_per_band, dtype=np.int64).astype(np.uint64) | np.uint64(1)
+        bands = self.signatures.view(np.uint64).reshape(len(self.nodes), self.bands, rows_per_band)
+        # Ключ бакета - хеш полосы; переполнение uint64 допустимо
+        self._keys = (bands * multipliers).sum(axis=2)
+        self._indexed = np.flatnonzero(self.signatures[:, 0] >= 0)
+        keys = self._keys[self._indexed]
+        self._order = np.argsort(keys, axis=0, kind='stable')
+        self._sorted_keys = np.take_along_axis(keys, self._order, axis=0)
+
+    def __contains__(self, node: Any) -> bool:
+        return node in self._position
+
+    def __len__(self) -> int:
+        return len(self.nodes)
+
+    def candidates(self, node: Any) -> np.ndarray:
+        """
+        Возвращает позиции узлов, попавших хотя бы в один общий бакет с `node` (без самого узла).
+        """
+        position = self._position[node]
+        if self.signatures[position, 0] < 0:
+            return np.array([], dtype=np.int64)
+        found = []
+        for band in range(self.bands):
+            key = self._keys[position, band]
+            low = np.searchsorted(self._sorted_keys[:, band], key, side='left')
+            high = np.searchsorted(self._sorted_keys[:, band], key, side='right')
+            found.append(self._indexed[self._order[low:high, band]])
+        found = np.unique(np.concatenate(found))
+        return found[found != position]
+
+    def _exact_scores(self, position: int, rows: Optional[np.ndarray] = None) -> np.ndarray:
+        target = self.vectors[position]
+        vectors = self.vectors if rows is None else self.vectors[rows]
+        row_sums = self._row_sums if rows is None else self._row_sums[rows]
+        return _jaccard_against(vectors, row_sums, target.indices, target.data)
+
+    def query(self, node: Any, top_n: Optional[int] = 5, rerank: bool = True) -> List[Tuple[Any, float]]:
+        """
+        Возвращает до top_n схожих узлов среди кандидатов из LSH-бакетов.
+
+        :param node: Целевой узел.
+        :param top_n: Количество рекомендаций.
+        :param rerank: Если True, кандидаты ранжируются точным коэффициентом Жаккара,
+         иначе - оценкой по доле совпавших компонент сигнатуры.
+        :return: Список пар (узел, коэффициент схожести) по убыванию схожести.
+        """
+        if node not in self._position:
+            raise ValueError(f"Узел '{node}' не найден в индексе.")
+        position = self._position[node]
+        candidates = self.candidates(node)
+        if rerank:
+            scores = self._exact_scores(position, candidates)
+        else:
+            scores = (self.signatures[candidates] == self.signatures[position]).mean(axis=1)
+        return [(self.nodes[candidates[idx]], float(scores[idx])) for idx in _top_k_positions(scores, top_n)]
+
+    def recall(self, sample_size: int = 100, top_n: int = 10, seed: int = 0) -> Dict[str, float]:
+        """
+        Оценивает полноту приближенного поиска относительно точного метода на случайной выборке узлов.
+
+        :param sample_size: Число узлов в выборке.
+        :param top_n: Размер списка рекомендаций.
+        :param seed: Зерно выборки.
+        :return: Словарь: 'recall' - доля точных top_n соседей (с положительной схожестью), найденных через LSH;
+         'candidate_ratio' - средняя доля узлов, проверяемых точно; 'exact_seconds' и 'approx_seconds' - время запросов.
+        """
+        rng = np.random.default_rng(seed)
+        sample = rng.choice(len(self.nodes), size=min(sample_size, len(self.nodes)), replace=False)
+        found = relevant = 0
+        candidate_total = 0
+        exact_seconds = approx_seconds = 0.0
+
+        for position in sample:
+            started = time.perf_counter()
+            scores = self._exact_scores(position)
+            scores[position] = 0
+            exact = {idx for idx in _top_k_positions(scores, top_n).tolist() if scores[idx] > 0}
+            exact_seconds += time.perf_counter() - started
+
+            started = time.perf_counter()
+            approx = self.query(self.nodes[position], top_n)
+            approx_seconds += time.perf_counter() - started
+
+            candidate_total += len(self.candidates(self.nodes[position]))
+            found += len(exact & {self._position[node] for node, _ in approx})
+            relevant += len(exact)
+
+        return {
+            'recall': found / relevant if relevant else 1.0,
+            'candidate_ratio': candidate_total / (len(sample) * max(len(self.nodes) - 1, 1)),
+            'exact_seconds': exact_seconds,
+            'approx_seconds': approx_seconds,
+        }
+
+
+@instrument()
 def recommend_similar_nodes(G: nx.Graph, target_node: str,
                             level_target: str = "first",
-                            top_n: int = 5, apply_lower: bool = False) -> None:
+                            top_n: int = 5, apply_lower: bool = False,
+                            index: Optional[Union[SimilarityIndex, WeightedMinHashLSH]] = None) -> List[Tuple[Any, float]]:
     """
     Рекомендует схожие узлы в двудольном графе на основе обобщенного коэффициента Жаккара.
 
+    Коэффициенты для всех узлов уровня считаются векторизованно (`generalized_jaccard_scores`),
+    а топ-N отбирается частичной сортировкой. Если передан индекс того же уровня, содержащий узел,
+    ответ берется из предрассчитанной таблицы соседей (`SimilarityIndex`) или из LSH-бакетов
+    (`WeightedMinHashLSH`, приближенный режим).
+
     :param G: Двудольный граф (Graph).
     :param target_node: Целевой узел для поиска схожих узлов.
     :param level_target: Уровень узла ('first' или 'second').
      По столбцам - это уровень первый (bipartite=1), а по строкам - это уровень второй (bipartite=2)
     :param top_n: Количество рекомендаций.
     :param apply_lower: Приводить ли узел ко второму регистру.
+    :param index: Индекс схожести для уровня `level_target`: точный `SimilarityIndex`
+     или приближенный `WeightedMinHashLSH`.
+    :return: Список пар (узел, коэффициент схожести) по убыванию схожести.
 
 
     Пример использования:
@@ -411,36 +2615,24 @@ def recommend_similar_nodes(G: nx.Graph, target_node: str,
      >>> recommend_similar_nodes(G, "Монтажник", level_target="first")
     Для второго уровня (строки) с необходимость приведения к нижнему регистру:
      >>> recommend_similar_nodes(G, "Excel", level_target="second", apply_lower=True)
+    С предрассчитанным индексом:
+     >>> recommend_similar_nodes(G, "Монтажник", level_target="first", index=roles_index)
 
     """
-    expected_level = 1 if level_target == 'first' else 2
     processed_target = target_node.lower(
     ) if apply_lower and level_target == 'second' else target_node
 
     if processed_target not in G:
         raise ValueError(f"Узел '{processed_target}' не найден в графе.")
 
-    target_neighbors = {nbr: G[processed_target][nbr]['weight']
-                        for nbr in G.neighbors(processed_target)}
-    recommendations = []
-
-    for node in G.nodes:
-        if node == processed_target or G.nodes[node].get('bipartite') != expected_level:
-            continue
-
-        node_neighbors = {nbr: G[node][nbr]['weight']
-                          for nbr in G.neighbors(node)}
-        union_keys = set(target_neighbors) | set(node_neighbors)
-        vector_a = np.array([target_neighbors.get(k, 0) for k in union_keys])
-        vector_b = np.array([node_neighbors.get(k, 0) for k in union_keys])
+    if index is not None and index.level_target == level_target and processed_target in index:
+        return index.query(processed_target, top_n)
 
-        similarity = generalized_jaccard(vector_a, vector_b)
-        recommendations.append((node, similarity))
-
-    recommendations.sort(key=lambda x: x[1], reverse=True)
-    return recommendations[:top_n]
+    nodes, scores = generalized_jaccard_scores(G, processed_target, level_target)
+    return [(nodes[idx], float(scores[idx])) for idx in _top_k_positions(scores, top_n)]
 
 
+@instrument()
 def neighbor_recommendations(G: nx.Graph, target_node: str,
                              level_target: str = "first",
                              top_n: int = 5,
@@ -481,3 +2673,571 @@ def parse_skills(s):
     if pd.isna(s):
         return []
     return [skill.strip() for skill in s.split(';') if skill.strip()]
+
+
+# Загрузка данных с кэшированием обработанного набора на диске
+
+SKILLS_FIELD = 'Обработанные навыки'
+
+# Каталог кэша обработанных файлов; версия меняется при изменении логики обработки
+CACHE_DIR = os.environ.get('NETWORK_NAVYK_CACHE', os.path.join(os.path.expanduser('~'), '.cache', 'network_navyk'))
+_CACHE_VERSION = 2
+
+
+def file_digest(path: str, chunk_size: int = 1 << 20) -> str:
+    """
+    Вычисляет хеш содержимого файла (BLAKE2b), по которому адресуется кэш.
+
+    :param path: Путь к файлу.
+    :param chunk_size: Размер блока чтения в байтах.
+    :return: Шестнадцатеричная строка.
+    """
+    digest = hashlib.blake2b(digest_size=20)
+    with open(path, 'rb') as file:
+        for chunk in iter(lambda: file.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+@instrument()
+def read_vacancies(path: str) -> pd.DataFrame:
+    """
+    Читает выгрузку вакансий в формате xlsx, csv или parquet (по расширению файла).
+    """
+    extension = os.path.splitext(path)[1].lower()
+    if extension == '.csv':
+        return pd.read_csv(path)
+    if extension == '.parquet':
+        return pd.read_parquet(path)
+    return pd.read_excel(path)
+
+
+@instrument()
+def process_vacancies(data: pd.DataFrame) -> pd.DataFrame:
+    """
+    Подготавливает выгрузку вакансий для дашборда: разбирает навыки, удаляет строки без работодателя,
+    приводит даты публикации и определяет федеральный округ.
+
+    :param data: Исходный DataFrame выгрузки.
+    :return: Обработанный DataFrame с непрерывным индексом.
+    """
+    data = data.copy()
+    data[SKILLS_FIELD] = data['Ключевые навыки'].apply(parse_skills)
+    data = data.dropna(subset='Работодатель')
+    data.reset_index(inplace=True, drop=True)
+    data['Дата публикации'] = pd.to_datetime(data['Дата публикации'])
+    data["Федеральный округ"] = map_federal_districts(data["Название региона"])
+    return data
+
+
+def _write_parquet(data: pd.DataFrame, path: str) -> None:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    # Списки навыков сохраняются как list<string>, без сериализации в строки
+    table = pa.Table.from_pandas(data, preserve_index=False)
+    temporary = f"{path}.{os.getpid()}.tmp"
+    pq.write_table(table, temporary)
+    os.replace(temporary, path)
+
+
+def _read_parquet(path: str) -> pd.DataFrame:
+    import pyarrow.parquet as pq
+
+    table = pq.read_table(path)
+    data = table.drop_columns([SKILLS_FIELD]).to_pandas()
+    # to_pandas возвращает массивы numpy, а построители матриц ожидают списки
+    data.insert(table.column_names.index(SKILLS_FIELD), SKILLS_FIELD, table.column(SKILLS_FIELD).to_pylist())
+    return data
+
+
+@instrument()
+def load_vacancies(path: str, cache_dir: Optional[str] = CACHE_DIR, digest: Optional[str] = None) -> pd.DataFrame:
+    """
+    Загружает и обрабатывает выгрузку вакансий, используя кэш в формате Parquet.
+
+    Ключ кэша - хеш содержимого файла, поэтому повторная загрузка того же файла (под любым именем)
+    и перезапуск приложения не требуют повторного разбора xlsx. Если pyarrow не установлен
+    или таблицу нельзя сохранить в Parquet, данные обрабатываются без кэша.
+
+    :param path: Путь к файлу выгрузки (xlsx, csv или parquet).
+    :param cache_dir: Каталог кэша; None - без кэширования.
+    :param digest: Хеш содержимого файла, если уже вычислен (см. `file_digest`).
+    :return: Обработанный DataFrame (см. `process_vacancies`).
+
+
+    Пример использования:
+      >>> data = load_vacancies('vacancies.xlsx')
+
+    """
+    if cache_dir is None:
+        return process_vacancies(read_vacancies(path))
+
+    cache_path = os.path.join(cache_dir, f"{digest or file_digest(path)}.v{_CACHE_VERSION}.parquet")
+    if os.path.exists(cache_path):
+        try:
+            return _read_parquet(cache_path)
+        except ImportError:
+            return process_vacancies(read_vacancies(path))
+        except Exception as error:
+            warnings.warn(f"Не удалось прочитать кэш {cache_path}: {error}")
+
+    data = process_vacancies(read_vacancies(path))
+    try:
+        os.makedirs(cache_dir, exist_ok=True)
+        _write_parquet(data, cache_path)
+    except ImportError:
+        pass
+    except Exception as error:
+        warnings.warn(f"Не удалось сохранить кэш {cache_path}: {error}")
+    return data
+
+
+# Сохранение матриц в npz: разреженные массивы и подписи строк и столбцов без pickle
+
+def _labels_to_array(labels: pd.Index) -> Tuple[np.ndarray, str]:
+    # Подписи сохраняются вместе с видом: строки, числа и даты - массивом numpy, периоды - порядковыми номерами
+    labels = pd.Index(labels)
+    if isinstance(labels, pd.PeriodIndex):
+        return labels.asi8, f'period:{labels.freqstr}'
+    if isinstance(labels.dtype, np.dtype) and labels.dtype.kind in 'biufmM':
+        return labels.to_numpy(), 'native'
+    if all(isinstance(label, str) for label in labels):
+        return np.array(labels, dtype=str), 'str'
+    raise ValueError("Подписи строк и столбцов должны быть строками, числами, датами или периодами.")
+
+
+def _labels_from_array(values: np.ndarray, kind: str) -> pd.Index:
+    if kind.startswith('period:'):
+        return pd.PeriodIndex(pd.arrays.PeriodArray(values, dtype=pd.PeriodDtype(kind.split(':', 1)[1])))
+    if kind == 'native':
+        return pd.Index(values)
+    return pd.Index(values.tolist(), dtype=object)
+
+
+def save_matrix_npz(path: str, matrix: pd.DataFrame) -> None:
+    """
+    Сохраняет матрицу (плотный или разреженный DataFrame) в сжатый npz-файл формата CSR
+    с подписями строк и столбцов; читается функцией `load_matrix_npz`.
+    Подписи сохраняются вместе с типом (строки, числа, даты, периоды) и читаются без изменений.
+
+    :param path: Путь к файлу.
+    :param matrix: Матрица с подписями.
+    :raises ValueError: Если подписи другого типа (например, смесь строк и чисел).
+
+
+    Пример использования:
+      >>> save_matrix_npz('skills_roles.npz', matrix)
+
+    """
+    index, index_kind = _labels_to_array(matrix.index)
+    columns, columns_kind = _labels_to_array(matrix.columns)
+    csr = _as_csr(matrix)
+    np.savez_compressed(path, data=csr.data, indices=csr.indices, indptr=csr.indptr, shape=np.array(csr.shape),
+                        index=index, columns=columns, index_kind=np.array(index_kind),
+                        columns_kind=np.array(columns_kind))
+
+
+def load_matrix_npz(path: str, sparse: bool = True) -> pd.DataFrame:
+    """
+    Читает матрицу, сохраненную `save_matrix_npz`.
+
+    :param path: Путь к файлу.
+    :param sparse: Вернуть разреженный DataFrame (pd.SparseDtype); False - плотный.
+    :return: DataFrame с подписями строк и столбцов.
+
+
+    Пример использования:
+      >>> matrix = load_matrix_npz('batch/all/all/skills_roles.npz')
+
+    """
+    with np.load(path, allow_pickle=False) as stored:
+        csr = sp.csr_matrix((stored['data'], stored['indices'], stored['indptr']), shape=tuple(stored['shape']))
+        # Файлы без вида подписей записаны со строковыми подписями
+        kinds = {field: str(stored[f'{field}_kind']) if f'{field}_kind' in stored.files else 'str'
+                 for field in ('index', 'columns')}
+        index = _labels_from_array(stored['index'], kinds['index'])
+        columns = _labels_from_array(stored['columns'], kinds['columns'])
+    if sparse:
+        return pd.DataFrame.sparse.from_spmatrix(csr, index=index, columns=columns)
+    return pd.DataFrame(csr.toarray(), index=index, columns=columns)
+
+
+# Фоновые вычисления: кооперативная отмена и ход выполнения
+
+class CancelledComputation(Exception):
+    """
+    Вычисление отменено, потому что его результат больше не нужен.
+    """
+
+
+class CancellationToken:
+    """
+    Токен отмены и хода фонового вычисления.
+
+    Вычисление запускается через `run_cancellable`, которое делает токен текущим (contextvars).
+    Длительные функции модуля вызывают `check_cancelled` в безопасных точках, где состояние объектов
+    согласовано, и прерываются исключением `CancelledComputation`, как только токен отменен.
+    Ход выполнения сообщается через `report_progress` и читается из `progress` в другом потоке.
+
+
+    Пример использования:
+      >>> token = CancellationToken()
+      >>> future = executor.submit(run_cancellable, token, counts.update, rows)
+      >>> token.cancel()  # выборка снова изменилась
+
+    """
+
+    def __init__(self):
+        self._cancelled = threading.Event()
+        self.progress: Tuple[float, str] = (0.0, '')
+
+    def cancel(self) -> None:
+        self._cancelled.set()
+
+    @property
+    def cancelled(self) -> bool:
+        return self._cancelled.is_set()
+
+    def check(self) -> None:
+        if self._cancelled.is_set():
+            raise CancelledComputation()
+
+    def report(self, fraction: float, message: str = '') -> None:
+        self.check()
+        self.progress = (fraction, message)
+
+
+_current_token: "contextvars.ContextVar[Optional[CancellationToken]]" = contextvars.ContextVar(
+    'cancellation_token', default=None)
+
+
+def check_cancelled() -> None:
+    """
+    Прерывает текущее вычисление, если его токен отменен; вне `run_cancellable` ничего не делает.
+    """
+    token = _current_token.get()
+    if token is not None:
+        token.check()
+
+
+def report_progress(fraction: float, message: str = '') -> None:
+    """
+    Сообщает долю выполненной работы (0..1) и описание этапа текущему токену; проверяет отмену.
+    """
+    token = _current_token.get()
+    if token is not None:
+        token.report(fraction, message)
+
+
+def run_cancellable(token: CancellationToken, compute, *args, **kwargs) -> Any:
+    """
+    Выполняет `compute(*args, **kwargs)` с токеном отмены в контексте вызова.
+
+    :param token: Токен вычисления.
+    :param compute: Функция вычисления.
+    :return: Результат `compute` или None, если вычисление отменено.
+
+
+    Пример использования:
+      >>> result = await asyncio.to_thread(run_cancellable, token, build)
+
+    """
+    reset = _current_token.set(token)
+    try:
+        token.check()
+        result = compute(*args, **kwargs)
+        token.progress = (1.0, token.progress[1])
+        return result
+    except CancelledComputation:
+        return None
+    finally:
+        _current_token.reset(reset)
+
+
+# Общий для всех сессий кэш этапов обработки: ключ - хеш файла, этап и нормализованные фильтры.
+# Объем задается переменной окружения NETWORK_NAVYK_SHARED_CACHE_MB (по умолчанию 1 ГБ).
+# Значения в нем используются несколькими сессиями и не должны изменяться на месте.
+shared_cache = LRUCache(max_bytes=int(os.environ.get('NETWORK_NAVYK_SHARED_CACHE_MB', 1024)) * 2**20)
+
+
+def _filter_value(value: Any) -> Any:
+    if value is None:
+        return None
+    try:
+        return pd.Timestamp(value).isoformat()
+    except (TypeError, ValueError):
+        return str(value)
+
+
+def filter_key(date_range: Optional[Tuple] = None,
+               salary_range: Optional[Tuple[float, float]] = None,
+               **categories) -> Tuple:
+    """
+    Приводит состояние фильтров к хешируемому ключу кэша: одинаковые выборки дают одинаковый ключ
+    независимо от порядка выбранных значений и типа дат (строка, date, Timestamp).
+    Пустые условия не учитываются, как и в `FilterEngine.select`.
+
+    :param date_range: Диапазон дат публикации.
+    :param salary_range: Диапазон зарплат.
+    :param categories: Списки допустимых значений категориальных полей.
+    :return: Кортеж, пригодный для ключа `LRUCache`.
+
+
+    Пример использования:
+      >>> filter_key(date_range=('2024-01-01', '2024-03-31'), **{'Опыт работы': ['Нет опыта']})
+      (('date', ('2024-01-01T00:00:00', '2024-03-31T00:00:00')), ('Опыт работы', ('Нет опыта',)))
+
+    """
+    key = []
+    if date_range:
+        key.append(('date', tuple(_filter_value(value) for value in date_range)))
+    if salary_range:
+        key.append(('salary', tuple(float(value) for value in salary_range)))
+    for field in sorted(categories):
+        if categories[field]:
+            key.append((field, tuple(sorted({str(value) for value in categories[field]}))))
+    return tuple(key)
+
+
+# Индексированная фильтрация: выборки возвращаются как позиции строк, без копирования DataFrame
+
+class FilterEngine:
+    """
+    Индексы обработанного набора для быстрых повторных выборок.
+
+    Строится один раз на набор данных: даты и зарплаты сортируются (диапазон находится двоичным поиском),
+    для категориальных полей хранятся упакованные битовые маски значений (строятся при первом обращении).
+    `select` объединяет условия побитовым И и возвращает отсортированные позиции строк,
+    которые принимают построители матриц (параметр `rows`) и `DataFrame.iloc`.
+
+    :param data: Обработанный DataFrame (см. `process_vacancies`).
+    :param date_field: Поле даты публикации.
+    :param salary_field: Поле заработной платы.
+    :param category_fields: Категориальные поля, по которым допускается отбор.
+
+
+    Пример использования:
+      >>> engine = FilterEngine(data)
+      >>> rows = engine.select(date_range=('2024-01-01', '2024-03-31'),
+      ...                      salary_range=(50000, 150000), **{'Название региона': ['Москва']})
+      >>> create_co_occurrence_matrix(data, 'Обработанные навыки', rows=rows)
+
+    """
+
+    @instrument()
+    def __init__(self, data: pd.DataFrame,
+                 date_field: str = 'Дата публикации',
+                 salary_field: str = 'Заработная плата',
+                 category_fields: Tuple[str, ...] = ('Опыт работы', 'Название региона', 'Название специальности')):
+        self.size = len(data)
+        self._ranges = {}
+        for field in (date_field, salary_field):
+            values = data[field].to_numpy()
+            if values.dtype.kind == 'M':
+                values = values.astype('datetime64[ns]')
+            # NaT и NaN сортируются в конец и не попадают ни в один диапазон
+            order = np.argsort(values, kind='stable')
+            self._ranges[field] = (values[order], order)
+        self.date_field = date_field
+        self.salary_field = salary_field
+
+        self._categories = {}
+        for field in category_fields:
+            codes, values = pd.factorize(data[field])
+            self._categories[field] = (codes, pd.Index(values))
+        self._bitmaps = {}
+        self._lock = threading.Lock()
+
+    def _bitmap(self, field: str, code: int) -> np.ndarray:
+        key = (field, code)
+        bitmap = self._bitmaps.get(key)
+        if bitmap is None:
+            bitmap = np.packbits(self._categories[field][0] == code)
+            with self._lock:
+                self._bitmaps[key] = bitmap
+        return bitmap
+
+    def _range_bitmap(self, field: str, low, high) -> np.ndarray:
+        sorted_values, order = self._ranges[field]
+        if sorted_values.dtype.kind == 'M':
+            low, high = pd.Timestamp(low).to_datetime64(), pd.Timestamp(high).to_datetime64()
+        start = np.searchsorted(sorted_values, low, side='left')
+        stop = np.searchsorted(sorted_values, high, side='right')
+        mask = np.zeros(self.size, dtype=bool)
+        mask[order[start:stop]] = True
+        return np.packbits(mask)
+
+    def _category_bitmap(self, field: str, selected) -> np.ndarray:
+        if field not in self._categories:
+            raise ValueError(f"Поле {field!r} не проиндексировано для фильтрации.")
+        codes = self._categories[field][1].get_indexer(list(selected))
+        bitmap = np.zeros((self.size + 7) // 8, dtype=np.uint8)
+        for code in codes[codes >= 0]:
+            bitmap |= self._bitmap(field, code)
+        return bitmap
+
+    @instrument()
+    def select(self, date_range: Optional[Tuple] = None,
+               salary_range: Optional[Tuple[float, float]] = None,
+               **categories) -> np.ndarray:
+        """
+        Отбирает строки по диапазону дат (включительно), диапазону зарплат (включительно)
+        и спискам допустимых значений категориальных полей. Пустые условия не применяются.
+
+        :return: Отсортированный массив позиций строк.
+        """
+        bitmaps = []
+        if date_range:
+            bitmaps.append(self._range_bitmap(self.date_field, *date_range))
+        if salary_range:
+            bitmaps.append(self._range_bitmap(self.salary_field, *salary_range))
+        bitmaps.extend(self._category_bitmap(field, selected)
+                       for field, selected in categories.items() if selected)
+
+        if not bitmaps:
+            return np.arange(self.size)
+        combined = bitmaps[0].copy()
+        for bitmap in bitmaps[1:]:
+            combined &= bitmap
+        return np.flatnonzero(np.unpackbits(combined, count=self.size))
+
+
+# Предагрегированный куб вакансий для графиков дашборда
+
+class VacancyCube:
+    """
+    Куб вакансий: сумма и число зарплат и число вакансий по измерениям (федеральный округ, специальность,
+    опыт работы, регион) и месяцу публикации.
+
+    Строится один раз на набор данных; графики строятся сверткой куба (`rollup`) вместо группировки
+    исходных строк, а средняя зарплата восстанавливается точно как сумма / число.
+    Месяцы, целиком попадающие в диапазон дат, берутся из куба, а неполные граничные месяцы
+    досчитываются по исходным строкам (как в `TimeSnapshots`), поэтому результат совпадает с группировкой
+    отфильтрованных строк. Строки с пропусками в измерениях сохраняются, поэтому свертка отбрасывает их так же,
+    как groupby.
+
+    :param data: Обработанный DataFrame (см. `process_vacancies`).
+    :param date_field: Поле даты публикации.
+    :param salary_field: Поле заработной платы.
+    :param dimensions: Поля-измерения куба.
+
+
+    Пример использования:
+      >>> cube = VacancyCube(data)
+      >>> cube.rollup(['Федеральный округ', 'Название специальности'], date_range=('2024-01-01', '2024-06-30'),
+      ...             **{'Название региона': ['Москва']})
+
+    """
+
+    DIMENSIONS = ('Федеральный округ', 'Название специальности', 'Опыт работы', 'Название региона')
+    MEASURES = ['Сумма зарплат', 'Число зарплат', 'Число вакансий']
+
+    @instrument()
+    def __init__(self, data: pd.DataFrame,
+                 date_field: str = 'Дата публикации',
+                 salary_field: str = 'Заработная плата',
+                 dimensions: Tuple[str, ...] = DIMENSIONS):
+        frame = self._measures(data, date_field, salary_field, dimensions)
+        self.cube = frame.groupby(list(dimensions) + ['Месяц'], dropna=False, sort=False).sum().reset_index()
+        self.dimensions = tuple(dimensions)
+        salary = data[salary_field]
+        self.min_salary, self.max_salary = salary.min(), salary.max()
+
+        # Строки по возрастанию даты для досчета неполных месяцев (пропуски дат - в конце)
+        order = np.argsort(data[date_field].to_numpy(), kind='stable')
+        self._dates = data[date_field].to_numpy()[order]
+        self._rows = frame.iloc[order].reset_index(drop=True)
+
+    @staticmethod
+    def _measures(data: pd.DataFrame, date_field: str, salary_field: str, dimensions: Tuple[str, ...]) -> pd.DataFrame:
+        salary = data[salary_field]
+        frame = pd.DataFrame({field: data[field] for field in dimensions})
+        frame['Месяц'] = data[date_field].dt.to_period('M')
+        frame['Сумма зарплат'] = salary.fillna(0)
+        frame['Число зарплат'] = salary.notna().astype(np.int64)
+        frame['Число вакансий'] = np.int64(1)
+        return frame
+
+    @staticmethod
+    def _summarize(frame: pd.DataFrame, by: List[str], salary_only: bool = False) -> pd.DataFrame:
+        result = frame.groupby(list(by))[VacancyCube.MEASURES].sum()
+        if salary_only:
+            result['Число вакансий'] = result['Число зарплат']
+        result['Средняя зарплата'] = result['Сумма зарплат'] / result['Число зарплат'].replace(0, np.nan)
+        return result.reset_index()
+
+    @classmethod
+    @instrument()
+    def summarize(cls, data: pd.DataFrame, by: List[str], date_field: str = 'Дата публикации',
+                  salary_field: str = 'Заработная плата') -> pd.DataFrame:
+        """
+        Группирует уже отфильтрованные строки без построения куба; результат того же вида, что и у `rollup`.
+        Используется, когда фильтр не может быть применен к кубу (например, суженный диапазон зарплат).
+
+        :param data: Отобранные строки обработанного набора.
+        :param by: Поля группировки (измерения и 'Месяц').
+        """
+        fields = [field for field in by if field != 'Месяц']
+        return cls._summarize(cls._measures(data, date_field, salary_field, fields), by)
+
+    def covers_salary(self, salary_range: Optional[Tuple[float, float]]) -> bool:
+        """
+        Проверяет, что диапазон зарплат включает все зарплаты набора, то есть отсекает только вакансии
+        без зарплаты и может быть применен к кубу.
+        """
+        if not salary_range or pd.isna(self.min_salary):
+            return True
+        low, high = salary_range
+        return low <= self.min_salary and high >= self.max_salary
+
+    def _date_slice(self, date_range: Tuple) -> Tuple[pd.DataFrame, pd.DataFrame]:
+        """
+        Делит диапазон дат на полные месяцы (строки куба) и неполные граничные месяцы (исходные строки).
+        Как и в `FilterEngine.select`, конец диапазона - полночь последнего дня включительно.
+        """
+        start, end = (pd.Timestamp(value) for value in date_range)
+        first = start.to_period('M') if start == start.to_period('M').start_time else start.to_period('M') + 1
+        # Месяц полный, если его последний момент не позже конца диапазона
+        last = (end + pd.Timedelta(1, 'ns')).to_period('M') - 1
+
+        months = self.cube['Месяц']
+        dates = self._dates
+        low = np.searchsorted(dates, start.to_datetime64(), side='left')
+        high = np.searchsorted(dates, end.to_datetime64(), side='right')
+        if first > last:
+            return self.cube.iloc[:0], self._rows.iloc[low:high]
+        full = months.notna() & (months >= first) & (months <= last)
+        head = np.searchsorted(dates, first.start_time.to_datetime64(), side='left')
+        tail = np.searchsorted(dates, (last + 1).start_time.to_datetime64(), side='left')
+        partial = pd.concat([self._rows.iloc[low:max(head, low)], self._rows.iloc[max(tail, low):high]])
+        return self.cube[full.to_numpy()], partial
+
+    @instrument()
+    def rollup(self, by: List[str], date_range: Optional[Tuple] = None,
+               salary_range: Optional[Tuple[float, float]] = None, **filters) -> pd.DataFrame:
+        """
+        Сворачивает куб по полям `by` (измерения и 'Месяц') с учетом фильтров.
+
+        :param by: Поля группировки.
+        :param date_range: Диапазон дней публикации (начало, конец) включительно, как в `FilterEngine.select`.
+        :param salary_range: Диапазон зарплат; допускается только охватывающий все зарплаты (см. `covers_salary`).
+         Тогда вакансии без зарплаты не учитываются.
+        :param filters: Списки допустимых значений измерений; пустые списки не применяются.
+        :return: DataFrame с полями `by`, 'Сумма зарплат', 'Число зарплат', 'Число вакансий' и 'Средняя зарплата'.
+        """
+        if salary_range and not self.covers_salary(salary_range):
+            raise ValueError("Диапазон зарплат не охватывает все значения и не может быть применен к кубу.")
+        if date_range:
+            cube, partial = self._date_slice(date_range)
+            frame = pd.concat([cube, partial], ignore_index=True) if len(partial) else cube
+        else:
+            frame = self.cube
+
+        mask = np.ones(len(frame), dtype=bool)
+        if salary_range:
+            mask &= frame['Число зарплат'].to_numpy() > 0
+        for field, selected in filters.items():
+            if selected:
+                mask &= frame[field].isin(selected).to_numpy()
+        return self._summarize(frame[mask], by, salary_only=bool(salary_range))
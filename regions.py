@@ -0,0 +1,205 @@
+import difflib
+import re
+from functools import lru_cache
+from typing import Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+
+
+UNKNOWN_DISTRICT = "Неизвестно"
+
+# Республика Бурятия и Забайкальский край с 2018 года входят в Дальневосточный федеральный округ
+federal_districts = {
+    "Центральный": ["Москва", "Московская область", "Белгородская область", "Брянская область", "Владимирская область",
+                    "Воронежская область", "Ивановская область", "Калужская область", "Костромская область",
+                    "Курская область", "Липецкая область", "Орловская область", "Рязанская область",
+                    "Смоленская область", "Тамбовская область", "Тверская область", "Тульская область",
+                    "Ярославская область"],
+
+    "Северо-Западный": ["Санкт-Петербург", "Ленинградская область", "Архангельская область", "Вологодская область",
+                        "Калининградская область", "Республика Карелия", "Республика Коми", "Мурманская область",
+                        "Ненецкий автономный округ", "Новгородская область", "Псковская область"],
+
+    "Южный": ["Республика Адыгея", "Астраханская область", "Волгоградская область", "Республика Калмыкия",
+              "Краснодарский край", "Ростовская область", "Севастополь", "Республика Крым",
+              "Луганская народная республика", "Донецкая народная республика",
+              "Херсонская область", "Запорожская область"],
+
+    "Северо-Кавказский": ["Республика Дагестан", "Республика Ингушетия", "Кабардино-Балкарская республика",
+                          "Карачаево-Черкесская Республика", "Республика Северная Осетия-Алания",
+                          "Чеченская республика", "Ставропольский край"],
+
+    "Приволжский": ["Республика Башкортостан", "Республика Марий Эл", "Республика Мордовия", "Республика Татарстан",
+                    "Удмуртская Республика", "Чувашская Республика", "Кировская область", "Нижегородская область",
+                    "Оренбургская область", "Пензенская область", "Пермский край", "Самарская область",
+                    "Саратовская область", "Ульяновская область"],
+
+    "Уральский": ["Курганская область", "Свердловская область", "Тюменская область", "Челябинская область",
+                  "Ханты-Мансийский автономный округ — Югра", "Ямало-Ненецкий АО"],
+
+    "Сибирский": ["Алтайский край", "Красноярский край", "Иркутская область", "Кемеровская область",
+                  "Новосибирская область", "Омская область", "Томская область", "Республика Тыва",
+                  "Республика Хакасия", "Республика Алтай"],
+
+    "Дальневосточный": ["Амурская область", "Еврейская автономная область", "Камчатский край", "Магаданская область",
+                        "Приморский край", "Сахалинская область", "Хабаровский край", "Чукотский автономный округ",
+                        "Республика Бурятия", "Забайкальский край", "Республика Саха (Якутия)"]
+}
+
+# Обратный индекс «регион → федеральный округ»
+district_by_region: Dict[str, str] = {region: district
+                                      for district, regions in federal_districts.items() for region in regions}
+
+# Распространенные варианты написания, которые не сводятся к каноническому названию нормализацией
+region_aliases = {
+    "мск": "Москва",
+    "московская обл": "Московская область",
+    "подмосковье": "Московская область",
+    "спб": "Санкт-Петербург",
+    "петербург": "Санкт-Петербург",
+    "ленинградская обл": "Ленинградская область",
+    "башкирия": "Республика Башкортостан",
+    "татарстан": "Республика Татарстан",
+    "удмуртия": "Удмуртская Республика",
+    "чувашия": "Чувашская Республика",
+    "чувашская республика чувашия": "Чувашская Республика",
+    "мордовия": "Республика Мордовия",
+    "марий эл": "Республика Марий Эл",
+    "карелия": "Республика Карелия",
+    "коми": "Республика Коми",
+    "адыгея": "Республика Адыгея",
+    "калмыкия": "Республика Калмыкия",
+    "крым": "Республика Крым",
+    "днр": "Донецкая народная республика",
+    "лнр": "Луганская народная республика",
+    "дагестан": "Республика Дагестан",
+    "ингушетия": "Республика Ингушетия",
+    "кабардино балкария": "Кабардино-Балкарская республика",
+    "карачаево черкесия": "Карачаево-Черкесская Республика",
+    "северная осетия": "Республика Северная Осетия-Алания",
+    "северная осетия алания": "Республика Северная Осетия-Алания",
+    "чечня": "Чеченская республика",
+    "чеченская республика ичкерия": "Чеченская республика",
+    "ханты мансийский ао": "Ханты-Мансийский автономный округ — Югра",
+    "ханты мансийский ао югра": "Ханты-Мансийский автономный округ — Югра",
+    "ханты мансийский автономный округ": "Ханты-Мансийский автономный округ — Югра",
+    "хмао": "Ханты-Мансийский автономный округ — Югра",
+    "югра": "Ханты-Мансийский автономный округ — Югра",
+    "ямало ненецкий автономный округ": "Ямало-Ненецкий АО",
+    "янао": "Ямало-Ненецкий АО",
+    "ненецкий ао": "Ненецкий автономный округ",
+    "чукотский ао": "Чукотский автономный округ",
+    "еврейская ао": "Еврейская автономная область",
+    "кузбасс": "Кемеровская область",
+    "кемеровская область кузбасс": "Кемеровская область",
+    "тыва": "Республика Тыва",
+    "тува": "Республика Тыва",
+    "хакасия": "Республика Хакасия",
+    "бурятия": "Республика Бурятия",
+    "якутия": "Республика Саха (Якутия)",
+    "саха": "Республика Саха (Якутия)",
+    "республика саха": "Республика Саха (Якутия)",
+    "приморье": "Приморский край",
+}
+
+
+def _region_key(name: str) -> str:
+    """
+    Приводит название региона к ключу сравнения: нижний регистр, «ё» → «е», без знаков препинания,
+    сокращений «г.», «обл.», «респ.» и лишних пробелов.
+    """
+    key = name.lower().replace('ё', 'е')
+    key = re.sub(r'[^\w\s]', ' ', key)
+    key = re.sub(r'\bг\b', ' ', key)
+    key = re.sub(r'\bобл\b', 'область', key)
+    key = re.sub(r'\bресп\b', 'республика', key)
+    return ' '.join(key.split())
+
+
+_canonical_by_key = {_region_key(region): region for region in district_by_region}
+_canonical_by_key.update({_region_key(alias): region for alias, region in region_aliases.items()})
+
+# Ключи по числу слов: нечеткое сравнение выполняется только с ключами из того же числа слов
+_keys_by_length: Dict[int, List[str]] = {}
+for _key in _canonical_by_key:
+    _keys_by_length.setdefault(len(_key.split()), []).append(_key)
+
+# Слова короче этой длины должны совпадать точно: в коротких названиях одна буква меняет регион (Омск/Томск)
+FUZZY_MIN_WORD = 5
+
+
+def _fuzzy_key(key: str, cutoff: float) -> Optional[str]:
+    """
+    Ищет ключ, отличающийся от `key` только опечатками внутри слов: число слов совпадает, различающиеся
+    слова не короче FUZZY_MIN_WORD и каждое похоже на слово ключа не меньше чем на `cutoff`.
+    """
+    words = key.split()
+    for candidate in difflib.get_close_matches(key, _keys_by_length.get(len(words), []), n=3, cutoff=cutoff):
+        if all(word == other or (min(len(word), len(other)) >= FUZZY_MIN_WORD
+                                 and difflib.SequenceMatcher(None, word, other).ratio() >= cutoff)
+               for word, other in zip(words, candidate.split())):
+            return candidate
+    return None
+
+
+@lru_cache(maxsize=4096)
+def normalize_region(name: str, cutoff: float = 0.85) -> Optional[str]:
+    """
+    Возвращает каноническое название региона для исходной строки.
+
+    Проверяются точное совпадение, ключ после нормализации (регистр, пунктуация, сокращения), словарь
+    вариантов написания и, в последнюю очередь, нечеткое сравнение ключей (difflib) с порогом `cutoff`.
+    Нечеткое сравнение исправляет только опечатки внутри слов (см. `_fuzzy_key`): другое число слов
+    или отличие в коротком слове дает None, а не ближайший по написанию регион.
+    Результаты кэшируются, поэтому каждое уникальное название разбирается один раз.
+
+    :param name: Исходное название региона.
+    :param cutoff: Минимальная схожесть для нечеткого сравнения (0..1).
+    :return: Каноническое название или None, если регион не распознан.
+
+
+    Пример использования:
+      >>> normalize_region('г. Санкт-Петербург')
+      'Санкт-Петербург'
+      >>> normalize_region('Свердловская обл.')
+      'Свердловская область'
+      >>> normalize_region('Омск') is None
+      True
+
+    """
+    if name in district_by_region:
+        return name
+    key = _region_key(name)
+    if key in _canonical_by_key:
+        return _canonical_by_key[key]
+    match = _fuzzy_key(key, cutoff)
+    return _canonical_by_key[match] if match is not None else None
+
+
+def get_federal_district(region):
+    if not isinstance(region, str):
+        return UNKNOWN_DISTRICT
+    canonical = normalize_region(region)
+    return district_by_region[canonical] if canonical is not None else UNKNOWN_DISTRICT
+
+
+def map_federal_districts(regions: pd.Series) -> pd.Series:
+    """
+    Определяет федеральный округ для столбца регионов.
+
+    Регионы кодируются через `pd.factorize`, поэтому округ вычисляется только для уникальных названий,
+    а затем раскладывается по строкам индексированием массива.
+
+    :param regions: Series с названиями регионов.
+    :return: Series федеральных округов с тем же индексом; нераспознанные и пропущенные регионы - «Неизвестно».
+
+
+    Пример использования:
+      >>> data['Федеральный округ'] = map_federal_districts(data['Название региона'])
+
+    """
+    codes, uniques = pd.factorize(regions)
+    districts = np.array([get_federal_district(region) for region in uniques] + [UNKNOWN_DISTRICT], dtype=object)
+    # Код -1 (пропуск) указывает на последний элемент - «Неизвестно»
+    return pd.Series(districts[codes], index=regions.index)